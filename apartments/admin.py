@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db.models import Q
 from apartments.models import Apartment, ApartmentPhoto, Feature, ApartmentFeature, City
 from apartments.models.apartment_user_like import ApartmentUserLike
+from apartments.utils.text_search import filter_by_text, trigram_search_available
 
 
 @admin.register(Apartment)
@@ -14,9 +16,21 @@ class ApartmentAdmin(admin.ModelAdmin):
         'total_price', 'available_entry_date'
     )
     list_filter = ('city', 'type', 'available_entry_date')
-    search_fields = ('city__name', 'street', 'type')
+    search_fields = ('city__name', 'street', 'area', 'about', 'type')
     ordering = ('-created_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search the street, area and description through the trigram index when it is available,
+        and the city and type as usual.
+        """
+        if search_term and trigram_search_available(queryset.db):
+            other_fields = Q()
+            for word in search_term.split():
+                other_fields &= Q(city__name__icontains=word) | Q(type__icontains=word)
+            return filter_by_text(queryset, search_term) | queryset.filter(other_fields), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 @admin.register(ApartmentPhoto)
 class ApartmentPhotoAdmin(admin.ModelAdmin):
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApartmentsConfig(AppConfig):
     name = "apartments"
+
+    def ready(self):
+        # Register signal handlers
+        import apartments.signals  # noqa: F401
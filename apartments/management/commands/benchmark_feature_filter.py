@@ -0,0 +1,80 @@
+"""
+Management command to compare query plans for feature matching.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+
+from apartments.models import Apartment, ApartmentFeature
+from apartments.utils.filtering import apartments_with_all_features
+
+
+class Command(BaseCommand):
+    help = 'Show query plans and timings of feature filtering for 1 to N required features'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-features',
+            type=int,
+            default=10,
+            help='Largest number of required features to test (default: 10)',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run EXPLAIN ANALYZE instead of EXPLAIN',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs per query (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        # Most common features first, so every prefix still matches some apartments
+        feature_ids = list(
+            ApartmentFeature.objects.values('feature_id').annotate(
+                apartments=Count('apartment_id')
+            ).order_by('-apartments').values_list('feature_id', flat=True)[:options['max_features']]
+        )
+        if not feature_ids:
+            self.stdout.write(self.style.WARNING('No apartment features found'))
+            return
+
+        rows = []
+        for n in range(1, len(feature_ids) + 1):
+            selected = feature_ids[:n]
+
+            joined = Apartment.objects.all()
+            for feature_id in selected:
+                joined = joined.filter(apartment_features__feature_id=feature_id)
+            grouped = Apartment.objects.filter(id__in=apartments_with_all_features(set(selected)))
+
+            # Plans are printed unless running with --verbosity 0
+            if options['verbosity'] >= 1:
+                self.stdout.write(f'\n-- {n} feature(s), one join per feature')
+                self.stdout.write(joined.explain(analyze=options['analyze']))
+                self.stdout.write(f'\n-- {n} feature(s), grouped subquery')
+                self.stdout.write(grouped.explain(analyze=options['analyze']))
+
+            rows.append((n, self._time(joined, options['repeat']), self._time(grouped, options['repeat']), grouped.count()))
+
+        self.stdout.write(f'\n{Apartment.objects.count()} apartments, database: {connection.vendor}')
+        self.stdout.write(f"{'features':>8} {'joins (ms)':>12} {'grouped (ms)':>13} {'matches':>8}")
+        for n, joined_ms, grouped_ms, matches in rows:
+            self.stdout.write(f'{n:>8} {joined_ms:>12.2f} {grouped_ms:>13.2f} {matches:>8}')
+
+    def _time(self, queryset, repeat):
+        """
+        Best wall time in milliseconds of fetching the queryset's IDs.
+        """
+        best = None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            list(queryset.values_list('id', flat=True))
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,341 @@
+"""
+Management command to benchmark the recommendation pipeline at several inventory sizes.
+"""
+import datetime
+import json
+import os
+import random
+import subprocess
+import time
+import tracemalloc
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apartments.models import Apartment, ApartmentFeature, City, Feature
+from apartments.serializers.apartment import ApartmentSerializer
+from apartments.utils.compatibility_sql import database_scoring_available, save_answer_vectors
+from apartments.utils.filtering import filter_apartments
+from apartments.utils.geo import grid_cell
+from apartments.utils.inventory_index import bump_inventory_version
+from apartments.utils.preference_index import bump_preference_index_version
+from apartments.utils.recommendation import (
+    get_top_apartments,
+    hydrate_apartments,
+    rank_apartments_by_compatibility,
+)
+from apartments.utils.recommendation_cache import bump_listings_version
+from users.models import (
+    Question,
+    QuestionnaireTemplate,
+    UserPreferences,
+    UserPreferencesFeatures,
+    UserResponse,
+)
+
+BATCH_SIZE = 5000
+
+# Calls traced for peak memory per stage; tracing is too slow for every timed call
+MEMORY_SAMPLES = 3
+
+
+def _load(data_dir, name):
+    with open(os.path.join(data_dir, f'{name}.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed synthetic users and apartments from data/db_import and time filtering, ranking '
+        'and serialization. Each size is seeded inside a transaction that is rolled back, '
+        'so point it at a disposable database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            type=int,
+            default=[1000, 10000, 100000],
+            help='Numbers of apartments to benchmark (default: 1000 10000 100000)',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=20,
+            help='Number of searching users measured per size (default: 20)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of timed runs per user and stage (default: 3)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Number of recommendations requested (default: 10)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the synthetic data (default: 42)',
+        )
+        parser.add_argument(
+            '--data-dir',
+            default=os.path.join(settings.BASE_DIR, 'data', 'db_import'),
+            help='Directory with the apartments, apartment_features and user_responses JSON files',
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark_recommendations.json',
+            help='File the JSON results are written to (default: benchmark_recommendations.json)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            source = {
+                'apartments': _load(options['data_dir'], 'apartments'),
+                'apartment_features': _load(options['data_dir'], 'apartment_features'),
+                'user_responses': _load(options['data_dir'], 'user_responses'),
+            }
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read seed data: {str(e)}')
+
+        results = []
+        for size in options['sizes']:
+            self.stdout.write(f'\n== {size} apartments')
+            with transaction.atomic():
+                started = time.perf_counter()
+                searcher_ids, owners = self._seed(size, source, options)
+                seed_seconds = time.perf_counter() - started
+                self.stdout.write(f'Seeded {size} apartments and {owners} owners in {seed_seconds:.1f}s')
+
+                stages = self._run_stages(searcher_ids, options)
+                transaction.set_rollback(True)
+
+            # Workers' indexes and cached responses must not keep the rolled-back rows
+            bump_inventory_version()
+            bump_preference_index_version()
+            bump_listings_version()
+            results.append({
+                'apartments': size,
+                'owners': owners,
+                'users': len(searcher_ids),
+                'seed_seconds': round(seed_seconds, 3),
+                'stages': stages,
+            })
+            self._print_table(stages)
+
+        report = {
+            'commit': _commit(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'database_scoring': database_scoring_available(),
+            'inventory_index': settings.INVENTORY_INDEX_ENABLED,
+            'limit': options['limit'],
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"\nWrote results to {options['output']}"))
+
+    def _seed(self, size, source, options):
+        """
+        Create `size` apartments, their owners and the searching users.
+
+        Returns:
+            tuple: (searching user IDs, number of owners)
+        """
+        rng = random.Random(options['seed'] + size)
+        run = uuid.uuid4().hex[:8]
+        today = datetime.date.today()
+
+        questions = self._questions()
+        profiles = {}
+        for response in source['user_responses']:
+            profiles.setdefault(response['user_id'], []).append(
+                (int(response['question_id']), response['response'])
+            )
+        profiles = list(profiles.values())
+
+        templates = source['apartments']
+        features_by_apartment = {}
+        for row in source['apartment_features']:
+            features_by_apartment.setdefault(row['apartment_id'], []).append(row['feature'])
+        features = {
+            name: Feature.objects.get_or_create(name=name)[0]
+            for name in {row['feature'] for row in source['apartment_features']}
+        }
+        cities = {
+            name: City.objects.get_or_create(name=name, defaults={'hebrew_name': name})[0]
+            for name in {template['city'] for template in templates}
+        }
+
+        # Keep the source's ratio of apartments per owner
+        owners = max(1, round(size * len(profiles) / len(templates)))
+        users = self._create_users(f'bench-{run}-owner', owners)
+        searchers = self._create_users(f'bench-{run}-searcher', options['users'])
+        self._create_responses(users + searchers, questions, profiles, rng)
+
+        apartments = []
+        apartment_features = []
+        for i in range(size):
+            template = rng.choice(templates)
+            latitude = round(float(template['latitude'] or 31.25) + rng.uniform(-0.01, 0.01), 7)
+            longitude = round(float(template['longitude'] or 34.79) + rng.uniform(-0.01, 0.01), 7)
+            apartment = Apartment(
+                id=uuid.uuid4(),
+                user_id=users[i % owners],
+                city=cities[template['city']],
+                street=template['street'][:50],
+                type=template['type'][:50],
+                floor=max(1, template['floor']),
+                number_of_rooms=template['number_of_rooms'],
+                number_of_available_rooms=template['number_of_available_rooms'],
+                total_price=round(template['total_price'] * rng.uniform(0.85, 1.15)),
+                available_entry_date=today + datetime.timedelta(days=rng.randint(1, 120)),
+                about=template['about'],
+                latitude=latitude,
+                longitude=longitude,
+                geo_cell=grid_cell(latitude, longitude),
+                area=template['area'],
+                is_yad2=template['is_yad2'],
+            )
+            apartments.append(apartment)
+            for name in features_by_apartment.get(template['id'], []):
+                apartment_features.append(ApartmentFeature(apartment=apartment, feature=features[name]))
+        Apartment.objects.bulk_create(apartments, batch_size=BATCH_SIZE)
+        ApartmentFeature.objects.bulk_create(apartment_features, batch_size=BATCH_SIZE)
+
+        # Searchers want something like a random listing, so most of them get matches
+        preference_features = []
+        for user_id in searchers:
+            template = rng.choice(templates)
+            preferences = UserPreferences.objects.create(
+                user_id=user_id,
+                city=cities[template['city']],
+                max_price=int(template['total_price'] * 1.3),
+                number_of_roommates=rng.choice([[], [1], [1, 2]]),
+            )
+            for name in rng.sample(features_by_apartment.get(template['id'], []), k=rng.randint(0, 1)):
+                preference_features.append(UserPreferencesFeatures(user_preferences=preferences, feature=features[name]))
+        UserPreferencesFeatures.objects.bulk_create(preference_features)
+
+        if database_scoring_available():
+            save_answer_vectors(users + searchers)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        bump_inventory_version()
+        bump_preference_index_version()
+        return searchers, owners
+
+    def _questions(self):
+        """
+        Existing questions by ID, creating the ten the seed data answers if there are none.
+        """
+        questions = {question.id: question for question in Question.objects.all()}
+        if not questions:
+            template = QuestionnaireTemplate.objects.create(title='Benchmark')
+            for question_id in range(1, 11):
+                questions[question_id] = Question.objects.create(
+                    id=question_id, questionnaire=template, title=f'Question {question_id}',
+                    question_type='radio', order=question_id,
+                )
+        return questions
+
+    def _create_users(self, prefix, count):
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com', password='!') for i in range(count)],
+            batch_size=BATCH_SIZE,
+        )
+        return [user.id for user in users]
+
+    def _create_responses(self, user_ids, questions, profiles, rng):
+        responses = []
+        for user_id in user_ids:
+            for question_id, value in rng.choice(profiles):
+                question = questions.get(question_id)
+                if question is None:
+                    continue
+                if question.question_type == 'text':
+                    responses.append(UserResponse(user_id=user_id, question=question, text_response=str(value)))
+                else:
+                    responses.append(UserResponse(user_id=user_id, question=question, numeric_response=value))
+        UserResponse.objects.bulk_create(responses, batch_size=BATCH_SIZE)
+
+    def _run_stages(self, user_ids, options):
+        limit = options['limit']
+        top = {user_id: get_top_apartments(user_id, limit) for user_id in user_ids}
+        stages = {
+            'filter_apartments': lambda user_id: list(filter_apartments(user_id).values_list('id', flat=True)),
+            'rank_apartments_by_compatibility': lambda user_id: rank_apartments_by_compatibility(
+                filter_apartments(user_id), user_id, limit
+            ),
+            'get_top_apartments': lambda user_id: get_top_apartments(user_id, limit),
+            'hydrate_and_serialize': lambda user_id: ApartmentSerializer(
+                hydrate_apartments(top[user_id]), many=True
+            ).data,
+        }
+        return {name: self._measure(stage, user_ids, options['repeat']) for name, stage in stages.items()}
+
+    def _measure(self, stage, user_ids, repeat):
+        """
+        Time a stage for every user, then trace a few calls for peak memory.
+        """
+        latencies = []
+        query_counts = []
+        for _ in range(max(repeat, 1)):
+            for user_id in user_ids:
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    stage(user_id)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                query_counts.append(len(queries))
+
+        peak = 0
+        tracemalloc.start()
+        try:
+            for user_id in user_ids[:MEMORY_SAMPLES]:
+                tracemalloc.reset_peak()
+                stage(user_id)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        return {
+            'p50_ms': round(float(p50), 3),
+            'p90_ms': round(float(p90), 3),
+            'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(max(latencies)), 3),
+            'mean_queries': round(float(np.mean(query_counts)), 2),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def _print_table(self, stages):
+        self.stdout.write(
+            f"{'stage':<34} {'p50 (ms)':>10} {'p90 (ms)':>10} {'p99 (ms)':>10} {'queries':>8} {'peak (KB)':>10}"
+        )
+        for name, stats in stages.items():
+            self.stdout.write(
+                f"{name:<34} {stats['p50_ms']:>10.2f} {stats['p90_ms']:>10.2f} {stats['p99_ms']:>10.2f} "
+                f"{stats['mean_queries']:>8.1f} {stats['peak_memory_kb']:>10.1f}"
+            )
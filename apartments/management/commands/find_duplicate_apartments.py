@@ -0,0 +1,82 @@
+"""
+Management command to cluster apartments whose descriptions are near-duplicates.
+"""
+from django.core.management.base import BaseCommand
+
+from apartments.models import Apartment, ApartmentTextSignature
+from apartments.utils.near_duplicates import (
+    DUPLICATE_THRESHOLD,
+    band_keys,
+    cluster_signatures,
+    minhash_signature,
+)
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Cluster apartments with near-identical descriptions using MinHash and LSH'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DUPLICATE_THRESHOLD,
+            help='Minimum estimated Jaccard similarity between duplicate descriptions',
+        )
+        parser.add_argument(
+            '--store-signatures',
+            action='store_true',
+            help='Also rewrite the stored signatures used to flag duplicates on creation',
+        )
+        parser.add_argument(
+            '--mark',
+            action='store_true',
+            help='Point every later listing in a cluster at the earliest one',
+        )
+
+    def handle(self, *args, **options):
+        rows = Apartment.objects.order_by('created_at', 'id').values_list('id', 'about').iterator(chunk_size=BATCH_SIZE)
+
+        signatures = []
+        pending = []
+        for apartment_id, about in rows:
+            signature = minhash_signature(about)
+            if signature is None:
+                continue
+            signatures.append((apartment_id, signature))
+            if options['store_signatures']:
+                pending.append(ApartmentTextSignature(
+                    apartment_id=apartment_id,
+                    minhash=[int(value) for value in signature],
+                    bands=band_keys(signature),
+                ))
+                if len(pending) >= BATCH_SIZE:
+                    self._store(pending)
+                    pending = []
+        if pending:
+            self._store(pending)
+
+        clusters = cluster_signatures(signatures, options['threshold'])
+        self.stdout.write(f'Signed {len(signatures)} descriptions, found {len(clusters)} duplicate clusters')
+
+        if options['verbosity'] >= 2:
+            for members in clusters:
+                self.stdout.write(f'  {members[0]}: ' + ', '.join(str(member) for member in members[1:]))
+
+        if options['mark']:
+            marked = 0
+            for original, *duplicates in clusters:
+                marked += Apartment.objects.filter(id__in=duplicates).update(duplicate_of=original)
+            self.stdout.write(f'Marked {marked} apartments as duplicates')
+
+        duplicates = sum(len(members) - 1 for members in clusters)
+        self.stdout.write(self.style.SUCCESS(f'{duplicates} apartments duplicate an earlier listing'))
+
+    def _store(self, signatures):
+        ApartmentTextSignature.objects.bulk_create(
+            signatures,
+            update_conflicts=True,
+            unique_fields=['apartment'],
+            update_fields=['minhash', 'bands', 'updated_at'],
+        )
@@ -0,0 +1,230 @@
+"""
+Management command to precompute recommendation feeds for many users in parallel.
+"""
+import datetime
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apartments.models import Apartment, RecommendationFeed
+from apartments.utils.compatibility import get_questions_metadata, get_user_vectors
+from apartments.utils.compatibility_sql import database_scoring_available
+from apartments.utils.inventory_index import inventory_index
+from apartments.utils.recommendation_feed import FEED_SIZE, build_recommendation_feed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_SIZE = 200
+DEFAULT_CHECKPOINT = 'precompute_recommendations.checkpoint'
+
+
+def shard_users(user_ids, shard_size):
+    """
+    Split user IDs into consecutive shards.
+
+    Args:
+        user_ids: List of user IDs
+        shard_size: Maximum number of users per shard
+
+    Returns:
+        list: Lists of user IDs
+    """
+    return [user_ids[start:start + shard_size] for start in range(0, len(user_ids), shard_size)]
+
+
+def _init_worker(settings_module=None):
+    """
+    Prepare a worker process: its own database connection and warm shared data.
+
+    Forked workers inherit the parent's Django setup; spawned ones set it up here.
+    """
+    if settings_module and not settings.configured:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+    # Never reuse a connection inherited from the parent; the first query opens a fresh one
+    connections.close_all()
+    warm_shared_data()
+
+
+def warm_shared_data():
+    """
+    Load the data every user's ranking reads, once per process.
+
+    The questionnaire schema is always cached. The inventory index is loaded
+    when enabled, and owners' answer vectors are read in one query when
+    scoring happens in Python rather than in the database.
+    """
+    questions_metadata = get_questions_metadata()
+    if settings.INVENTORY_INDEX_ENABLED:
+        inventory_index.load()
+    if not database_scoring_available():
+        owner_ids = set(Apartment.objects.values_list('user_id', flat=True).distinct())
+        get_user_vectors(owner_ids, sorted(questions_metadata), questions_metadata)
+
+
+def precompute_shard(user_ids, size=FEED_SIZE):
+    """
+    Build the recommendation feeds of one shard of users.
+
+    Args:
+        user_ids: IDs of the users in the shard
+        size: Number of apartments kept per feed
+
+    Returns:
+        tuple: (number of feeds built, IDs of users that failed)
+    """
+    built = 0
+    failed = []
+    for user_id in user_ids:
+        try:
+            build_recommendation_feed(user_id, size)
+            built += 1
+        except Exception as e:
+            logger.error(f"Error precomputing recommendations for user {user_id}: {str(e)}")
+            failed.append(user_id)
+    return built, failed
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the recommendation feeds of all users (or --users) in parallel. Users are split '
+        'into shards that worker processes rank independently, each with its own database '
+        'connection. An interrupted run can be continued with --resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            nargs='+',
+            type=int,
+            help='Only precompute the feeds of these user IDs',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes; 1 runs in this process (default: number of CPUs)',
+        )
+        parser.add_argument(
+            '--shard-size',
+            type=int,
+            default=DEFAULT_SHARD_SIZE,
+            help=f'Number of users per shard (default: {DEFAULT_SHARD_SIZE})',
+        )
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=FEED_SIZE,
+            help=f'Number of apartments kept per feed (default: {FEED_SIZE})',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Skip users whose feed was already rebuilt by the interrupted run in the checkpoint file',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=DEFAULT_CHECKPOINT,
+            help=f'File recording when the current run started (default: {DEFAULT_CHECKPOINT})',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['shard_size'] < 1 or options['size'] < 1:
+            raise CommandError('--workers, --shard-size and --size must be positive')
+
+        started_at = self._start_run(options)
+
+        users = User.objects.filter(is_active=True)
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+        user_ids = list(users.order_by('id').values_list('id', flat=True))
+
+        if options['resume']:
+            done = set(RecommendationFeed.objects.filter(
+                user_id__in=user_ids, is_stale=False, updated_at__gte=started_at
+            ).values_list('user_id', flat=True))
+            user_ids = [user_id for user_id in user_ids if user_id not in done]
+            self.stdout.write(f'Resuming run started at {started_at.isoformat()}: {len(done)} feeds already built')
+
+        shards = shard_users(user_ids, options['shard_size'])
+        self.stdout.write(
+            f"Precomputing feeds for {len(user_ids)} users in {len(shards)} shards "
+            f"with {options['workers']} workers"
+        )
+
+        clock = time.perf_counter()
+        processed = 0
+        failed = []
+        for built, shard_failed in self._run_shards(shards, options):
+            processed += built + len(shard_failed)
+            failed.extend(shard_failed)
+            elapsed = time.perf_counter() - clock
+            rate = processed / elapsed if elapsed else 0.0
+            remaining = (len(user_ids) - processed) / rate if rate else 0.0
+            self.stdout.write(
+                f'  {processed}/{len(user_ids)} users ({len(failed)} failed), '
+                f'{rate:.1f} users/s, about {remaining:.0f}s left'
+            )
+
+        if failed:
+            # Keep the checkpoint so --resume retries the failures
+            self.stdout.write(self.style.WARNING(
+                f"{len(failed)} users failed and can be retried with --resume: "
+                + ', '.join(str(user_id) for user_id in failed[:20])
+            ))
+            return
+
+        if os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Precomputed {processed} feeds in {time.perf_counter() - clock:.1f}s'
+        ))
+
+    def _start_run(self, options):
+        """
+        Read the interrupted run's start time, or record the start of a new run.
+
+        Returns:
+            datetime: When the run started
+        """
+        path = options['checkpoint']
+        if options['resume']:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    return datetime.datetime.fromisoformat(json.load(f)['started_at'])
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'No run to resume in {path}: {str(e)}')
+
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'started_at': started_at.isoformat()}, f)
+        return started_at
+
+    def _run_shards(self, shards, options):
+        """
+        Precompute every shard, yielding each shard's result as it finishes.
+        """
+        if options['workers'] == 1:
+            warm_shared_data()
+            for shard in shards:
+                yield precompute_shard(shard, options['size'])
+            return
+
+        # Workers must open their own connections instead of sharing this one
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            initializer=_init_worker,
+            initargs=(os.environ.get('DJANGO_SETTINGS_MODULE'),),
+        ) as executor:
+            futures = [executor.submit(precompute_shard, shard, options['size']) for shard in shards]
+            for future in as_completed(futures):
+                yield future.result()
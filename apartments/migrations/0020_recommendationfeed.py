@@ -0,0 +1,29 @@
+# Generated by Django 4.2.17 on 2026-10-16 23:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('apartments', '0019_apartmentfeature_unique_apartment_feature_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationFeed',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('apartment_ids', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recommendation_feed', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apartments', '0020_recommendationfeed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apartmentfeature',
+            index=models.Index(fields=['feature', 'apartment'], name='apartment_feature_lookup_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.17 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+from apartments.utils.geo import grid_cell
+
+
+def populate_geo_cells(apps, schema_editor):
+    """
+    Compute the grid cell of every apartment that has coordinates.
+    """
+    Apartment = apps.get_model('apartments', 'Apartment')
+    apartments = list(Apartment.objects.filter(latitude__isnull=False, longitude__isnull=False))
+    for apartment in apartments:
+        apartment.geo_cell = grid_cell(apartment.latitude, apartment.longitude)
+    Apartment.objects.bulk_update(apartments, ['geo_cell'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apartments', '0021_apartment_feature_lookup_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='geo_cell',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, help_text='Grid cell of the coordinates, used for radius search', null=True),
+        ),
+        migrations.RunPython(populate_geo_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.17 on 2026-10-17 00:48
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apartments', '0022_apartment_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, help_text='Earlier listing with a near-identical description', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='apartments.apartment'),
+        ),
+        migrations.CreateModel(
+            name='ApartmentTextSignature',
+            fields=[
+                ('apartment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text_signature', serialize=False, to='apartments.apartment')),
+                ('minhash', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('bands', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['bands'], name='apartment_text_bands_idx')],
+            },
+        ),
+    ]
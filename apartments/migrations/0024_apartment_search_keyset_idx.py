@@ -0,0 +1,37 @@
+# Generated by Django 4.2.17 on 2026-10-17 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apartments', '0023_apartment_text_signature'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['total_price', 'id'], name='apartment_price_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['created_at', 'id'], name='apartment_created_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['available_entry_date', 'id'], name='apartment_entry_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['city', 'total_price', 'id'], name='apartment_city_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['city', 'created_at', 'id'], name='apartment_city_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['city', 'available_entry_date', 'id'], name='apartment_city_entry_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.17 on 2026-10-17 02:20
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from apartments.utils.text_search import CREATE_SEARCH_INDEX_SQL, DROP_SEARCH_INDEX_SQL, build_search_text
+
+
+def populate_search_text(apps, schema_editor):
+    """
+    Compute the normalized search text of every apartment.
+    """
+    Apartment = apps.get_model('apartments', 'Apartment')
+    apartments = list(Apartment.objects.only('id', 'street', 'area', 'about'))
+    for apartment in apartments:
+        apartment.search_text = build_search_text(apartment)
+    Apartment.objects.bulk_update(apartments, ['search_text'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apartments', '0024_apartment_search_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Normalized street, area and description, used for text search'),
+        ),
+        migrations.RunPython(populate_search_text, migrations.RunPython.noop),
+        TrigramExtension(),
+        # The GIN index lives outside the model state, since it needs pg_trgm installed first
+        migrations.RunSQL(CREATE_SEARCH_INDEX_SQL, DROP_SEARCH_INDEX_SQL),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apartments', '0025_apartment_search_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationfeed',
+            name='has_more',
+            field=models.BooleanField(default=True),
+        ),
+    ]
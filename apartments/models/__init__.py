@@ -4,6 +4,9 @@ from .feature import Feature
 from .photo import ApartmentPhoto
 from .apartment_feature import ApartmentFeature
 from .apartment_user_like import ApartmentUserLike
+from .recommendation_feed import RecommendationFeed
+from .text_signature import ApartmentTextSignature
 
 __all__ = ["City", "Apartment", "Feature", "ApartmentPhoto",
-           "ApartmentFeature", "ApartmentUserLike"]
+           "ApartmentFeature", "ApartmentUserLike", "RecommendationFeed",
+           "ApartmentTextSignature"]
@@ -7,6 +7,8 @@ from django.db import models
 from django.contrib.auth.models import User
 
 from apartments.models import City
+from apartments.utils.geo import grid_cell
+from apartments.utils.text_search import build_search_text
 
 
 class Apartment(models.Model):
@@ -28,13 +30,29 @@ class Apartment(models.Model):
     about = models.TextField(null=True, blank=True)
     latitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
     longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False, db_index=True, help_text="Grid cell of the coordinates, used for radius search")
     area = models.CharField(max_length=100, null=True, blank=True)
     is_yad2 = models.BooleanField(default=False)
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates', help_text="Earlier listing with a near-identical description")
+    search_text = models.TextField(blank=True, default='', editable=False, help_text="Normalized street, area and description, used for text search")
+
+    class Meta:
+        # Keyset pagination of search results seeks on (sort key, id), across all cities or within one
+        indexes = [
+            models.Index(fields=['total_price', 'id'], name='apartment_price_keyset_idx'),
+            models.Index(fields=['created_at', 'id'], name='apartment_created_keyset_idx'),
+            models.Index(fields=['available_entry_date', 'id'], name='apartment_entry_keyset_idx'),
+            models.Index(fields=['city', 'total_price', 'id'], name='apartment_city_price_idx'),
+            models.Index(fields=['city', 'created_at', 'id'], name='apartment_city_created_idx'),
+            models.Index(fields=['city', 'available_entry_date', 'id'], name='apartment_city_entry_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         """
         Enforce model validation before saving.
         """
+        self.geo_cell = grid_cell(self.latitude, self.longitude)
+        self.search_text = build_search_text(self)
         self.full_clean()  # This calls the clean method and raises ValidationError if validation fails
         super().save(*args, **kwargs)
 
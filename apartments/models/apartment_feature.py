@@ -21,6 +21,10 @@ class ApartmentFeature(models.Model):
                 name='unique_apartment_feature'
             )
         ]
+        indexes = [
+            # Covers "apartments having all of these features" lookups
+            models.Index(fields=['feature', 'apartment'], name='apartment_feature_lookup_idx'),
+        ]
 
     def __str__(self):
         return f"{self.apartment.id} - {self.feature.name}"
@@ -0,0 +1,23 @@
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import models
+
+
+class RecommendationFeed(models.Model):
+    """
+    This model stores a user's precomputed recommendations:
+    apartment IDs in ranked order with their compatibility scores.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="recommendation_feed")
+    apartment_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    is_stale = models.BooleanField(default=False)
+    # Whether the ranking was cut at the feed size, so more candidates exist past its end
+    has_more = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"Recommendation feed for user {self.user_id} ({len(self.apartment_ids)} apartments)"
@@ -0,0 +1,29 @@
+"""
+Model for storing the MinHash signature of an apartment's description.
+"""
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+
+from apartments.models.apartment import Apartment
+
+
+class ApartmentTextSignature(models.Model):
+    """
+    MinHash signature of an apartment's `about` text and its LSH band keys.
+
+    Apartments sharing any band key are near-duplicate candidates; the GIN
+    index on bands finds them with one array-overlap lookup.
+    """
+    apartment = models.OneToOneField(Apartment, on_delete=models.CASCADE, primary_key=True, related_name='text_signature')
+    minhash = ArrayField(models.BigIntegerField(), default=list)
+    bands = ArrayField(models.BigIntegerField(), default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['bands'], name='apartment_text_bands_idx'),
+        ]
+
+    def __str__(self):
+        return f"Text signature for apartment {self.apartment_id}"
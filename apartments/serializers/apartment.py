@@ -27,8 +27,9 @@ class ApartmentSerializer(serializers.ModelSerializer):
             'id', 'city', 'city_details', 'street', 'type', 'floor', 'number_of_rooms',
             'number_of_available_rooms', 'total_price', 'available_entry_date',
             'about', 'features', 'feature_details', 'user_id', 'created_at', 'photos', 'photo_urls',
-            'latitude', 'longitude', 'area', 'is_yad2', 'user_details'
+            'latitude', 'longitude', 'area', 'is_yad2', 'user_details', 'duplicate_of'
         ]
+        read_only_fields = ['duplicate_of']
 
     def get_city_details(self, obj):
         """
@@ -55,8 +56,15 @@ class ApartmentSerializer(serializers.ModelSerializer):
         """
         if obj.user:
             try:
-                user_details = UserDetails.objects.get(user=obj.user)
-                data = UserDetailsSerializer(user_details).data
+                # Reuse owner details prefetched by the recommendation queryset
+                owner_details = getattr(obj.user, 'owner_details', None)
+                if isinstance(owner_details, list):
+                    if not owner_details:
+                        return None
+                    user_details = owner_details[0]
+                else:
+                    user_details = UserDetails.objects.get(user=obj.user)
+                data = UserDetailsSerializer(user_details, context=self.context).data
                 # Remove user_id if it exists in the data
                 if 'user_id' in data:
                     data.pop('user_id')
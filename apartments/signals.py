@@ -0,0 +1,125 @@
+"""
+Signal handlers for the apartments app.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from apartments.models import Apartment, ApartmentFeature, ApartmentUserLike
+from apartments.utils.background import run_in_background
+from apartments.utils.inventory_index import refresh_indexed_apartment
+from apartments.utils.near_duplicates import refresh_text_signature
+from apartments.utils.preference_index import (
+    invalidate_matching_recommendations,
+    schedule_new_listing_announcement,
+)
+from apartments.utils.recommendation_cache import bump_listings_version, bump_seen_version
+from apartments.utils.recommendation_feed import mark_city_feeds_stale
+from apartments.utils.seen_apartments import forget_seen_apartments, mark_apartment_seen
+from apartments.utils.text_search import install_trigram_search
+
+
+@receiver(post_save, sender=Apartment)
+def apartment_created(sender, instance, created, **kwargs):
+    """
+    Refresh the feeds that can include a newly listed apartment and alert the users it matches.
+    """
+    if created:
+        mark_city_feeds_stale(instance.city_id)
+        schedule_new_listing_announcement(instance.id)
+
+
+@receiver(post_save, sender=Apartment)
+def apartment_updated(sender, instance, created, **kwargs):
+    """
+    Outdate every cached recommendation that may show the apartment's old details.
+    """
+    if not created:
+        bump_listings_version()
+
+
+@receiver(post_delete, sender=Apartment)
+def apartment_deleted(sender, instance, **kwargs):
+    """
+    Refresh the feeds and cached recommendations that may still list a removed apartment.
+    """
+    mark_city_feeds_stale(instance.city_id)
+    bump_listings_version()
+
+
+@receiver(post_save, sender=Apartment)
+@receiver(post_delete, sender=Apartment)
+def apartment_changed(sender, instance, **kwargs):
+    """
+    Update the inventory index once the apartment write is committed.
+    """
+    transaction.on_commit(lambda: refresh_indexed_apartment(instance.id))
+
+
+@receiver(post_save, sender=Apartment)
+def apartment_saved(sender, instance, **kwargs):
+    """
+    Store the signature used to spot reposted descriptions.
+    """
+    refresh_text_signature(instance)
+
+
+@receiver(post_save, sender=ApartmentFeature)
+@receiver(post_delete, sender=ApartmentFeature)
+def apartment_feature_changed(sender, instance, **kwargs):
+    """
+    Update the indexed features of an apartment once the write is committed.
+    """
+    transaction.on_commit(lambda: refresh_indexed_apartment(instance.apartment_id))
+
+
+@receiver(post_save, sender=ApartmentFeature)
+def apartment_feature_added(sender, instance, created, **kwargs):
+    """
+    Outdate the recommendations of users the apartment matches now that it has another feature.
+    """
+    if created:
+        run_in_background(
+            invalidate_matching_recommendations, instance.apartment_id,
+            key=('matching_recommendations', instance.apartment_id),
+        )
+
+
+@receiver(post_delete, sender=ApartmentFeature)
+def apartment_feature_removed(sender, instance, **kwargs):
+    """
+    Outdate cached recommendations that may show the apartment's removed feature.
+    """
+    bump_listings_version()
+
+
+@receiver(post_save, sender=ApartmentUserLike)
+def apartment_swiped(sender, instance, created, **kwargs):
+    """
+    Add a newly swiped apartment to the user's cached seen-set once the swipe is committed.
+    """
+    if created:
+        def update():
+            mark_apartment_seen(instance.user_id, instance.apartment_id)
+            bump_seen_version(instance.user_id)
+        transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=ApartmentUserLike)
+def apartment_swipe_removed(sender, instance, **kwargs):
+    """
+    Drop the user's cached seen-set once the removal is committed, so it is rebuilt without the swipe.
+    """
+    def update():
+        forget_seen_apartments(instance.user_id)
+        bump_seen_version(instance.user_id)
+    transaction.on_commit(update)
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    """
+    Make sure the trigram search index exists after migrating, including databases created without migrations.
+    """
+    if sender.name == 'apartments':
+        install_trigram_search(using)
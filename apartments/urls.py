@@ -2,7 +2,8 @@ from django.urls import path
 from .views import (
     ApartmentCreateView, ApartmentPostPayloadView, ApartmentView, 
     ApartmentLikeView, UserApartmentsView, UserLikedApartmentsView,
-    ApartmentLikersView, ApartmentRecommendationView
+    ApartmentLikersView, ApartmentRecommendationView, ApartmentNearbyView,
+    ApartmentMatchCountView, ApartmentFacetsView, ApartmentSearchView
 )
 
 urlpatterns = [
@@ -13,6 +14,10 @@ urlpatterns = [
     path('liked/', UserLikedApartmentsView.as_view(), name='user-liked-apartments'),
     path('likers/', ApartmentLikersView.as_view(), name='apartment-likers'),
     path('recommendations/', ApartmentRecommendationView.as_view(), name='apartment-recommendations'),
+    path('nearby/', ApartmentNearbyView.as_view(), name='apartment-nearby'),
+    path('match-count/', ApartmentMatchCountView.as_view(), name='apartment-match-count'),
+    path('facets/', ApartmentFacetsView.as_view(), name='apartment-facets'),
+    path('search/', ApartmentSearchView.as_view(), name='apartment-search'),
     path('<str:apartment_id>/', ApartmentView.as_view(), name='apartment-get'),
     
 ]
@@ -0,0 +1,98 @@
+"""
+In-process store of packed questionnaire answers.
+Keeps each user's answers as a fixed-width vector so compatibility scoring
+doesn't have to go back to the database for every comparison.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of users kept per worker before the least recently used are dropped
+DEFAULT_MAX_USERS = 20000
+
+# Entries older than this are reloaded, so writes handled by other workers show up eventually
+DEFAULT_TTL_SECONDS = 300
+
+
+class AnswerVectorStore:
+    """
+    LRU-bounded, lazily warmed store of encoded questionnaire answers.
+
+    Entries are keyed by user ID and tagged with the questionnaire schema they
+    were encoded against; a schema change empties the store.
+    """
+
+    def __init__(self, max_users=DEFAULT_MAX_USERS, ttl=DEFAULT_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._schema = None
+        self._lock = threading.Lock()
+
+    def get_many(self, user_ids, schema, loader):
+        """
+        Get encoded answers for several users, loading the missing ones in one call.
+
+        Args:
+            user_ids: Iterable of user IDs
+            schema: Hashable description of the question columns
+            loader: Callable taking a list of user IDs and returning {user_id: vector}
+
+        Returns:
+            dict: Dictionary of {user_id: vector}
+        """
+        now = time.monotonic()
+        found = {}
+        missing = []
+
+        with self._lock:
+            if schema != self._schema:
+                self._entries.clear()
+                self._schema = schema
+
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None and now - entry[0] < self.ttl:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[1]
+                else:
+                    missing.append(user_id)
+
+        if missing:
+            loaded = loader(missing)
+            with self._lock:
+                # Don't cache vectors encoded against a schema that was replaced meanwhile
+                if schema == self._schema:
+                    for user_id, vector in loaded.items():
+                        self._entries[user_id] = (now, vector)
+                        self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.max_users:
+                        self._entries.popitem(last=False)
+            found.update(loaded)
+
+        return found
+
+    def invalidate(self, user_id):
+        """
+        Drop a user's cached answers after they change.
+        """
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """
+        Drop all cached answers.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._schema = None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Per-worker store shared by all compatibility computations
+answer_store = AnswerVectorStore()
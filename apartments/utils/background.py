@@ -0,0 +1,61 @@
+"""
+Minimal in-process background task runner.
+Used for cache refreshes that shouldn't delay the request that triggered them.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Single worker thread so refreshes for the same user never race
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='appartners-background')
+
+# Keys of tasks that are queued but not started yet
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _run(func, args, key):
+    if key is not None:
+        with _pending_lock:
+            _pending.discard(key)
+    try:
+        func(*args)
+    except Exception as e:
+        logger.error(f"Error in background task {func.__name__}{args}: {str(e)}")
+    finally:
+        # Background threads hold their own connection; don't leak it
+        connection.close()
+
+
+def run_in_background(func, *args, key=None):
+    """
+    Run a function in the background once the current transaction commits.
+
+    Args:
+        func: Function to run
+        *args: Positional arguments for the function
+        key: Optional deduplication key; a task with the same key that is
+             still queued is not submitted again
+    """
+    def submit():
+        if key is not None:
+            with _pending_lock:
+                if key in _pending:
+                    return
+                _pending.add(key)
+        _executor.submit(_run, func, args, key)
+
+    transaction.on_commit(submit)
+
+
+def wait_for_background_tasks():
+    """
+    Block until every task submitted so far has finished.
+
+    With a single worker thread, a no-op submitted now runs after all of them.
+    """
+    _executor.submit(lambda: None).result()
@@ -4,10 +4,27 @@ Implements a weighted hybrid approach for questionnaire matching.
 """
 import logging
 from difflib import SequenceMatcher
-from users.models.questionnaire import UserResponse, Question
+
+import numpy as np
+
+from apartments.utils.answer_store import answer_store
+from users.models.questionnaire import UserResponse
+from users.utils.questionnaire_schema import get_questionnaire_schema
 
 logger = logging.getLogger(__name__)
 
+# Sentinels used when packing answers into int8 vectors (radio answers are 1-5)
+ANSWER_MISSING = -128  # The user has no response row for the question
+ANSWER_EMPTY = -127    # The row exists but holds no usable answer
+ANSWER_PRESENT = 1     # Marker for non-empty text answers
+
+# Question IDs with special handling in calculate_question_similarity
+MAJOR_QUESTION_ID = 1
+YEAR_QUESTION_ID = 2
+CRITICAL_QUESTION_IDS = [8]
+
+NEUTRAL_SCORE = 0.5
+
 
 def get_user_responses(user_id):
     """
@@ -25,24 +42,12 @@ def get_user_responses(user_id):
 
 def get_questions_metadata():
     """
-    Get metadata for all questions.
+    Get metadata for all questions from the versioned questionnaire schema cache.
     
     Returns:
         dict: Dictionary of question metadata keyed by question ID
     """
-    questions = Question.objects.all()
-    metadata = {}
-    
-    for q in questions:
-        metadata[q.id] = {
-            'type': q.question_type,
-            'weight': q.weight,
-            'options': q.options,
-            'order': q.order,
-            'title': q.title  # Changed from 'text' to 'title' to match the model
-        }
-    
-    return metadata
+    return get_questionnaire_schema().questions_metadata
 
 
 def text_field_similarity(text1, text2):
@@ -176,27 +181,23 @@ def calculate_question_similarity(q_id, response1, response2, q_metadata):
             return similarity
 
 
-def calculate_user_compatibility(user_id1, user_id2):
+def calculate_responses_compatibility(user1_responses, user2_responses, questions_metadata):
     """
-    Calculate compatibility score between two users based on questionnaire.
+    Calculate compatibility score between two sets of questionnaire responses.
     Uses a weighted hybrid approach that handles different question types appropriately.
     
+    This is the reference implementation that score_answer_matrix reproduces.
+    
     Args:
-        user_id1: ID of the first user
-        user_id2: ID of the second user
+        user1_responses: First user's responses keyed by question ID
+        user2_responses: Second user's responses keyed by question ID
+        questions_metadata: Question metadata keyed by question ID
         
     Returns:
-        float or dict: Compatibility score between 0 and 1, or detailed results if detailed=True
+        float: Compatibility score between 0 and 1
     """
     try:
 
-        # Get responses for both users
-        user1_responses = get_user_responses(user_id1)
-        user2_responses = get_user_responses(user_id2)
-        
-        # Get question metadata
-        questions_metadata = get_questions_metadata()
-
         # If either user has no responses, return a neutral score
         if not user1_responses or not user2_responses:
             return 0.5
@@ -259,4 +260,270 @@ def calculate_user_compatibility(user_id1, user_id2):
             
     except Exception as e:
         logger.error(f"Error calculating user compatibility: {str(e)}")
-        return 0.5  # Return neutral score on error
\ No newline at end of file
+        return 0.5  # Return neutral score on error
+
+
+def calculate_user_compatibility(user_id1, user_id2):
+    """
+    Calculate compatibility score between two users based on questionnaire.
+    Reads both users' answers from the per-worker answer store.
+    
+    Args:
+        user_id1: ID of the first user
+        user_id2: ID of the second user
+        
+    Returns:
+        float: Compatibility score between 0 and 1
+    """
+    return float(score_many(user_id1, [user_id2])[0])
+
+
+def _is_empty_text(value):
+    """
+    Check whether a text response counts as missing.
+    """
+    return value is None or value == '' or value == 'None'
+
+
+# Non-numeric year answers are interned so equal strings still compare equal
+_year_codes = {}
+
+
+def encode_year(text_response):
+    """
+    Parse the year answer once so it can be compared as an integer.
+    
+    Args:
+        text_response: Raw text response for the year question
+        
+    Returns:
+        tuple: (value, is_int) where value is the parsed year, or an interned
+               code for answers that are not integers
+    """
+    if _is_empty_text(text_response):
+        return 0, False
+    try:
+        return int(text_response), True
+    except (ValueError, TypeError):
+        return _year_codes.setdefault(text_response, len(_year_codes)), False
+
+
+def encode_user_answers(responses, question_ids, questions_metadata):
+    """
+    Pack a user's responses into a fixed-width int8 vector.
+    
+    Radio questions store the numeric answer, text questions store
+    ANSWER_PRESENT and the year question is parsed separately.
+    
+    Args:
+        responses: Dictionary of responses keyed by question ID
+        question_ids: Sorted list of question IDs defining the vector columns
+        questions_metadata: Question metadata keyed by question ID
+        
+    Returns:
+        tuple: (answers, year_value, year_is_int)
+    """
+    answers = np.full(len(question_ids), ANSWER_MISSING, dtype=np.int8)
+    year_value, year_is_int = 0, False
+    
+    for col, q_id in enumerate(question_ids):
+        resp = responses.get(q_id)
+        if resp is None:
+            continue
+        
+        if questions_metadata[q_id].get('type', 'radio') == 'text':
+            if _is_empty_text(resp.text_response):
+                answers[col] = ANSWER_EMPTY
+            else:
+                answers[col] = ANSWER_PRESENT
+            if q_id == YEAR_QUESTION_ID:
+                year_value, year_is_int = encode_year(resp.text_response)
+        elif resp.numeric_response is None:
+            answers[col] = ANSWER_EMPTY
+        else:
+            # Keep the sentinels reserved; scale answers are well inside this range
+            answers[col] = min(max(int(resp.numeric_response), ANSWER_EMPTY + 1), 127)
+    
+    return answers, year_value, year_is_int
+
+
+def get_responses_for_users(user_ids):
+    """
+    Get questionnaire responses for several users in a single query.
+    
+    Args:
+        user_ids: Iterable of user IDs
+        
+    Returns:
+        dict: Dictionary of {user_id: {question_id: response}}
+    """
+    responses_by_user = {}
+    responses = UserResponse.objects.filter(user_id__in=list(user_ids)).only(
+        'user_id', 'question_id', 'text_response', 'numeric_response'
+    )
+    for resp in responses:
+        responses_by_user.setdefault(resp.user_id, {})[resp.question_id] = resp
+    return responses_by_user
+
+
+def get_user_vectors(user_ids, question_ids, questions_metadata, use_store=True):
+    """
+    Get packed answer vectors for several users from the answer store.
+    Users missing from the store are loaded together in a single query.
+    
+    Args:
+        user_ids: Iterable of user IDs
+        question_ids: Sorted list of question IDs defining the vector columns
+        questions_metadata: Question metadata keyed by question ID
+        use_store: Whether to read through the answer store; pass False to
+            load every user from the database, e.g. for scores that are persisted
+        
+    Returns:
+        dict: Dictionary of {user_id: (answers, year_value, year_is_int)}
+    """
+    schema = tuple((q_id, questions_metadata[q_id].get('type', 'radio')) for q_id in question_ids)
+    
+    def load(missing_ids):
+        responses_by_user = get_responses_for_users(missing_ids)
+        return {
+            uid: encode_user_answers(responses_by_user.get(uid, {}), question_ids, questions_metadata)
+            for uid in missing_ids
+        }
+    
+    if not use_store:
+        return load(list(user_ids))
+    return answer_store.get_many(user_ids, schema, load)
+
+
+def invalidate_user_answers(user_id):
+    """
+    Drop a user's cached answer vector after their responses change.
+    
+    Args:
+        user_id: ID of the user whose responses were written
+    """
+    answer_store.invalidate(user_id)
+
+
+def _year_similarity(user_value, user_is_int, values, is_int, usable):
+    """
+    Vectorized version of the year rule in calculate_question_similarity.
+    """
+    diff = np.abs(values - user_value)
+    if user_is_int:
+        parsed = np.select([diff == 0, diff == 1, diff == 2], [1.0, 0.8, 0.3], 0.0)
+        similarity = np.where(is_int, parsed, 0.0)
+    else:
+        # Equal non-numeric strings are an exact match, anything else scores 0
+        similarity = np.where(~is_int & (diff == 0), 1.0, 0.0)
+    return np.where(usable, similarity, 0.0)
+
+
+def score_answer_matrix(user_vector, answers, year_values, year_is_int, question_ids, questions_metadata):
+    """
+    Score one user's packed answers against a matrix of other users' answers.
+    
+    Applies the same rules as calculate_user_compatibility, column by column
+    in question order, so the floating point results are identical.
+    
+    Args:
+        user_vector: Tuple returned by encode_user_answers for the user
+        answers: int8 matrix of shape (n_users, n_questions)
+        year_values: Parsed year answers of shape (n_users,)
+        year_is_int: Boolean array of shape (n_users,)
+        question_ids: Sorted list of question IDs defining the columns
+        questions_metadata: Question metadata keyed by question ID
+        
+    Returns:
+        ndarray: Compatibility scores between 0 and 1
+    """
+    user_answers, user_year, user_year_is_int = user_vector
+    n_users = answers.shape[0]
+    
+    weighted_score = np.zeros(n_users)
+    total_weight = np.zeros(n_users)
+    # Text questions other than year/major make the per-pair function fall back to neutral
+    unsupported = np.zeros(n_users, dtype=bool)
+    
+    user_has_responses = bool((user_answers != ANSWER_MISSING).any())
+    other_has_responses = (answers != ANSWER_MISSING).any(axis=1)
+    
+    for col, q_id in enumerate(question_ids):
+        if q_id == MAJOR_QUESTION_ID:
+            continue
+        
+        user_answer = int(user_answers[col])
+        if user_answer == ANSWER_MISSING:
+            continue
+        
+        other = answers[:, col].astype(np.int16)
+        q_meta = questions_metadata[q_id]
+        common = other != ANSWER_MISSING
+        
+        if q_meta.get('type', 'radio') == 'text':
+            counted = common & ~((other == ANSWER_EMPTY) & (user_answer == ANSWER_EMPTY))
+            if q_id != YEAR_QUESTION_ID:
+                unsupported |= counted
+                continue
+            usable = (other != ANSWER_EMPTY) & (user_answer != ANSWER_EMPTY)
+            similarity = _year_similarity(user_year, user_year_is_int, year_values, year_is_int, usable)
+        else:
+            counted = common & ~((other == ANSWER_EMPTY) & (user_answer == ANSWER_EMPTY))
+            difference = np.abs(other - user_answer)
+            if q_id in CRITICAL_QUESTION_IDS:
+                similarity = np.select([difference == 0, difference == 1], [1.0, 0.3], 0.0)
+            else:
+                similarity = np.maximum(0, 1.0 - (difference / 4))
+            usable = (other != ANSWER_EMPTY) & (user_answer != ANSWER_EMPTY)
+            similarity = np.where(usable, similarity, 0.0)
+        
+        weight = q_meta.get('weight', 1.0)
+        weighted_score = np.where(counted, weighted_score + similarity * weight, weighted_score)
+        total_weight = np.where(counted, total_weight + weight, total_weight)
+    
+    neutral = ~other_has_responses | unsupported | (total_weight == 0) | (not user_has_responses)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = weighted_score / total_weight
+    return np.where(neutral, NEUTRAL_SCORE, scores)
+
+
+def score_many(user_id, other_user_ids, use_store=True):
+    """
+    Calculate compatibility between one user and many others at once.
+    
+    Answers come from the answer store (missing users are loaded in a single
+    query) and are scored as array operations. Results match
+    calculate_responses_compatibility for every pair.
+    
+    Args:
+        user_id: ID of the user to compare against
+        other_user_ids: Sequence of user IDs (None entries score as neutral)
+        use_store: Whether to read answers through the answer store, which
+            may lag writes handled by other workers
+        
+    Returns:
+        ndarray: Compatibility scores aligned with other_user_ids
+    """
+    other_user_ids = list(other_user_ids)
+    if not other_user_ids:
+        return np.zeros(0)
+    
+    try:
+        questions_metadata = get_questions_metadata()
+        question_ids = sorted(questions_metadata)
+        
+        unique_ids = {uid for uid in other_user_ids if uid is not None}
+        vectors = get_user_vectors(unique_ids | {user_id}, question_ids, questions_metadata, use_store=use_store)
+        empty_vector = encode_user_answers({}, question_ids, questions_metadata)
+        rows = [vectors.get(uid, empty_vector) for uid in other_user_ids]
+        
+        answers = np.array([row[0] for row in rows], dtype=np.int8).reshape(len(rows), len(question_ids))
+        year_values = np.array([row[1] for row in rows], dtype=np.int64)
+        year_is_int = np.array([row[2] for row in rows], dtype=bool)
+        
+        return score_answer_matrix(
+            vectors[user_id], answers, year_values, year_is_int, question_ids, questions_metadata
+        )
+    except Exception as e:
+        logger.error(f"Error calculating batch compatibility: {str(e)}")
+        return np.full(len(other_user_ids), NEUTRAL_SCORE)
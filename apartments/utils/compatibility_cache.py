@@ -0,0 +1,172 @@
+"""
+Persistent pairwise compatibility cache.
+Scores are stored in UserCompatibility and refreshed per user when their
+questionnaire changes, so repeat comparisons are a bulk read.
+"""
+import logging
+
+import numpy as np
+from django.db.models import Max, Q
+
+from apartments.utils.background import run_in_background
+from apartments.utils.compatibility import score_many
+from users.models import UserCompatibility, UserResponse
+from users.utils.questionnaire_schema import get_schema_version
+
+logger = logging.getLogger(__name__)
+
+# Number of pairs written per upsert statement
+SAVE_BATCH_SIZE = 1000
+
+
+def get_responses_versions(user_ids):
+    """
+    Get the current questionnaire version of several users.
+
+    The version is the latest response update time in microseconds, or 0 when
+    the user has no responses.
+
+    Args:
+        user_ids: Iterable of user IDs
+
+    Returns:
+        dict: Dictionary of {user_id: version}
+    """
+    user_ids = list(user_ids)
+    versions = {uid: 0 for uid in user_ids}
+    latest = UserResponse.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+        latest=Max('updated_at')
+    )
+    for row in latest:
+        versions[row['user_id']] = int(row['latest'].timestamp() * 1_000_000)
+    return versions
+
+
+def _ordered_pair(user_id, other_id):
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+
+def save_compatibility_scores(user_id, other_user_ids, scores, versions, schema_version):
+    """
+    Insert or update the stored scores between a user and several others.
+
+    Args:
+        user_id: ID of the user the scores were computed for
+        other_user_ids: List of counterpart user IDs
+        scores: Scores aligned with other_user_ids
+        versions: Dictionary of {user_id: version} covering all users involved
+        schema_version: Questionnaire schema version read before scoring
+    """
+    rows = []
+    for other_id, score in zip(other_user_ids, scores):
+        user_a, user_b = _ordered_pair(user_id, other_id)
+        rows.append(UserCompatibility(
+            user_a_id=user_a,
+            user_b_id=user_b,
+            score=float(score),
+            user_a_version=versions[user_a],
+            user_b_version=versions[user_b],
+            schema_version=schema_version,
+        ))
+
+    UserCompatibility.objects.bulk_create(
+        rows,
+        batch_size=SAVE_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['user_a', 'user_b'],
+        update_fields=['score', 'user_a_version', 'user_b_version', 'schema_version', 'computed_at'],
+    )
+
+
+def get_compatibility_scores(user_id, other_user_ids):
+    """
+    Get compatibility between one user and many others from the pairwise cache.
+
+    Fresh rows are read in one query; missing or stale pairs are scored with
+    score_many and written back.
+
+    Args:
+        user_id: ID of the user to compare against
+        other_user_ids: Sequence of user IDs (None entries score as neutral)
+
+    Returns:
+        ndarray: Compatibility scores aligned with other_user_ids
+    """
+    other_user_ids = list(other_user_ids)
+    if not other_user_ids:
+        return np.zeros(0)
+
+    try:
+        # Self pairs and ownerless apartments are never stored
+        pair_ids = {uid for uid in other_user_ids if uid is not None and uid != user_id}
+        if not pair_ids:
+            return score_many(user_id, other_user_ids)
+
+        # Read before scoring, so a concurrent change leaves the new rows stale
+        schema_version = get_schema_version()
+        versions = get_responses_versions(pair_ids | {user_id})
+
+        cached = {}
+        rows = UserCompatibility.objects.filter(
+            Q(user_a_id=user_id, user_b_id__in=[uid for uid in pair_ids if uid > user_id]) |
+            Q(user_b_id=user_id, user_a_id__in=[uid for uid in pair_ids if uid < user_id])
+        ).values_list('user_a_id', 'user_b_id', 'score', 'user_a_version', 'user_b_version', 'schema_version')
+        for user_a, user_b, score, user_a_version, user_b_version, row_schema_version in rows:
+            if (user_a_version, user_b_version, row_schema_version) == (versions[user_a], versions[user_b], schema_version):
+                cached[user_b if user_a == user_id else user_a] = score
+
+        missing = [uid for uid in pair_ids if uid not in cached]
+        if missing:
+            # Persisted under the versions read above, so score with answers read
+            # from the database rather than a possibly older in-process copy
+            missing_scores = score_many(user_id, missing, use_store=False)
+            save_compatibility_scores(user_id, missing, missing_scores, versions, schema_version)
+            cached.update(zip(missing, missing_scores.tolist()))
+
+        scores = np.array([cached.get(uid, np.nan) for uid in other_user_ids], dtype=float)
+        uncached = np.isnan(scores)
+        if uncached.any():
+            uncached_ids = [uid for uid, flag in zip(other_user_ids, uncached) if flag]
+            scores[uncached] = score_many(user_id, uncached_ids)
+        return scores
+    except Exception as e:
+        logger.error(f"Error reading cached compatibility scores: {str(e)}")
+        return score_many(user_id, other_user_ids)
+
+
+def recompute_user_compatibility(user_id, batch_size=SAVE_BATCH_SIZE):
+    """
+    Refresh every stored pair involving a user after their questionnaire changed.
+
+    Args:
+        user_id: ID of the user whose responses were written
+        batch_size: Number of counterparts scored per batch
+
+    Returns:
+        int: Number of pairs refreshed
+    """
+    pairs = UserCompatibility.objects.filter(
+        Q(user_a_id=user_id) | Q(user_b_id=user_id)
+    ).values_list('user_a_id', 'user_b_id')
+    other_ids = [user_b if user_a == user_id else user_a for user_a, user_b in pairs]
+
+    for start in range(0, len(other_ids), batch_size):
+        batch = other_ids[start:start + batch_size]
+        schema_version = get_schema_version()
+        versions = get_responses_versions(batch + [user_id])
+        save_compatibility_scores(
+            user_id, batch, score_many(user_id, batch, use_store=False), versions, schema_version
+        )
+
+    logger.info(f"Recomputed {len(other_ids)} compatibility pairs for user {user_id}")
+    return len(other_ids)
+
+
+def schedule_compatibility_recompute(user_id):
+    """
+    Refresh a user's stored pairs in the background once the current transaction commits.
+
+    Args:
+        user_id: ID of the user whose responses were written
+    """
+    run_in_background(recompute_user_compatibility, user_id, key=('compatibility', user_id))
@@ -0,0 +1,319 @@
+"""
+Compatibility scoring inside Postgres.
+Each user's answers are kept packed in UserAnswerVector so recommendation
+queries can score and order candidates with the appartners_compatibility
+SQL function instead of loading owners' responses into Python.
+"""
+import logging
+import threading
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection, connections, transaction
+from django.db.models import (
+    BigIntegerField, F, FloatField, Func, IntegerField, SmallIntegerField, TextField, Value,
+)
+from django.db.models.functions import Cast
+
+from apartments.utils.compatibility import (
+    ANSWER_MISSING,
+    CRITICAL_QUESTION_IDS,
+    MAJOR_QUESTION_ID,
+    YEAR_QUESTION_ID,
+    _is_empty_text,
+    encode_user_answers,
+    get_questions_metadata,
+    get_responses_for_users,
+)
+from users.models import UserAnswerVector, UserResponse
+
+logger = logging.getLogger(__name__)
+
+# Question kinds understood by the appartners_compatibility SQL function
+KIND_SKIP = 0
+KIND_SCALE = 1
+KIND_CRITICAL = 2
+KIND_YEAR = 3
+KIND_UNSUPPORTED = 4
+
+# SQL port of calculate_responses_compatibility, installed after every migrate
+COMPATIBILITY_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION appartners_compatibility(
+    a_answers smallint[], a_year bigint, a_year_text text,
+    b_answers smallint[], b_year bigint, b_year_text text,
+    kinds integer[], weights double precision[]
+) RETURNS double precision
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+DECLARE
+    q integer;
+    a integer;
+    b integer;
+    diff bigint;
+    similarity double precision;
+    weighted_score double precision := 0;
+    total_weight double precision := 0;
+BEGIN
+    -- Users without any responses get a neutral score
+    IF a_answers IS NULL OR b_answers IS NULL
+       OR NOT (-128 <> ANY(a_answers)) OR NOT (-128 <> ANY(b_answers)) THEN
+        RETURN 0.5;
+    END IF;
+
+    FOR q IN 1 .. coalesce(array_length(kinds, 1), 0) LOOP
+        CONTINUE WHEN kinds[q] = 0;
+        a := coalesce(a_answers[q], -128);
+        b := coalesce(b_answers[q], -128);
+        -- Only questions both users have a row for, skipping rows both left empty
+        CONTINUE WHEN a = -128 OR b = -128 OR (a = -127 AND b = -127);
+
+        IF kinds[q] = 4 THEN
+            RETURN 0.5;
+        ELSIF a = -127 OR b = -127 THEN
+            similarity := 0;
+        ELSIF kinds[q] = 3 THEN
+            IF a_year IS NOT NULL AND b_year IS NOT NULL THEN
+                diff := abs(a_year - b_year);
+                similarity := CASE diff WHEN 0 THEN 1 WHEN 1 THEN 0.8 WHEN 2 THEN 0.3 ELSE 0 END;
+            ELSIF a_year_text = b_year_text THEN
+                similarity := 1;
+            ELSE
+                similarity := 0;
+            END IF;
+        ELSE
+            diff := abs(a - b);
+            IF kinds[q] = 2 THEN
+                similarity := CASE diff WHEN 0 THEN 1 WHEN 1 THEN 0.3 ELSE 0 END;
+            ELSE
+                similarity := greatest(0, 1::double precision - diff::double precision / 4);
+            END IF;
+        END IF;
+
+        weighted_score := weighted_score + similarity * weights[q];
+        total_weight := total_weight + weights[q];
+    END LOOP;
+
+    IF total_weight = 0 THEN
+        RETURN 0.5;
+    END IF;
+    RETURN weighted_score / total_weight;
+END;
+$$;
+"""
+
+# Users whose vectors are written per upsert statement
+SAVE_BATCH_SIZE = 1000
+
+# Python's int() accepts arbitrarily large years; those outside this range
+# (where a difference could overflow bigint) compare as text
+_YEAR_RANGE = range(-2 ** 62, 2 ** 62)
+
+
+def database_scoring_available():
+    """
+    Check whether recommendations can be scored by the database.
+
+    Returns:
+        bool: True when running on Postgres
+    """
+    return connection.vendor == 'postgresql'
+
+
+def install_compatibility_function(using='default'):
+    """
+    Create or replace the appartners_compatibility SQL function.
+
+    Args:
+        using: Alias of the database to install into
+    """
+    if connections[using].vendor != 'postgresql':
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(COMPATIBILITY_FUNCTION_SQL)
+
+
+def encode_answer_array(responses, questions_metadata):
+    """
+    Pack a user's responses into an array indexed by question ID.
+
+    Args:
+        responses: Dictionary of responses keyed by question ID
+        questions_metadata: Question metadata keyed by question ID
+
+    Returns:
+        tuple: (answers, year_value, year_text) where answers[q - 1] holds question q
+    """
+    question_ids = sorted(q_id for q_id in responses if q_id in questions_metadata)
+    answers = [ANSWER_MISSING] * (question_ids[-1] if question_ids else 0)
+    packed, _, _ = encode_user_answers(responses, question_ids, questions_metadata)
+    for q_id, answer in zip(question_ids, packed.tolist()):
+        answers[q_id - 1] = answer
+
+    year_value, year_text = None, None
+    year_response = responses.get(YEAR_QUESTION_ID)
+    if year_response is not None and not _is_empty_text(year_response.text_response):
+        year_text = year_response.text_response
+        try:
+            year_value = int(year_text)
+        except (ValueError, TypeError):
+            year_value = None
+        if year_value is not None and year_value not in _YEAR_RANGE:
+            year_value = None
+
+    return answers, year_value, year_text
+
+
+def save_answer_vectors(user_ids):
+    """
+    Rebuild the stored answer vectors of several users from their responses.
+
+    Args:
+        user_ids: Iterable of user IDs
+
+    Returns:
+        int: Number of vectors written
+    """
+    user_ids = list(user_ids)
+    questions_metadata = get_questions_metadata()
+    written = 0
+
+    for start in range(0, len(user_ids), SAVE_BATCH_SIZE):
+        batch = user_ids[start:start + SAVE_BATCH_SIZE]
+        responses_by_user = get_responses_for_users(batch)
+        rows = []
+        for user_id in batch:
+            answers, year_value, year_text = encode_answer_array(
+                responses_by_user.get(user_id, {}), questions_metadata
+            )
+            rows.append(UserAnswerVector(
+                user_id=user_id, answers=answers, year_value=year_value, year_text=year_text
+            ))
+        UserAnswerVector.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['answers', 'year_value', 'year_text', 'updated_at'],
+        )
+        written += len(rows)
+
+    return written
+
+
+def rebuild_answer_vectors():
+    """
+    Re-encode the vector of every user with responses, e.g. after a question changed type.
+
+    Returns:
+        int: Number of vectors written
+    """
+    user_ids = UserResponse.objects.values_list('user_id', flat=True).distinct().order_by('user_id')
+    return save_answer_vectors(user_ids)
+
+
+def save_answer_vector(user_id):
+    """
+    Rebuild a user's stored answer vector after their responses were written.
+
+    Args:
+        user_id: ID of the user
+    """
+    try:
+        save_answer_vectors([user_id])
+    except Exception as e:
+        logger.error(f"Error saving answer vector for user {user_id}: {str(e)}")
+
+
+# Per-thread {user_id: callback} of answer vector saves waiting for a commit
+_pending_saves = threading.local()
+
+
+def schedule_answer_vector_save(user_id):
+    """
+    Rebuild a user's stored answer vector once the current transaction commits.
+
+    Responses written together in one transaction share a single rebuild.
+
+    Args:
+        user_id: ID of the user whose responses were written
+    """
+    pending = getattr(_pending_saves, 'callbacks', None)
+    if pending is None:
+        pending = _pending_saves.callbacks = {}
+
+    # Callbacks of a rolled back transaction are dropped, so only trust one still registered
+    callback = pending.get(user_id)
+    if callback is not None and any(entry[1] is callback for entry in transaction.get_connection().run_on_commit):
+        return
+
+    def save():
+        pending.pop(user_id, None)
+        save_answer_vector(user_id)
+
+    pending[user_id] = save
+    transaction.on_commit(save)
+
+
+def get_scoring_parameters(questions_metadata):
+    """
+    Describe each question for the SQL scorer.
+
+    Args:
+        questions_metadata: Question metadata keyed by question ID
+
+    Returns:
+        tuple: (kinds, weights) lists indexed by question ID
+    """
+    size = max(questions_metadata, default=0)
+    kinds = [KIND_SKIP] * size
+    weights = [0.0] * size
+    for q_id, q_meta in questions_metadata.items():
+        if q_id == MAJOR_QUESTION_ID:
+            continue
+        if q_meta.get('type', 'radio') == 'text':
+            kind = KIND_YEAR if q_id == YEAR_QUESTION_ID else KIND_UNSUPPORTED
+        else:
+            kind = KIND_CRITICAL if q_id in CRITICAL_QUESTION_IDS else KIND_SCALE
+        kinds[q_id - 1] = kind
+        weights[q_id - 1] = float(q_meta.get('weight', 1.0))
+    return kinds, weights
+
+
+class CompatibilityScore(Func):
+    """
+    Call appartners_compatibility for a user against the vector reached through `vector_path`.
+    """
+    function = 'appartners_compatibility'
+    output_field = FloatField()
+
+    def __init__(self, user_id, vector_path='user__answer_vector', **extra):
+        questions_metadata = get_questions_metadata()
+        responses = get_responses_for_users([user_id]).get(user_id, {})
+        answers, year_value, year_text = encode_answer_array(responses, questions_metadata)
+        kinds, weights = get_scoring_parameters(questions_metadata)
+        super().__init__(
+            Cast(Value(answers), ArrayField(SmallIntegerField())),
+            Cast(Value(year_value), BigIntegerField()),
+            Cast(Value(year_text), TextField()),
+            F(f'{vector_path}__answers'),
+            F(f'{vector_path}__year_value'),
+            F(f'{vector_path}__year_text'),
+            Cast(Value(kinds), ArrayField(IntegerField())),
+            Cast(Value(weights), ArrayField(FloatField())),
+            **extra,
+        )
+
+
+def order_by_compatibility(apartments, user_id):
+    """
+    Annotate apartments with their owner's compatibility and order best first.
+
+    Ties are broken by apartment ID so repeated queries return the same order.
+
+    Args:
+        apartments: QuerySet of apartments
+        user_id: ID of the user searching for apartments
+
+    Returns:
+        QuerySet annotated with compatibility_score
+    """
+    return apartments.annotate(
+        compatibility_score=CompatibilityScore(user_id)
+    ).order_by('-compatibility_score', 'id')
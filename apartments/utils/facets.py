@@ -0,0 +1,109 @@
+"""
+Facet counts for apartment search filters.
+Counts come from the in-memory inventory index in one pass over its bitmaps
+and are cached by inventory version, so identical filter states are served
+from the cache until an apartment changes.
+"""
+import hashlib
+import logging
+
+from django.core.cache import cache
+
+from apartments.models import City, Feature
+from apartments.utils.inventory_index import get_inventory_version, inventory_index
+
+logger = logging.getLogger(__name__)
+
+FACETS_CACHE_KEY = 'apartments:facets:{version}:{digest}'
+FACETS_CACHE_TIMEOUT = 60 * 30
+
+# Lower bounds of the price buckets in shekels; the last bucket is open-ended
+PRICE_BUCKET_EDGES = (0, 1000, 1500, 2000, 2500, 3000, 3500, 4000, 5000, 6000, 8000)
+
+
+def facets_etag(version, filters_token):
+    """
+    Build the ETag for a facets response.
+
+    Args:
+        version: Inventory version the counts were computed for
+        filters_token: Canonical string of the filter state
+
+    Returns:
+        str: Quoted ETag value
+    """
+    digest = hashlib.sha1(f'{version}:{filters_token}'.encode()).hexdigest()[:20]
+    return f'"facets-{digest}"'
+
+
+def _price_buckets(counts):
+    upper_bounds = list(PRICE_BUCKET_EDGES[1:]) + [None]
+    return [
+        {'min': low, 'max': high, 'count': count}
+        for low, high, count in zip(PRICE_BUCKET_EDGES, upper_bounds, counts)
+    ]
+
+
+def _labelled(counts, names):
+    rows = [{'id': str(key), 'name': names.get(key, ''), 'count': count} for key, count in counts.items()]
+    return sorted(rows, key=lambda row: (-row['count'], row['name']))
+
+
+def compute_facets(user_prefs, feature_ids):
+    """
+    Count matching apartments per facet value from the inventory index.
+
+    Args:
+        user_prefs: Unsaved UserPreferences with the filter state
+        feature_ids: IDs of the required features
+
+    Returns:
+        dict: Response body with the total and the counts of every facet
+    """
+    counts = inventory_index.facet_counts(user_prefs, feature_ids, PRICE_BUCKET_EDGES)
+    city_names = dict(City.objects.filter(id__in=list(counts['city'])).values_list('id', 'name'))
+    feature_names = dict(Feature.objects.filter(id__in=list(counts['feature'])).values_list('id', 'name'))
+
+    return {
+        'total': counts['total'],
+        'cities': _labelled(counts['city'], city_names),
+        'areas': sorted(
+            ({'name': area, 'count': count} for area, count in counts['area'].items()),
+            key=lambda row: (-row['count'], row['name']),
+        ),
+        'rooms': [{'rooms': rooms, 'count': count} for rooms, count in sorted(counts['rooms'].items())],
+        'price_buckets': _price_buckets(counts['price']),
+        'features': _labelled(counts['feature'], feature_names),
+    }
+
+
+def get_facets(user_prefs, feature_ids, filters_token):
+    """
+    Get the facet counts of a filter state, from the cache when the inventory hasn't changed.
+
+    Args:
+        user_prefs: Unsaved UserPreferences with the filter state
+        feature_ids: IDs of the required features
+        filters_token: Canonical string of the filter state, used in the cache key
+
+    Returns:
+        tuple: (response body, inventory version it was computed for)
+    """
+    digest = hashlib.sha1(filters_token.encode()).hexdigest()
+    version = get_inventory_version()
+    key = FACETS_CACHE_KEY.format(version=version, digest=digest)
+    try:
+        body = cache.get(key)
+        if body is not None:
+            return body, version
+    except Exception as e:
+        logger.error(f"Error reading cached facets: {str(e)}")
+
+    inventory_index.ensure_current()
+    version = inventory_index.version
+    body = compute_facets(user_prefs, feature_ids)
+    try:
+        cache.set(FACETS_CACHE_KEY.format(version=version, digest=digest), body, timeout=FACETS_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Error caching facets: {str(e)}")
+    return body, version
@@ -3,10 +3,14 @@ Apartment filtering utilities for recommendations.
 """
 import logging
 from dateutil.relativedelta import relativedelta
-from django.db.models import Q
-from django.db import connection
+from django.conf import settings
+from django.db.models import BooleanField, Count, Q
+from django.db.models.expressions import RawSQL
 
-from apartments.models import Apartment, ApartmentUserLike
+from apartments.models import Apartment, ApartmentFeature, ApartmentUserLike
+from apartments.utils.geo import filter_within_radius
+from apartments.utils.inventory_index import filter_apartment_ids
+from apartments.utils.profiling import profile_stage
 from users.models import UserPreferences
 
 logger = logging.getLogger(__name__)
@@ -23,7 +27,6 @@ def get_user_preferences(user_id):
         UserPreferences or None if not found
     """
     try:
-        connection.close()
         return UserPreferences.objects.get(user_id=user_id)
     except UserPreferences.DoesNotExist:
         return None
@@ -39,11 +42,10 @@ def get_interacted_apartments(user_id):
     Returns:
         list: List of apartment IDs
     """
-    app =  ApartmentUserLike.objects.filter(
+    # Left lazy so callers can use it as a subquery
+    return ApartmentUserLike.objects.filter(
         user_id=user_id
     ).values_list('apartment_id', flat=True)
-    logger.debug(f'apps i liked user_id: {user_id}, apps: {app}')
-    return app
 
 
 def apply_price_filter(query, user_prefs):
@@ -152,6 +154,26 @@ def apply_roommates_filter(query, user_prefs):
     return query
 
 
+def apartments_with_all_features(feature_ids):
+    """
+    Subquery of apartment IDs that have every one of the given features.
+    
+    One pass over ApartmentFeature grouped by apartment, served by the
+    (feature, apartment) index, instead of one join per feature.
+    
+    Args:
+        feature_ids: Collection of distinct feature IDs
+        
+    Returns:
+        QuerySet of apartment IDs
+    """
+    return ApartmentFeature.objects.filter(
+        feature_id__in=feature_ids
+    ).values('apartment_id').annotate(
+        matched=Count('feature_id')
+    ).filter(matched=len(feature_ids)).values('apartment_id')
+
+
 def apply_features_filter(query, user_prefs):
     """
     Filter apartments by features.
@@ -165,12 +187,11 @@ def apply_features_filter(query, user_prefs):
     """
     if user_prefs and hasattr(user_prefs, 'user_preference_features'):
         # Get the features from user preferences
-        feature_ids = user_prefs.user_preference_features.values_list('feature_id', flat=True)
+        feature_ids = set(user_prefs.user_preference_features.values_list('feature_id', flat=True))
         
         if feature_ids:
             # Filter apartments that have ALL the requested features
-            for feature_id in feature_ids:
-                query = query.filter(apartment_features__feature_id=feature_id)
+            return query.filter(id__in=apartments_with_all_features(feature_ids))
                 
     return query
 
@@ -193,41 +214,207 @@ def apply_date_filter(query, user_prefs):
     return query
 
 
-def filter_apartments(user_id):
+def apply_distance_filter(query, user_prefs):
+    """
+    Filter apartments by distance from the user's preferred point.
+    
+    Args:
+        query: Base apartment query
+        user_prefs: User preferences
+        
+    Returns:
+        Filtered query
+    """
+    if user_prefs and getattr(user_prefs, 'max_distance_km', None) is not None:
+        return filter_within_radius(query, user_prefs.latitude, user_prefs.longitude, user_prefs.max_distance_km)
+    return query
+
+
+def apartment_id_in(apartment_ids):
+    """
+    Condition matching apartments whose ID is in a list, sent as a single array value.
+
+    Unlike id__in, the query text doesn't grow with the list, so a candidate
+    list covering the whole inventory stays cheap to parse and plan. Pass it
+    to exclude() to skip the listed apartments instead.
+
+    Args:
+        apartment_ids: Iterable of apartment IDs
+
+    Returns:
+        RawSQL: Boolean expression usable in filter()
+    """
+    array = '{' + ','.join(str(apartment_id) for apartment_id in apartment_ids) + '}'
+    return RawSQL(
+        f'"{Apartment._meta.db_table}"."id" = ANY(%s::uuid[])', (array,), output_field=BooleanField()
+    )
+
+
+def filter_apartments(user_id, exclude_interacted=True, relax=()):
     """
     Apply all filters to get apartments matching user preferences.
     
     Args:
         user_id: ID of the user
+        exclude_interacted: Whether to leave out apartments the user already
+            swiped; recommendation ranking passes False and checks candidates
+            against the cached seen-set instead
+        relax: Names from RELAXABLE_PREFERENCES whose filters are skipped
         
     Returns:
         QuerySet of filtered apartments
     """
     try:
-        # Get apartments the user has already interacted with (always exclude these)
-        interacted_apartment_ids = get_interacted_apartments(user_id)
-        
-        # Base query excluding apartments the user has interacted with
-        base_query = Apartment.objects.exclude(id__in=interacted_apartment_ids)
+        if exclude_interacted:
+            # Get apartments the user has already interacted with
+            interacted_apartment_ids = get_interacted_apartments(user_id)
+            
+            # Base query excluding apartments the user has interacted with
+            base_query = Apartment.objects.exclude(id__in=interacted_apartment_ids)
+        else:
+            interacted_apartment_ids = []
+            base_query = Apartment.objects.all()
         
         # Get user preferences
-        user_prefs = get_user_preferences(user_id)
+        with profile_stage('preferences'):
+            user_prefs = get_user_preferences(user_id)
+        
+        # Resolve candidates from the in-memory index when enabled, else fall back to SQL filters
+        if settings.INVENTORY_INDEX_ENABLED:
+            candidate_ids = filter_apartment_ids(user_prefs, list(interacted_apartment_ids), relax=relax)
+            if candidate_ids is not None:
+                candidates = Apartment.objects.filter(apartment_id_in(candidate_ids))
+                if 'distance' in relax:
+                    return candidates
+                return apply_distance_filter(candidates, user_prefs)
+        
         if not user_prefs:
             # If no preferences, return all apartments except interacted ones
             return base_query
             
-        # Apply all preference-based filters
+        # Apply all preference-based filters, except relaxed ones
+        filters = (
+            ('price', apply_price_filter),
+            ('city', apply_city_filter),
+            ('roommates', apply_roommates_filter),
+            ('features', apply_features_filter),
+            ('date', apply_date_filter),
+            ('floor', apply_max_floor_filter),
+            ('area', apply_area_filter),
+            ('distance', apply_distance_filter),
+        )
         filtered_query = base_query
-        filtered_query = apply_price_filter(filtered_query, user_prefs)
-        filtered_query = apply_city_filter(filtered_query, user_prefs)
-        filtered_query = apply_roommates_filter(filtered_query, user_prefs)
-        filtered_query = apply_features_filter(filtered_query, user_prefs)
-        filtered_query = apply_date_filter(filtered_query, user_prefs)
-        filtered_query = apply_max_floor_filter(filtered_query, user_prefs)
-        filtered_query = apply_area_filter(filtered_query, user_prefs)
+        for name, apply_filter in filters:
+            if name not in relax:
+                filtered_query = apply_filter(filtered_query, user_prefs)
 
         return filtered_query
         
     except Exception as e:
         logger.error(f"Error in filter_apartments: {str(e)}")
         return Apartment.objects.none()
+
+
+# Preferences that may be dropped when nothing matches, least important first;
+# city and distance describe where the user wants to live and are always kept
+RELAXABLE_PREFERENCES = ('features', 'floor', 'date', 'area', 'roommates', 'price')
+
+
+def preference_conditions(user_prefs):
+    """
+    Express each relaxable preference the user set as a filter condition.
+    
+    Applies the same rules as the apply_*_filter functions.
+    
+    Args:
+        user_prefs: UserPreferences instance
+        
+    Returns:
+        dict: Preference name to Q, for preferences that constrain anything
+    """
+    conditions = {}
+    
+    price = {}
+    if user_prefs.min_price is not None:
+        price['total_price__gte'] = user_prefs.min_price
+    if user_prefs.max_price is not None:
+        price['total_price__lte'] = user_prefs.max_price
+    if price:
+        conditions['price'] = Q(**price)
+    
+    if user_prefs.number_of_roommates:
+        conditions['roommates'] = Q(number_of_rooms__gte=min(user_prefs.number_of_roommates) + 1)
+    
+    feature_ids = set(user_prefs.user_preference_features.values_list('feature_id', flat=True))
+    if feature_ids:
+        conditions['features'] = Q(id__in=apartments_with_all_features(feature_ids))
+    
+    if user_prefs.move_in_date is not None:
+        conditions['date'] = Q(available_entry_date__lte=user_prefs.move_in_date)
+    if user_prefs.max_floor is not None:
+        conditions['floor'] = Q(floor__lte=user_prefs.max_floor)
+    if user_prefs.area is not None and user_prefs.area != '':
+        conditions['area'] = Q(area=user_prefs.area)
+    
+    return conditions
+
+
+def count_relaxed_matches(user_id):
+    """
+    Count the apartments that would match if each single preference were dropped.
+    
+    All counts come from one aggregate query with a filtered COUNT per
+    preference, over the apartments in the user's city and radius that they
+    haven't swiped yet.
+    
+    Args:
+        user_id: ID of the user
+        
+    Returns:
+        dict: Preference name to number of matching apartments, for the
+              relaxable preferences the user set
+    """
+    try:
+        user_prefs = get_user_preferences(user_id)
+        if user_prefs is None:
+            return {}
+        conditions = preference_conditions(user_prefs)
+        if not conditions:
+            return {}
+        
+        base_query = Apartment.objects.exclude(id__in=get_interacted_apartments(user_id))
+        if user_prefs.city_id:
+            base_query = base_query.filter(city_id=user_prefs.city_id)
+        base_query = apply_distance_filter(base_query, user_prefs)
+        
+        counts = {}
+        for name in conditions:
+            others = Q()
+            for other, condition in conditions.items():
+                if other != name:
+                    others &= condition
+            counts[name] = Count('id', filter=others) if others else Count('id')
+        return base_query.aggregate(**counts)
+    
+    except Exception as e:
+        logger.error(f"Error counting relaxed matches: {str(e)}")
+        return {}
+
+
+def best_relaxation(relaxed_counts):
+    """
+    Pick the preference whose removal brings back the most apartments.
+    
+    Args:
+        relaxed_counts: Dictionary returned by count_relaxed_matches
+        
+    Returns:
+        str: Preference name, or None if no single relaxation helps; ties go
+             to the less important preference
+    """
+    best = None
+    for name in RELAXABLE_PREFERENCES:
+        count = relaxed_counts.get(name, 0)
+        if count and (best is None or count > relaxed_counts[best]):
+            best = name
+    return best
@@ -0,0 +1,194 @@
+"""
+Grid index and radius search over apartment coordinates.
+Each apartment stores the ID of the fixed-size grid cell its coordinates fall
+in. Cell IDs are numbered row by row, so the cells under a bounding box form
+one contiguous ID range per grid row and a radius query becomes a few btree
+range scans. Distances are then checked exactly with a vectorized haversine.
+"""
+import logging
+import math
+
+import numpy as np
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Cell edge in degrees, about 1.1 km of latitude
+CELL_SIZE_DEGREES = 0.01
+
+# Number of cells in one grid row, spanning all longitudes
+CELLS_PER_ROW = int(round(360 / CELL_SIZE_DEGREES))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = math.pi * EARTH_RADIUS_KM / 180
+
+# Bounding boxes taller than this many rows are scanned as a single range
+MAX_ROW_RANGES = 64
+
+
+def _row(latitude):
+    return int(math.floor((float(latitude) + 90) / CELL_SIZE_DEGREES))
+
+
+def _column(longitude):
+    return int(math.floor((float(longitude) + 180) / CELL_SIZE_DEGREES)) % CELLS_PER_ROW
+
+
+def grid_cell(latitude, longitude):
+    """
+    Get the ID of the grid cell containing a point.
+
+    Args:
+        latitude: Latitude in degrees
+        longitude: Longitude in degrees
+
+    Returns:
+        int: Grid cell ID, or None if either coordinate is missing
+    """
+    if latitude is None or longitude is None:
+        return None
+    return _row(latitude) * CELLS_PER_ROW + _column(longitude)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Get the latitude/longitude box that contains a circle.
+
+    Args:
+        latitude: Latitude of the center in degrees
+        longitude: Longitude of the center in degrees
+        radius_km: Radius in kilometers
+
+    Returns:
+        tuple: (min_latitude, max_latitude, min_longitude, max_longitude)
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    lat_delta = radius_km / KM_PER_DEGREE_LATITUDE
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+
+    # Longitude degrees shrink towards the poles, so widen by the edge closest to one
+    widest = max(abs(min_lat), abs(max_lat))
+    cos_lat = math.cos(math.radians(widest))
+    if widest >= 90 or radius_km / (KM_PER_DEGREE_LATITUDE * cos_lat) >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    lon_delta = radius_km / (KM_PER_DEGREE_LATITUDE * cos_lat)
+    return min_lat, max_lat, longitude - lon_delta, longitude + lon_delta
+
+
+def _column_ranges(min_lon, max_lon):
+    """
+    Column ranges covering a longitude span, split in two where it crosses the antimeridian.
+    """
+    if max_lon - min_lon >= 360:
+        return [(0, CELLS_PER_ROW - 1)]
+    first, last = _column(min_lon), _column(max_lon)
+    if first <= last:
+        return [(first, last)]
+    return [(first, CELLS_PER_ROW - 1), (0, last)]
+
+
+def _longitude_condition(min_lon, max_lon):
+    if min_lon < -180:
+        return Q(longitude__gte=min_lon + 360) | Q(longitude__lte=max_lon)
+    if max_lon > 180:
+        return Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon - 360)
+    return Q(longitude__gte=min_lon, longitude__lte=max_lon)
+
+
+def box_condition(latitude, longitude, radius_km):
+    """
+    Build a filter matching apartments inside the bounding box of a circle.
+
+    The grid cell ranges let Postgres use the geo_cell index; the coordinate
+    bounds then trim the partly covered cells on the box edges.
+
+    Args:
+        latitude: Latitude of the center in degrees
+        longitude: Longitude of the center in degrees
+        radius_km: Radius in kilometers
+
+    Returns:
+        Q: Filter for Apartment querysets
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    first_row, last_row = _row(min_lat), _row(max_lat)
+    column_ranges = _column_ranges(min_lon, max_lon)
+
+    cells = Q()
+    if last_row - first_row + 1 > MAX_ROW_RANGES:
+        cells = Q(geo_cell__range=(first_row * CELLS_PER_ROW, (last_row + 1) * CELLS_PER_ROW - 1))
+    else:
+        for row in range(first_row, last_row + 1):
+            for first, last in column_ranges:
+                cells |= Q(geo_cell__range=(row * CELLS_PER_ROW + first, row * CELLS_PER_ROW + last))
+
+    return cells & Q(latitude__gte=min_lat, latitude__lte=max_lat) & _longitude_condition(min_lon, max_lon)
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """
+    Great-circle distances from one point to many.
+
+    Args:
+        latitude: Latitude of the origin in degrees
+        longitude: Longitude of the origin in degrees
+        latitudes: Array of latitudes in degrees
+        longitudes: Array of longitudes in degrees
+
+    Returns:
+        ndarray: Distances in kilometers
+    """
+    lat1 = math.radians(float(latitude))
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=float) - float(longitude))
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def apartments_within_radius(queryset, latitude, longitude, radius_km, limit=None):
+    """
+    Find apartments within a distance of a point, nearest first.
+
+    Args:
+        queryset: Apartment queryset to search
+        latitude: Latitude of the center in degrees
+        longitude: Longitude of the center in degrees
+        radius_km: Radius in kilometers
+        limit: Maximum number of apartments to return
+
+    Returns:
+        list: List of (apartment_id, distance_km) tuples
+    """
+    rows = list(
+        queryset.filter(box_condition(latitude, longitude, radius_km))
+        .values_list('id', 'latitude', 'longitude')
+    )
+    if not rows:
+        return []
+
+    ids, latitudes, longitudes = zip(*rows)
+    distances = haversine_km(latitude, longitude, latitudes, longitudes)
+    inside = np.flatnonzero(distances <= radius_km)
+    order = inside[np.argsort(distances[inside], kind='stable')][:limit]
+    return [(ids[i], float(distances[i])) for i in order]
+
+
+def filter_within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Narrow an apartment queryset to apartments within a distance of a point.
+
+    Args:
+        queryset: Apartment queryset to filter
+        latitude: Latitude of the center in degrees
+        longitude: Longitude of the center in degrees
+        radius_km: Radius in kilometers
+
+    Returns:
+        Filtered QuerySet
+    """
+    nearby_ids = [
+        apartment_id
+        for apartment_id, _ in apartments_within_radius(queryset, latitude, longitude, radius_km)
+    ]
+    return queryset.filter(id__in=nearby_ids)
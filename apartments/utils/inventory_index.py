@@ -0,0 +1,469 @@
+"""
+Optional in-process index of the apartment inventory.
+Keeps a bitmap per city, area, room count, floor and feature plus sorted
+price and entry date columns and coordinates, so preference filtering and
+match counting are a handful of array intersections instead of a per-user
+SQL query.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from apartments.models import Apartment, ApartmentFeature
+from apartments.utils.geo import haversine_km
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_VERSION_CACHE_KEY = 'apartments:inventory_version'
+
+# Initial number of apartment slots; arrays double when full
+INITIAL_CAPACITY = 1024
+
+# Apartment columns read into the index, in _upsert argument order
+INDEXED_FIELDS = (
+    'id', 'city_id', 'area', 'number_of_rooms', 'floor', 'total_price', 'available_entry_date',
+    'latitude', 'longitude',
+)
+
+
+def get_inventory_version():
+    """
+    Get the current inventory version.
+
+    The counter lives in the shared cache and is bumped on every apartment or
+    apartment feature write, so workers can tell when their copy is outdated.
+
+    Returns:
+        int: Current inventory version
+    """
+    version = cache.get(INVENTORY_VERSION_CACHE_KEY)
+    if version is None:
+        # Start from a time-based value so restarts never reuse an old version
+        cache.add(INVENTORY_VERSION_CACHE_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(INVENTORY_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_inventory_version():
+    """
+    Mark every worker's copy of the inventory as outdated.
+
+    Returns:
+        int: The new inventory version
+    """
+    try:
+        return cache.incr(INVENTORY_VERSION_CACHE_KEY)
+    except ValueError:
+        # Key missing or evicted; any fresh time-based value is newer
+        version = time.time_ns() // 1000
+        cache.set(INVENTORY_VERSION_CACHE_KEY, version, timeout=None)
+        return version
+
+
+class InventoryIndex:
+    """
+    Bitmap index over apartment attributes used by preference filtering.
+
+    Each apartment occupies a slot; bitmaps are boolean arrays over slots and
+    removed apartments leave a free slot that is reused by the next insert.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.version = None
+        self._lock = threading.RLock()
+        self._slots = {}
+        self._ids = []
+        self._records = []
+        self._free = []
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._price = np.zeros(capacity)
+        self._entry_date = np.zeros(capacity, dtype=np.int64)
+        self._latitude = np.full(capacity, np.nan)
+        self._longitude = np.full(capacity, np.nan)
+        self._bitmaps = {'city': {}, 'area': {}, 'rooms': {}, 'floor': {}, 'feature': {}}
+        self._sorted = {}
+
+    @property
+    def loaded(self):
+        return self.version is not None
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _capacity(self):
+        return len(self._alive)
+
+    def _grow(self):
+        capacity = self._capacity() * 2
+
+        def resized(array, fill=0):
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self._alive = resized(self._alive)
+        self._price = resized(self._price)
+        self._entry_date = resized(self._entry_date)
+        self._latitude = resized(self._latitude, np.nan)
+        self._longitude = resized(self._longitude, np.nan)
+        for bitmaps in self._bitmaps.values():
+            for key, bitmap in bitmaps.items():
+                bitmaps[key] = resized(bitmap)
+
+    def _bitmap(self, name, key):
+        bitmaps = self._bitmaps[name]
+        if key not in bitmaps:
+            bitmaps[key] = np.zeros(self._capacity(), dtype=bool)
+        return bitmaps[key]
+
+    def _lookup(self, name, key):
+        # Read paths get values from clients, so unknown keys must not add bitmaps
+        bitmap = self._bitmaps[name].get(key)
+        if bitmap is None:
+            return np.zeros(self._capacity(), dtype=bool)
+        return bitmap
+
+    def _set_bits(self, slot, record, value):
+        city_id, area, rooms, floor, features = record
+        self._bitmap('city', city_id)[slot] = value
+        self._bitmap('area', area)[slot] = value
+        self._bitmap('rooms', rooms)[slot] = value
+        self._bitmap('floor', floor)[slot] = value
+        for feature_id in features:
+            self._bitmap('feature', feature_id)[slot] = value
+
+    def _upsert(self, apartment_id, city_id, area, rooms, floor, price, entry_date, latitude, longitude, features):
+        slot = self._slots.get(apartment_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._ids)
+                if slot >= self._capacity():
+                    self._grow()
+                self._ids.append(None)
+                self._records.append(None)
+            self._slots[apartment_id] = slot
+            self._ids[slot] = apartment_id
+        else:
+            self._set_bits(slot, self._records[slot], False)
+
+        record = (city_id, area, rooms, floor, frozenset(features))
+        self._records[slot] = record
+        self._set_bits(slot, record, True)
+        self._alive[slot] = True
+        self._price[slot] = float(price)
+        self._entry_date[slot] = entry_date.toordinal()
+        self._latitude[slot] = np.nan if latitude is None else float(latitude)
+        self._longitude[slot] = np.nan if longitude is None else float(longitude)
+        self._sorted.clear()
+
+    def _remove(self, apartment_id):
+        slot = self._slots.pop(apartment_id, None)
+        if slot is None:
+            return
+        self._set_bits(slot, self._records[slot], False)
+        self._records[slot] = None
+        self._ids[slot] = None
+        self._alive[slot] = False
+        self._free.append(slot)
+
+    def _range(self, column, low=None, high=None):
+        """
+        Bitmap of slots whose value lies in [low, high], via a sorted copy of the column.
+        """
+        size = len(self._ids)
+        if column not in self._sorted:
+            values = getattr(self, f'_{column}')[:size]
+            order = np.argsort(values, kind='stable')
+            self._sorted[column] = (values[order], order)
+        values, order = self._sorted[column]
+
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        end = size if high is None else np.searchsorted(values, high, side='right')
+        mask = np.zeros(size, dtype=bool)
+        mask[order[start:end]] = True
+        return mask
+
+    def _union(self, name, predicate):
+        """
+        Bitmap of slots whose bucket key satisfies predicate.
+        """
+        mask = np.zeros(len(self._ids), dtype=bool)
+        for key, bitmap in self._bitmaps[name].items():
+            if key is not None and predicate(key):
+                mask |= bitmap[:len(self._ids)]
+        return mask
+
+    def load(self, version=None):
+        """
+        Replace the index contents with the current inventory.
+
+        Args:
+            version: Inventory version the data corresponds to
+        """
+        version = get_inventory_version() if version is None else version
+        features = {}
+        for apartment_id, feature_id in ApartmentFeature.objects.values_list('apartment_id', 'feature_id'):
+            features.setdefault(apartment_id, []).append(feature_id)
+        rows = Apartment.objects.values_list(*INDEXED_FIELDS)
+
+        fresh = InventoryIndex()
+        for row in rows:
+            fresh._upsert(*row, features.get(row[0], ()))
+        fresh.version = version
+
+        with self._lock:
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != '_lock'})
+        logger.info(f"Loaded inventory index with {len(self)} apartments (version {version})")
+
+    def ensure_current(self):
+        """
+        Reload the index if another worker changed the inventory since it was loaded.
+        """
+        version = get_inventory_version()
+        if version != self.version:
+            self.load(version)
+
+    def refresh_apartment(self, apartment_id):
+        """
+        Re-read one apartment after it was written and update it in place.
+
+        Args:
+            apartment_id: ID of the apartment that was created, updated or deleted
+        """
+        new_version = bump_inventory_version()
+        with self._lock:
+            if not self.loaded:
+                return
+            if new_version != self.version + 1:
+                # Another worker wrote meanwhile; reload on the next query
+                return
+
+            row = Apartment.objects.filter(id=apartment_id).values_list(*INDEXED_FIELDS).first()
+            if row is None:
+                self._remove(apartment_id)
+            else:
+                feature_ids = ApartmentFeature.objects.filter(
+                    apartment_id=apartment_id
+                ).values_list('feature_id', flat=True)
+                self._upsert(*row, feature_ids)
+            self.version = new_version
+
+    def _filter_masks(self, user_prefs, feature_ids, distance=False):
+        """
+        Bitmap of slots passing each preference filter the user set, keyed by the
+        preference names used for relaxing; callers hold the lock.
+        """
+        size = len(self._ids)
+        masks = {}
+        if user_prefs is None:
+            return masks
+
+        if user_prefs.city_id:
+            masks['city'] = self._lookup('city', user_prefs.city_id)[:size]
+        if user_prefs.area is not None and user_prefs.area != '':
+            masks['area'] = self._lookup('area', user_prefs.area)[:size]
+        if user_prefs.number_of_roommates:
+            min_rooms = min(user_prefs.number_of_roommates) + 1
+            masks['roommates'] = self._union('rooms', lambda rooms: rooms >= min_rooms)
+        if user_prefs.max_floor is not None:
+            masks['floor'] = self._union('floor', lambda floor: floor <= user_prefs.max_floor)
+        if feature_ids:
+            masks['features'] = np.logical_and.reduce(
+                [self._lookup('feature', feature_id)[:size] for feature_id in feature_ids]
+            )
+        if user_prefs.move_in_date is not None:
+            masks['date'] = self._range('entry_date', high=user_prefs.move_in_date.toordinal())
+        if user_prefs.min_price is not None or user_prefs.max_price is not None:
+            masks['price'] = self._range(
+                'price',
+                low=None if user_prefs.min_price is None else float(user_prefs.min_price),
+                high=None if user_prefs.max_price is None else float(user_prefs.max_price),
+            )
+        if distance and user_prefs.max_distance_km is not None:
+            distances = haversine_km(
+                user_prefs.latitude, user_prefs.longitude, self._latitude[:size], self._longitude[:size]
+            )
+            # Apartments without coordinates have NaN distances and never match
+            masks['distance'] = distances <= user_prefs.max_distance_km
+        return masks
+
+    def _mask(self, user_prefs, feature_ids, distance=False, relax=()):
+        """
+        Bitmap of live slots matching a user's preferences; callers hold the lock.
+        """
+        mask = self._alive[:len(self._ids)].copy()
+        for name, filter_mask in self._filter_masks(user_prefs, feature_ids, distance).items():
+            if name not in relax:
+                mask &= filter_mask
+        return mask
+
+    def filter_ids(self, user_prefs, feature_ids=(), excluded_ids=(), relax=()):
+        """
+        Get the IDs of apartments matching a user's preferences.
+
+        Applies the same rules as the apply_*_filter functions in filtering.py,
+        except the distance filter, which callers apply to the result.
+
+        Args:
+            user_prefs: UserPreferences instance or None
+            feature_ids: IDs of the features the user requires
+            excluded_ids: IDs of apartments to leave out
+            relax: Names of preferences whose filters are skipped
+
+        Returns:
+            list: Matching apartment IDs
+        """
+        with self._lock:
+            mask = self._mask(user_prefs, feature_ids, relax=relax)
+
+            for apartment_id in excluded_ids:
+                slot = self._slots.get(apartment_id)
+                if slot is not None:
+                    mask[slot] = False
+
+            return [self._ids[slot] for slot in np.flatnonzero(mask)]
+
+    def count_matches(self, user_prefs, feature_ids=()):
+        """
+        Count the apartments matching preferences, including the distance filter.
+
+        Args:
+            user_prefs: UserPreferences instance, which may be unsaved
+            feature_ids: IDs of the features the user requires
+
+        Returns:
+            tuple: (number of matching apartments, number of apartments in the preferred city)
+        """
+        with self._lock:
+            size = len(self._ids)
+            count = int(np.count_nonzero(self._mask(user_prefs, feature_ids, distance=True)))
+            city_total = int(np.count_nonzero(self._alive[:size] & self._lookup('city', user_prefs.city_id)[:size]))
+            return count, city_total
+
+    def facet_counts(self, user_prefs, feature_ids=(), price_edges=()):
+        """
+        Count matching apartments per city, area, room count, price bucket and feature.
+
+        Each facet is counted with every filter except its own, so the counts
+        show what choosing another value of that facet would match. Feature
+        counts use every filter, since required features add up.
+
+        Args:
+            user_prefs: UserPreferences instance, which may be unsaved
+            feature_ids: IDs of the features the user requires
+            price_edges: Ascending lower bounds of the price buckets
+
+        Returns:
+            dict: 'total' count plus 'city', 'area', 'rooms' and 'feature'
+                  dictionaries of key to count and a 'price' list of bucket counts
+        """
+        with self._lock:
+            alive = self._alive[:len(self._ids)]
+            masks = self._filter_masks(user_prefs, feature_ids, distance=True)
+
+            def matching(without=None):
+                mask = alive.copy()
+                for name, filter_mask in masks.items():
+                    if name != without:
+                        mask &= filter_mask
+                return mask
+
+            def per_key(name, mask):
+                counts = {}
+                for key, bitmap in self._bitmaps[name].items():
+                    if key is None or key == '':
+                        continue
+                    count = int(np.count_nonzero(mask & bitmap[:len(mask)]))
+                    if count:
+                        counts[key] = count
+                return counts
+
+            everything = matching()
+            prices = self._price[:len(alive)][matching('price')]
+            buckets = np.searchsorted(np.asarray(price_edges, dtype=float), prices, side='right') - 1
+            price_counts = np.bincount(buckets[buckets >= 0], minlength=len(price_edges))
+
+            return {
+                'total': int(np.count_nonzero(everything)),
+                'city': per_key('city', matching('city')),
+                'area': per_key('area', matching('area')),
+                'rooms': per_key('rooms', matching('roommates')),
+                'price': [int(count) for count in price_counts],
+                'feature': per_key('feature', everything),
+            }
+
+
+# Per-worker index, populated when INVENTORY_INDEX_ENABLED is set or on the first match count
+inventory_index = InventoryIndex()
+
+
+def filter_apartment_ids(user_prefs, excluded_ids, relax=()):
+    """
+    Resolve a user's candidate apartments from the inventory index.
+
+    Args:
+        user_prefs: UserPreferences instance or None
+        excluded_ids: IDs of apartments the user already interacted with
+        relax: Names of preferences whose filters are skipped
+
+    Returns:
+        list: Matching apartment IDs, or None if the index could not be used
+    """
+    try:
+        inventory_index.ensure_current()
+        feature_ids = []
+        if user_prefs is not None and 'features' not in relax:
+            feature_ids = list(user_prefs.user_preference_features.values_list('feature_id', flat=True))
+        return inventory_index.filter_ids(user_prefs, feature_ids, excluded_ids, relax=relax)
+    except Exception as e:
+        logger.error(f"Error filtering with the inventory index: {str(e)}")
+        return None
+
+
+def count_matching_apartments(user_prefs, feature_ids=()):
+    """
+    Count the apartments matching draft preferences from the inventory index.
+
+    Args:
+        user_prefs: UserPreferences instance, which may be unsaved
+        feature_ids: IDs of the features the user requires
+
+    Returns:
+        tuple: (number of matching apartments, number of apartments in the preferred city)
+    """
+    inventory_index.ensure_current()
+    return inventory_index.count_matches(user_prefs, feature_ids)
+
+
+def refresh_indexed_apartment(apartment_id):
+    """
+    Keep the inventory version and this worker's index current after an apartment write.
+
+    Args:
+        apartment_id: ID of the apartment that changed
+    """
+    try:
+        inventory_index.refresh_apartment(apartment_id)
+    except Exception as e:
+        logger.error(f"Error refreshing apartment {apartment_id} in the inventory index: {str(e)}")
+
+
+def warm_inventory_index():
+    """
+    Load the inventory index at worker start so the first request doesn't pay for it.
+    """
+    if not settings.INVENTORY_INDEX_ENABLED:
+        return
+    try:
+        inventory_index.load()
+    except Exception as e:
+        logger.error(f"Error loading inventory index: {str(e)}")
+    finally:
+        connection.close()
@@ -0,0 +1,247 @@
+"""
+Near-duplicate detection for apartment descriptions.
+Descriptions are cut into word shingles after preprocess_text, summarized as
+MinHash signatures and bucketed with locality-sensitive hashing, so finding
+reposted listings costs one bucket lookup per apartment instead of comparing
+every pair of descriptions.
+"""
+import hashlib
+import logging
+
+import numpy as np
+
+from apartments.models import Apartment, ApartmentTextSignature
+from apartments.utils.text_similarity import preprocess_text
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 128
+
+# 16 bands of 8 rows make pairs around 0.7 Jaccard similarity likely to share a band
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+# Estimated Jaccard similarity from which two descriptions count as duplicates
+DUPLICATE_THRESHOLD = 0.8
+
+# Descriptions with fewer shingles are too generic to call duplicates
+MIN_SHINGLES = 5
+
+# Largest prime below 2^32; keeps (a * x + b) within uint64 for 32-bit x
+_PRIME = 4294967291
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 2 ** 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+
+def _hash32(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=4).digest(), 'little')
+
+
+def shingles(text):
+    """
+    Get the set of word shingles of a description.
+
+    Args:
+        text: Description text
+
+    Returns:
+        set: Space-joined runs of SHINGLE_SIZE consecutive words
+    """
+    words = preprocess_text(text).split()
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text):
+    """
+    Compute the MinHash signature of a description.
+
+    Args:
+        text: Description text
+
+    Returns:
+        ndarray: NUM_PERMUTATIONS uint32 values, or None if the text is too short
+    """
+    text_shingles = shingles(text)
+    if len(text_shingles) < MIN_SHINGLES:
+        return None
+    hashes = np.array([_hash32(shingle) for shingle in text_shingles], dtype=np.uint64)
+    permuted = (np.outer(hashes, _A) + _B) % np.uint64(_PRIME)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature):
+    """
+    Hash each LSH band of a signature to a signed 64-bit bucket key.
+
+    Args:
+        signature: MinHash signature
+
+    Returns:
+        list: One key per band; the band number is part of the hash
+    """
+    signature = np.asarray(signature, dtype=np.uint32)
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(bytes([band]) + rows.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def estimated_similarity(signature, other):
+    """
+    Estimate the Jaccard similarity of two descriptions from their signatures.
+    """
+    return float(np.mean(np.asarray(signature, dtype=np.uint32) == np.asarray(other, dtype=np.uint32)))
+
+
+def cluster_signatures(signatures, threshold=DUPLICATE_THRESHOLD):
+    """
+    Group MinHash signatures into clusters of near-duplicates.
+
+    Each signature is compared only with the first member of every LSH
+    bucket it falls in, so the work grows linearly with the number of texts.
+
+    Args:
+        signatures: Iterable of (key, signature) pairs
+        threshold: Minimum estimated similarity for two texts to be linked
+
+    Returns:
+        list: Clusters of two or more keys, each in input order
+    """
+    keys = []
+    kept = []
+    buckets = {}
+    parent = []
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for key, signature in signatures:
+        position = len(keys)
+        keys.append(key)
+        kept.append(signature)
+        parent.append(position)
+
+        for band_key in band_keys(signature):
+            head = buckets.setdefault(band_key, position)
+            if head == position:
+                continue
+            head_root, root = find(head), find(position)
+            if head_root != root and estimated_similarity(kept[head], signature) >= threshold:
+                parent[max(head_root, root)] = min(head_root, root)
+
+    clusters = {}
+    for position in range(len(keys)):
+        clusters.setdefault(find(position), []).append(keys[position])
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def cluster_near_duplicates(texts, threshold=DUPLICATE_THRESHOLD):
+    """
+    Group descriptions into clusters of near-duplicates.
+
+    Args:
+        texts: Iterable of (key, text) pairs
+        threshold: Minimum estimated similarity for two texts to be linked
+
+    Returns:
+        list: Clusters of two or more keys, each in input order; texts too
+              short to sign are left out
+    """
+    signatures = ((key, minhash_signature(text)) for key, text in texts)
+    return cluster_signatures(
+        ((key, signature) for key, signature in signatures if signature is not None), threshold
+    )
+
+
+def save_text_signature(apartment):
+    """
+    Store or remove the signature of an apartment's description.
+
+    Args:
+        apartment: Apartment instance
+
+    Returns:
+        ndarray: The signature, or None if the description is too short
+    """
+    signature = minhash_signature(apartment.about)
+    if signature is None:
+        ApartmentTextSignature.objects.filter(apartment_id=apartment.id).delete()
+        return None
+    ApartmentTextSignature.objects.update_or_create(
+        apartment_id=apartment.id,
+        defaults={'minhash': [int(value) for value in signature], 'bands': band_keys(signature)},
+    )
+    return signature
+
+
+def refresh_text_signature(apartment):
+    """
+    Keep an apartment's stored signature current after it was saved.
+
+    Args:
+        apartment: Apartment instance that was created or updated
+    """
+    try:
+        save_text_signature(apartment)
+    except Exception as e:
+        logger.error(f"Error saving text signature for apartment {apartment.id}: {str(e)}")
+
+
+def find_duplicate_of(apartment, threshold=DUPLICATE_THRESHOLD):
+    """
+    Find the earliest other listing whose description nearly matches this one.
+
+    Args:
+        apartment: Apartment instance
+        threshold: Minimum estimated similarity
+
+    Returns:
+        Apartment: The earliest matching apartment, or None
+    """
+    signature = minhash_signature(apartment.about)
+    if signature is None:
+        return None
+
+    # Only earlier listings can be the original
+    candidates = ApartmentTextSignature.objects.filter(
+        bands__overlap=band_keys(signature), apartment__created_at__lt=apartment.created_at
+    ).select_related('apartment').order_by('apartment__created_at')
+
+    for candidate in candidates:
+        if estimated_similarity(candidate.minhash, signature) >= threshold:
+            # Point at the original listing rather than at another repost
+            original = candidate.apartment
+            return original.duplicate_of or original
+    return None
+
+
+def flag_duplicate(apartment):
+    """
+    Mark a newly created apartment as a duplicate of an earlier listing, if it is one.
+
+    Args:
+        apartment: Newly saved Apartment instance
+
+    Returns:
+        Apartment: The listing it duplicates, or None
+    """
+    try:
+        original = find_duplicate_of(apartment)
+        if original is not None:
+            # Update the column only, so the write doesn't re-run model validation and signals
+            Apartment.objects.filter(id=apartment.id).update(duplicate_of=original)
+            apartment.duplicate_of = original
+            logger.info(f"Apartment {apartment.id} looks like a duplicate of {original.id}")
+        return original
+    except Exception as e:
+        logger.error(f"Error checking apartment {apartment.id} for duplicates: {str(e)}")
+        return None
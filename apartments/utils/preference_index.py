@@ -0,0 +1,409 @@
+"""
+Reverse index of user preferences for new-listing alerts.
+Preferences are grouped by city, and each city keeps an interval tree over
+the users' price ranges, so finding who wants a new apartment is a dictionary
+lookup plus a stabbing query instead of a scan of every preference row. The
+remaining preferences (floor, rooms, features, area, date, radius) are then
+checked on that short list.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from apartments.models import Apartment, ApartmentFeature
+from apartments.utils.background import run_in_background
+from apartments.utils.geo import haversine_km
+from apartments.utils.recommendation_cache import bump_new_listings_versions, bump_unfiltered_listings_version
+from users.models import UserPreferences, UserPreferencesFeatures
+
+logger = logging.getLogger(__name__)
+
+PREFERENCE_INDEX_VERSION_CACHE_KEY = 'apartments:preference_index_version'
+
+PreferenceEntry = namedtuple('PreferenceEntry', [
+    'user_id', 'city_id', 'min_price', 'max_price', 'max_floor', 'min_rooms',
+    'feature_ids', 'area', 'move_in_date', 'latitude', 'longitude', 'max_distance_km',
+])
+
+_PREFERENCE_FIELDS = (
+    'user_id', 'city_id', 'min_price', 'max_price', 'max_floor', 'number_of_roommates',
+    'area', 'move_in_date', 'latitude', 'longitude', 'max_distance_km',
+)
+
+
+def get_preference_index_version():
+    """
+    Get the current preference index version.
+
+    Bumped on every preference write, so workers can tell when their copy is outdated.
+
+    Returns:
+        int: Current preference index version
+    """
+    version = cache.get(PREFERENCE_INDEX_VERSION_CACHE_KEY)
+    if version is None:
+        # Start from a time-based value so restarts never reuse an old version
+        cache.add(PREFERENCE_INDEX_VERSION_CACHE_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(PREFERENCE_INDEX_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_preference_index_version():
+    """
+    Mark every worker's copy of the preference index as outdated.
+
+    Returns:
+        int: The new preference index version
+    """
+    try:
+        return cache.incr(PREFERENCE_INDEX_VERSION_CACHE_KEY)
+    except ValueError:
+        # Key missing or evicted; any fresh time-based value is newer
+        version = time.time_ns() // 1000
+        cache.set(PREFERENCE_INDEX_VERSION_CACHE_KEY, version, timeout=None)
+        return version
+
+
+class IntervalTree:
+    """
+    Static centered interval tree answering which closed intervals contain a point.
+
+    Each node keeps the intervals that contain its center, sorted by lower and
+    by upper bound; intervals entirely below or above the center go to the
+    left or right subtree. A query visits one node per level and reads only
+    intervals that match, so it costs O(log n + matches).
+    """
+
+    def __init__(self, intervals):
+        """
+        Args:
+            intervals: List of (low, high, item) tuples; bounds may be infinite
+        """
+        self._root = self._build(list(intervals))
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        endpoints = sorted(
+            bound for low, high, _ in intervals for bound in (low, high) if bound not in (float('-inf'), float('inf'))
+        )
+        center = endpoints[len(endpoints) // 2] if endpoints else 0.0
+
+        left, right, here = [], [], []
+        for interval in intervals:
+            low, high, _ = interval
+            if high < center:
+                left.append(interval)
+            elif low > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        return (
+            center,
+            sorted(here, key=lambda interval: interval[0]),
+            sorted(here, key=lambda interval: interval[1], reverse=True),
+            self._build(left),
+            self._build(right),
+        )
+
+    def stab(self, point):
+        """
+        Get the items of all intervals containing a point.
+
+        Args:
+            point: Value to look up
+
+        Returns:
+            list: Items of the matching intervals
+        """
+        found = []
+        node = self._root
+        while node is not None:
+            center, by_low, by_high, left, right = node
+            if point < center:
+                for low, _, item in by_low:
+                    if low > point:
+                        break
+                    found.append(item)
+                node = left
+            elif point > center:
+                for _, high, item in by_high:
+                    if high < point:
+                        break
+                    found.append(item)
+                node = right
+            else:
+                found.extend(item for _, _, item in by_low)
+                break
+        return found
+
+
+def _entry(row, feature_ids):
+    roommates = row['number_of_roommates']
+    return PreferenceEntry(
+        user_id=row['user_id'],
+        city_id=row['city_id'],
+        min_price=row['min_price'],
+        max_price=row['max_price'],
+        max_floor=row['max_floor'],
+        min_rooms=min(roommates) + 1 if roommates else None,
+        feature_ids=frozenset(feature_ids),
+        area=row['area'] or None,
+        move_in_date=row['move_in_date'],
+        latitude=row['latitude'],
+        longitude=row['longitude'],
+        max_distance_km=row['max_distance_km'],
+    )
+
+
+def _wants(entry, apartment, feature_ids):
+    """
+    Check the preferences the interval tree doesn't cover, like the apply_*_filter functions.
+    """
+    if entry.max_floor is not None and apartment.floor > entry.max_floor:
+        return False
+    if entry.min_rooms is not None and apartment.number_of_rooms < entry.min_rooms:
+        return False
+    if not entry.feature_ids <= feature_ids:
+        return False
+    if entry.area is not None and apartment.area != entry.area:
+        return False
+    if entry.move_in_date is not None and apartment.available_entry_date > entry.move_in_date:
+        return False
+    if entry.max_distance_km is not None:
+        if apartment.latitude is None or apartment.longitude is None:
+            return False
+        distance = haversine_km(entry.latitude, entry.longitude, [apartment.latitude], [apartment.longitude])[0]
+        if distance > entry.max_distance_km:
+            return False
+    return True
+
+
+class PreferenceIndex:
+    """
+    Users' preferences keyed by city, with a price interval tree per city.
+
+    Trees are static; a preference write marks its city's tree dirty and the
+    tree is rebuilt on the next lookup in that city.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._by_city = {}
+        self._trees = {}
+
+    @property
+    def loaded(self):
+        return self.version is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _upsert(self, entry):
+        self._remove(entry.user_id)
+        self._entries[entry.user_id] = entry
+        self._by_city.setdefault(entry.city_id, set()).add(entry.user_id)
+        self._trees.pop(entry.city_id, None)
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        self._by_city[entry.city_id].discard(user_id)
+        self._trees.pop(entry.city_id, None)
+
+    def _tree(self, city_id):
+        tree = self._trees.get(city_id)
+        if tree is None:
+            intervals = []
+            for user_id in self._by_city.get(city_id, ()):
+                entry = self._entries[user_id]
+                low = float('-inf') if entry.min_price is None else float(entry.min_price)
+                high = float('inf') if entry.max_price is None else float(entry.max_price)
+                intervals.append((low, high, user_id))
+            tree = self._trees[city_id] = IntervalTree(intervals)
+        return tree
+
+    def _read(self, user_ids=None):
+        """
+        Load preference entries, for every user or only the given ones.
+        """
+        preferences = UserPreferences.objects.all()
+        features = UserPreferencesFeatures.objects.all()
+        if user_ids is not None:
+            preferences = preferences.filter(user_id__in=user_ids)
+            features = features.filter(user_preferences__user_id__in=user_ids)
+
+        feature_ids = {}
+        for user_id, feature_id in features.values_list('user_preferences__user_id', 'feature_id'):
+            feature_ids.setdefault(user_id, set()).add(feature_id)
+        return [_entry(row, feature_ids.get(row['user_id'], ())) for row in preferences.values(*_PREFERENCE_FIELDS)]
+
+    def load(self, version=None):
+        """
+        Replace the index contents with every user's preferences.
+
+        Args:
+            version: Preference index version the data corresponds to
+        """
+        version = get_preference_index_version() if version is None else version
+        fresh = PreferenceIndex()
+        for entry in self._read():
+            fresh._upsert(entry)
+        fresh.version = version
+
+        with self._lock:
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != '_lock'})
+        logger.info(f"Loaded preference index with {len(self)} users (version {version})")
+
+    def ensure_current(self):
+        """
+        Reload the index if another worker changed preferences since it was loaded.
+        """
+        version = get_preference_index_version()
+        if version != self.version:
+            self.load(version)
+
+    def refresh_user(self, user_id):
+        """
+        Re-read one user's preferences after they were written and update them in place.
+
+        Args:
+            user_id: ID of the user whose preferences changed
+        """
+        new_version = bump_preference_index_version()
+        with self._lock:
+            if not self.loaded:
+                return
+            if new_version != self.version + 1:
+                # Another worker wrote meanwhile; reload on the next lookup
+                return
+            self._remove(user_id)
+            for entry in self._read([user_id]):
+                self._upsert(entry)
+            self.version = new_version
+
+    def match(self, apartment, feature_ids):
+        """
+        Get the users whose preferences a listing satisfies.
+
+        Args:
+            apartment: Apartment instance
+            feature_ids: IDs of the apartment's features
+
+        Returns:
+            list: IDs of matching users, excluding the owner
+        """
+        feature_ids = frozenset(feature_ids)
+        with self._lock:
+            candidates = self._tree(apartment.city_id).stab(float(apartment.total_price))
+            return [
+                user_id for user_id in candidates
+                if user_id != apartment.user_id and _wants(self._entries[user_id], apartment, feature_ids)
+            ]
+
+
+# Per-worker index, loaded on the first new listing
+preference_index = PreferenceIndex()
+
+
+def find_interested_users(apartment):
+    """
+    Find the users whose preferences a listing satisfies.
+
+    Args:
+        apartment: Apartment instance
+
+    Returns:
+        list: IDs of matching users
+    """
+    preference_index.ensure_current()
+    feature_ids = ApartmentFeature.objects.filter(apartment_id=apartment.id).values_list('feature_id', flat=True)
+    return preference_index.match(apartment, feature_ids)
+
+
+def refresh_indexed_preferences(user_id):
+    """
+    Keep the preference index version and this worker's index current after a preferences write.
+
+    Args:
+        user_id: ID of the user whose preferences changed
+    """
+    try:
+        preference_index.refresh_user(user_id)
+    except Exception as e:
+        logger.error(f"Error refreshing preferences of user {user_id} in the preference index: {str(e)}")
+
+
+def invalidate_matching_recommendations(apartment_id):
+    """
+    Outdate the cached recommendations of the users a listing can appear for.
+
+    Those are the users whose preferences it satisfies plus users without
+    preferences, who are shown every listing.
+
+    Args:
+        apartment_id: ID of the apartment that was listed or gained features
+
+    Returns:
+        list: IDs of the users with matching preferences
+    """
+    try:
+        apartment = Apartment.objects.filter(id=apartment_id).first()
+        if apartment is None:
+            return []
+        matching = find_interested_users(apartment)
+        bump_new_listings_versions(matching)
+        bump_unfiltered_listings_version()
+        return matching
+    except Exception as e:
+        logger.error(f"Error invalidating recommendations for apartment {apartment_id}: {str(e)}")
+        return []
+
+
+def announce_new_listing(apartment_id):
+    """
+    Outdate matching users' recommendations and push them an alert about a new listing.
+
+    Args:
+        apartment_id: ID of the newly created apartment
+    """
+    matching = invalidate_matching_recommendations(apartment_id)
+    if matching:
+        send_new_listing_alerts(apartment_id, matching)
+
+
+def send_new_listing_alerts(apartment_id, user_ids):
+    """
+    Send one batched push about a new listing to the users it matches.
+
+    Args:
+        apartment_id: ID of the new apartment
+        user_ids: IDs of the users to notify
+    """
+    # Imported here because the users app imports apartment utilities at load time
+    from users.services.firebase_service import FirebaseService
+
+    apartment = Apartment.objects.select_related('city').filter(id=apartment_id).first()
+    if apartment is None:
+        return
+    FirebaseService.send_new_listing_notification(user_ids, apartment)
+
+
+def schedule_new_listing_announcement(apartment_id):
+    """
+    Announce a new listing in the background once the transaction that created it commits.
+
+    Creation views save the listing with its features in one transaction,
+    so the announcement matches the finished listing.
+
+    Args:
+        apartment_id: ID of the newly created apartment
+    """
+    run_in_background(announce_new_listing, apartment_id, key=('listing_announcement', apartment_id))
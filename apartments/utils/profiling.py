@@ -0,0 +1,219 @@
+"""
+Per-stage profiling of the recommendation pipeline.
+While a profiler is active, pipeline code wrapped in profile_stage records
+wall time, database query count and database time per stage. Without an
+active profiler profile_stage is a shared no-op context manager, so the
+instrumentation costs one context variable lookup per stage.
+"""
+import bisect
+import contextlib
+import contextvars
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets in milliseconds; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+HISTOGRAM_CACHE_KEY = 'apartments:profile:{stage}:{bucket}'
+HISTOGRAM_TOTAL_CACHE_KEY = 'apartments:profile:{stage}:total_ms'
+
+# Histograms only keep the stages the pipeline reports, in pipeline order
+STAGES = (
+    'preferences',
+    'filter',
+    'seen',
+    'candidate_fetch',
+    'scoring',
+    'feed',
+    'relaxation',
+    'hydration',
+    'serialization',
+    'total',
+)
+
+# Time spent outside any stage, e.g. the view's own queries
+OTHER_STAGE = 'other'
+
+_current = contextvars.ContextVar('recommendation_profiler', default=None)
+_disabled = contextlib.nullcontext()
+
+
+class StageProfiler:
+    """
+    Accumulates wall time, query count and query time per stage.
+
+    Stage times are exclusive: time spent in a nested stage is not counted
+    in the stage around it, and each query is charged to the innermost
+    stage running when it executed. A stage entered several times adds up.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._stack = []
+        self._total_ms = 0.0
+
+    def _entry(self, name):
+        if name not in self.stages:
+            self.stages[name] = {'wall_ms': 0.0, 'queries': 0, 'db_ms': 0.0}
+        return self.stages[name]
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        entry = self._entry(name)
+        self._stack.append(entry)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self._stack.pop()
+            entry['wall_ms'] += elapsed
+            if self._stack:
+                self._stack[-1]['wall_ms'] -= elapsed
+
+    def _record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            entry = self._stack[-1] if self._stack else self._entry(OTHER_STAGE)
+            entry['queries'] += 1
+            entry['db_ms'] += (time.perf_counter() - start) * 1000
+
+    def report(self):
+        """
+        Get the recorded stages, rounded for display.
+
+        Returns:
+            dict: Stage name to {'wall_ms', 'queries', 'db_ms'}, in the order
+                  stages first ran, followed by the request total
+        """
+        stages = {
+            name: {
+                'wall_ms': round(max(entry['wall_ms'], 0.0), 3),
+                'queries': entry['queries'],
+                'db_ms': round(entry['db_ms'], 3),
+            }
+            for name, entry in self.stages.items()
+        }
+        stages['total'] = {
+            'wall_ms': round(self._total_ms, 3),
+            'queries': sum(entry['queries'] for entry in self.stages.values()),
+            'db_ms': round(sum(entry['db_ms'] for entry in self.stages.values()), 3),
+        }
+        return stages
+
+    def server_timing(self):
+        """
+        Format the recorded stages as a Server-Timing header value.
+
+        Returns:
+            str: One metric per stage with its wall time and query count
+        """
+        return ', '.join(
+            f'{name};dur={stats["wall_ms"]};desc="{stats["queries"]} queries, {stats["db_ms"]} ms db"'
+            for name, stats in self.report().items()
+        )
+
+
+@contextlib.contextmanager
+def profiling():
+    """
+    Profile the pipeline stages run inside the block.
+
+    Yields:
+        StageProfiler: The active profiler
+    """
+    profiler = StageProfiler()
+    token = _current.set(profiler)
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(profiler._record_query):
+            yield profiler
+    finally:
+        profiler._total_ms = (time.perf_counter() - start) * 1000
+        _current.reset(token)
+
+
+def profile_stage(name):
+    """
+    Context manager that records a pipeline stage if profiling is active.
+
+    Args:
+        name: Stage name
+
+    Returns:
+        Context manager
+    """
+    profiler = _current.get()
+    if profiler is None:
+        return _disabled
+    return profiler.stage(name)
+
+
+def _bucket(wall_ms):
+    index = bisect.bisect_left(HISTOGRAM_BOUNDS_MS, wall_ms)
+    return f'le_{HISTOGRAM_BOUNDS_MS[index]}' if index < len(HISTOGRAM_BOUNDS_MS) else 'inf'
+
+
+def _histogram_buckets():
+    return [f'le_{bound}' for bound in HISTOGRAM_BOUNDS_MS] + ['inf']
+
+
+def _incr(key, amount=1):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+def record_profile(profiler):
+    """
+    Add a profiled request's stage times to the shared histograms.
+
+    Args:
+        profiler: StageProfiler of a finished request
+    """
+    try:
+        for name, stats in profiler.report().items():
+            if name not in STAGES:
+                continue
+            _incr(HISTOGRAM_CACHE_KEY.format(stage=name, bucket=_bucket(stats['wall_ms'])))
+            # Totals are kept in whole microseconds, since the cache only increments integers
+            _incr(HISTOGRAM_TOTAL_CACHE_KEY.format(stage=name), int(stats['wall_ms'] * 1000))
+    except Exception as e:
+        logger.error(f"Error recording recommendation profile: {str(e)}")
+
+
+def get_histograms():
+    """
+    Get the wall time histogram of every stage across all workers.
+
+    Returns:
+        dict: Stage name to {'buckets': {bucket: count}, 'count', 'mean_ms'}
+              for stages that were recorded at least once
+    """
+    buckets = _histogram_buckets()
+    keys = []
+    for name in STAGES:
+        keys.extend(HISTOGRAM_CACHE_KEY.format(stage=name, bucket=bucket) for bucket in buckets)
+        keys.append(HISTOGRAM_TOTAL_CACHE_KEY.format(stage=name))
+    values = cache.get_many(keys)
+
+    histograms = {}
+    for name in STAGES:
+        counts = {
+            bucket: values.get(HISTOGRAM_CACHE_KEY.format(stage=name, bucket=bucket), 0) for bucket in buckets
+        }
+        count = sum(counts.values())
+        if not count:
+            continue
+        total_ms = values.get(HISTOGRAM_TOTAL_CACHE_KEY.format(stage=name), 0) / 1000
+        histograms[name] = {'buckets': counts, 'count': count, 'mean_ms': round(total_ms / count, 3)}
+    return histograms
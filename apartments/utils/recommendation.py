@@ -1,15 +1,27 @@
 """
 Main recommendation module for apartment recommendations.
 """
+import heapq
 import logging
-from django.db.models import Case, When, Value, FloatField
+from itertools import islice
 
-from apartments.models import Apartment
-from apartments.utils.filtering import filter_apartments
-from apartments.utils.compatibility import calculate_user_compatibility
+import numpy as np
+from django.db.models import Prefetch
+
+from apartments.models import Apartment, ApartmentFeature
+from apartments.utils.filtering import apartment_id_in, filter_apartments, get_user_preferences
+from apartments.utils.compatibility_cache import get_compatibility_scores
+from apartments.utils.compatibility_sql import database_scoring_available, order_by_compatibility
+from apartments.utils.profiling import profile_stage
+from apartments.utils.seen_apartments import get_seen_apartments
+from apartments.utils.soft_scoring import COMPATIBILITY_PIPELINE, ScoringContext, get_scoring_pipeline
+from users.models import UserResponse
 
 logger = logging.getLogger(__name__)
 
+# Number of candidate rows fetched and scored per batch
+CANDIDATE_CHUNK_SIZE = 2000
+
 
 def rank_apartments_by_compatibility(filtered_apartments, user_id, limit):
     """
@@ -23,86 +35,238 @@ def rank_apartments_by_compatibility(filtered_apartments, user_id, limit):
     Returns:
         list: List of apartments sorted by compatibility
     """
-    # Calculate compatibility scores
-    scored_apartments = []
+    apartments = list(filtered_apartments)
+    if not apartments:
+        return []
     
-    for apartment in filtered_apartments:
-        owner_id = apartment.user_id
-        compatibility_score = calculate_user_compatibility(user_id, owner_id)
-        scored_apartments.append((apartment, compatibility_score))
+    # Score all owners in one batch, reusing stored pair scores where fresh
+    scores = get_compatibility_scores(user_id, [apartment.user_id for apartment in apartments])
     
-    # Sort by compatibility score (descending)
-    scored_apartments.sort(key=lambda x: x[1], reverse=True)
+    # Stable sort by compatibility score (descending) keeps ties in input order
+    order = np.argsort(-scores, kind='stable')[:limit]
     
     # Return top N apartments with their scores
-    return scored_apartments[:limit]
+    return [(apartments[i], float(scores[i])) for i in order]
 
 
-def convert_to_ordered_queryset(ranked_apartments):
+def select_top_apartments(filtered_apartments, user_id, limit, chunk_size=CANDIDATE_CHUNK_SIZE, seen=None,
+                          pipeline=COMPATIBILITY_PIPELINE, user_prefs=None):
     """
-    Convert a list of apartments to a queryset with preserved order.
+    Stream candidates and keep only the best `limit` by score.
+    
+    Only apartment IDs and the columns the pipeline's scorers read are
+    fetched, chunk by chunk, and a bounded heap holds the current winners,
+    so memory stays flat as inventory grows.
     
     Args:
-        ranked_apartments: List of apartment objects in desired order
+        filtered_apartments: QuerySet of filtered apartments
+        user_id: ID of the user searching for apartments
+        limit: Maximum number of apartments to return
+        chunk_size: Number of candidates fetched and scored per batch
+        seen: Optional SeenApartments whose members are skipped
+        pipeline: ScoringPipeline rating each chunk; compatibility alone by default
+        user_prefs: UserPreferences the pipeline's soft scorers compare against
         
     Returns:
-        QuerySet with preserved order
+        list: List of (apartment_id, score) tuples, best first
     """
-    if not ranked_apartments:
-        return Apartment.objects.none()
+    context = ScoringContext(user_id, user_prefs)
+    rows = filtered_apartments.values_list('id', *pipeline.fields).iterator(chunk_size=chunk_size)
+    heap = []
+    position = 0
+    
+    while True:
+        with profile_stage('candidate_fetch'):
+            chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
         
-    # Create a Case expression to preserve the order
-    preserved_order = Case(
-        *[When(pk=pk, then=Value(pos)) 
-          for pos, pk in enumerate([a.pk for a in ranked_apartments])],
-        output_field=FloatField()
-    )
+        if seen is not None and len(seen):
+            skipped = seen.contains_many([row[0] for row in chunk])
+            position += int(skipped.sum())
+            chunk = [row for row, is_seen in zip(chunk, skipped) if not is_seen]
+            if not chunk:
+                continue
+        
+        with profile_stage('scoring'):
+            scores = pipeline.score(pipeline.columns(chunk), context)
+        
+        # Only the chunk's own top `limit` can enter the heap
+        for i in np.argsort(-scores, kind='stable')[:limit]:
+            # Earlier candidates win ties, like a stable sort over the whole list
+            entry = (float(scores[i]), -(position + int(i)), chunk[i][0])
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+        position += len(chunk)
     
-    # Return ordered queryset
-    return Apartment.objects.filter(
-        pk__in=[a.pk for a in ranked_apartments]
-    ).order_by(preserved_order)
+    heap.sort(reverse=True)
+    return [(apartment_id, score) for score, _, apartment_id in heap]
 
 
-def get_recommended_apartments(user_id, limit=10):
+def rank_apartments_in_database(filtered_apartments, user_id, limit, seen=None):
     """
-    Get recommended apartments for a user based on preferences and compatibility.
+    Filter, score and rank apartments with one ORDER BY score LIMIT n query.
+    
+    Owners' answers are read from their stored answer vectors, so only the
+    winners leave the database. Seen apartments are excluded in the same query,
+    with the cached seen-set sent as one array value, so neither the query text
+    nor the rows fetched grow with the user's swipe history.
     
     Args:
-        user_id: The ID of the user to get recommendations for
+        filtered_apartments: QuerySet of filtered apartments
+        user_id: ID of the user searching for apartments
         limit: Maximum number of apartments to return
+        seen: Optional SeenApartments whose members are skipped
         
     Returns:
-        QuerySet of recommended Apartment objects
+        list: List of (apartment_id, score) tuples, best first
     """
-    try:
-        # Get filtered apartments based on user preferences
-        filtered_apartments = filter_apartments(user_id)
-        logger.info(f"Filtered apartments for user {user_id}: {filtered_apartments}")
+    if seen is not None and len(seen):
+        filtered_apartments = filtered_apartments.exclude(apartment_id_in(seen.ids()))
+    ranked = order_by_compatibility(filtered_apartments, user_id).values_list('id', 'compatibility_score')
+    with profile_stage('scoring'):
+        return list(ranked[:limit])
+
+
+def get_top_apartments(user_id, limit, relax=()):
+    """
+    Get the IDs and scores of the best matching apartments for a user.
+    
+    Apartments the user already swiped are skipped using their cached seen-set.
+    Ranking by compatibility alone happens in the database when possible;
+    a pipeline with soft scorers ranks candidates in Python, after swapping
+    the hard filters of soft preferences for their wider prefilters.
+    
+    Args:
+        user_id: ID of the user searching for apartments
+        limit: Maximum number of apartments to return
+        relax: Names of preferences to ignore while filtering
         
-        # If no apartments match the basic criteria, return empty queryset and empty scores list
-        if not filtered_apartments.exists():
-            return Apartment.objects.none(), []
+    Returns:
+        list: List of (apartment_id, score) tuples, best first
+    """
+    pipeline = get_scoring_pipeline()
+    with profile_stage('filter'):
+        filtered_apartments = filter_apartments(
+            user_id, exclude_interacted=False, relax=tuple(relax) + pipeline.soft_preferences
+        )
+    with profile_stage('seen'):
+        seen = get_seen_apartments(user_id)
+    
+    if pipeline.compatibility_only:
+        if database_scoring_available():
+            return rank_apartments_in_database(filtered_apartments, user_id, limit, seen=seen)
+        return select_top_apartments(filtered_apartments, user_id, limit, seen=seen)
+    
+    with profile_stage('preferences'):
+        user_prefs = get_user_preferences(user_id)
+    with profile_stage('filter'):
+        filtered_apartments = pipeline.prefilter(filtered_apartments, user_prefs, relax=relax)
+    return select_top_apartments(
+        filtered_apartments, user_id, limit, seen=seen, pipeline=pipeline, user_prefs=user_prefs
+    )
+
+
+def recommendation_prefetches():
+    """
+    Related rows the apartment serializer reads for each recommended apartment.
+    
+    Returns:
+        list: Lookups for prefetch_related
+    """
+    return [
+        Prefetch('apartment_features', queryset=ApartmentFeature.objects.select_related('feature')),
+        'photos',
+        Prefetch('user__user_details', to_attr='owner_details'),
+        Prefetch(
+            'user__questionnaire_responses',
+            queryset=UserResponse.objects.order_by('question__order'),
+            to_attr='ordered_responses',
+        ),
+    ]
+
+
+def hydrate_apartments(ranked_apartments):
+    """
+    Load the winning apartments with everything the serializer needs.
+    
+    Rows are fetched once with their city, owner, features, photos and owner
+    details, put back in ranked order in Python and given their score as a
+    compatibility_score attribute.
+    
+    Args:
+        ranked_apartments: List of (apartment_id, score) tuples, best first
         
-        # Get list of apartments and convert to Python list for ranking
-        apartment_list = list(filtered_apartments)
+    Returns:
+        list: Apartment objects in ranked order
+    """
+    if not ranked_apartments:
+        return []
+    
+    apartments = Apartment.objects.filter(
+        pk__in=[apartment_id for apartment_id, _ in ranked_apartments]
+    ).select_related('city', 'user').prefetch_related(*recommendation_prefetches())
+    
+    # Feed entries hold IDs as strings, so match on the string form
+    with profile_stage('hydration'):
+        by_id = {str(apartment.pk): apartment for apartment in apartments}
+    
+    hydrated = []
+    for apartment_id, score in ranked_apartments:
+        apartment = by_id.get(str(apartment_id))
+        # Skip winners deleted since they were ranked
+        if apartment is not None:
+            apartment.compatibility_score = score
+            hydrated.append(apartment)
+    return hydrated
+
+
+def get_owner_compatibility(user_id, apartments, match_scores):
+    """
+    Get the questionnaire compatibility between a user and each apartment's owner.
+    
+    When compatibility is the only scorer the match scores already are the
+    compatibility; otherwise the owners are scored in one batch, reusing
+    stored pair scores where fresh.
+    
+    Args:
+        user_id: ID of the user the apartments were recommended to
+        apartments: Apartment objects in ranked order
+        match_scores: Pipeline scores aligned with apartments
         
-        # Rank apartments by compatibility with the user
-        scored_apartments = rank_apartments_by_compatibility(
-            apartment_list, user_id, limit
-        )
-        logger.info(f"Ranked apartments for user {user_id}: {scored_apartments}")
+    Returns:
+        list: Compatibility scores aligned with apartments
+    """
+    if get_scoring_pipeline().compatibility_only:
+        return list(match_scores)
+    return get_compatibility_scores(user_id, [apartment.user_id for apartment in apartments]).tolist()
+
+
+def get_recommended_apartments(user_id, limit=10, relax=()):
+    """
+    Get recommended apartments for a user based on preferences and compatibility.
+    
+    Args:
+        user_id: The ID of the user to get recommendations for
+        limit: Maximum number of apartments to return
+        relax: Names of preferences to ignore while filtering
         
-        # Extract apartments and scores
-        apartments = [apt for apt, score in scored_apartments]
-        scores = [score for apt, score in scored_apartments]
+    Returns:
+        tuple: (list of Apartment objects in ranked order, list of scores)
+    """
+    try:
+        # Rank candidates in the database when possible, else stream them through a top-K heap
+        top_apartments = get_top_apartments(user_id, limit, relax=relax)
+        logger.info(f"Ranked apartments for user {user_id}: {top_apartments}")
         
-        # Convert back to a queryset with preserved order
-        ordered_apartments = convert_to_ordered_queryset(apartments)
+        # Load full rows only for the winners, in ranked order
+        apartments = hydrate_apartments(top_apartments)
         
         # Return both the ordered apartments and the compatibility scores
-        return ordered_apartments, scores
+        return apartments, [apartment.compatibility_score for apartment in apartments]
         
     except Exception as e:
         logger.error(f"Error in get_recommended_apartments: {str(e)}")
-        return Apartment.objects.none(), []
+        return [], []
@@ -0,0 +1,200 @@
+"""
+Cache of rendered recommendation responses.
+Entries are keyed on version counters for everything a response depends on:
+the user's preferences and swipes, everyone's questionnaire answers and the
+apartment listings. Writes bump the counters, so stale entries are never
+read again and simply expire. Edits and removals of listings outdate every
+user's entries; a new listing only outdates the users it can be shown to,
+with users without preferences sharing one counter.
+"""
+import hashlib
+import logging
+import time
+
+from django.core.cache import cache
+
+from users.models import UserPreferences
+from users.utils.questionnaire_schema import get_schema_version
+
+logger = logging.getLogger(__name__)
+
+PREFERENCES_VERSION_CACHE_KEY = 'users:preferences_version:{user_id}'
+SEEN_VERSION_CACHE_KEY = 'apartments:seen_version:{user_id}'
+ANSWERS_VERSION_CACHE_KEY = 'questionnaire:answers_version'
+LISTINGS_VERSION_CACHE_KEY = 'apartments:listings_version'
+NEW_LISTINGS_VERSION_CACHE_KEY = 'apartments:new_listings_version:{user_id}'
+# Users without preferences are shown every listing, so one counter covers them all
+UNFILTERED_LISTINGS_VERSION_CACHE_KEY = 'apartments:unfiltered_listings_version'
+HAS_PREFERENCES_CACHE_KEY = 'users:has_preferences:{user_id}'
+RECOMMENDATIONS_CACHE_KEY = 'apartments:recommendations:{user_id}:{limit}:{versions}'
+
+# Bounds staleness from writes that don't bump a version, like owner profile edits
+RECOMMENDATIONS_CACHE_TIMEOUT = 60 * 10
+
+
+def _new_version():
+    # Time-based, so a counter recreated after eviction never repeats an old value
+    return time.time_ns() // 1000
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _new_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def bump_preferences_version(user_id):
+    """
+    Mark a user's cached recommendations as outdated after a preferences write.
+
+    Args:
+        user_id: ID of the user whose preferences changed
+    """
+    _bump(PREFERENCES_VERSION_CACHE_KEY.format(user_id=user_id))
+    # Re-checked on the next request, since the write may have created or removed them
+    cache.delete(HAS_PREFERENCES_CACHE_KEY.format(user_id=user_id))
+
+
+def bump_seen_version(user_id):
+    """
+    Mark a user's cached recommendations as outdated after a swipe.
+
+    Args:
+        user_id: ID of the user who swiped
+    """
+    _bump(SEEN_VERSION_CACHE_KEY.format(user_id=user_id))
+
+
+def bump_answers_version():
+    """
+    Mark every cached recommendation as outdated after questionnaire answers change.
+
+    Any user's answers can move their apartments in other users' rankings.
+    """
+    _bump(ANSWERS_VERSION_CACHE_KEY)
+
+
+def bump_listings_version():
+    """
+    Mark every cached recommendation as outdated after a listing is edited or removed.
+    """
+    _bump(LISTINGS_VERSION_CACHE_KEY)
+
+
+def bump_new_listings_versions(user_ids):
+    """
+    Mark the cached recommendations of some users as outdated after a listing they can be shown appears.
+
+    Args:
+        user_ids: IDs of the users the new listing can be recommended to
+    """
+    for user_id in set(user_ids):
+        _bump(NEW_LISTINGS_VERSION_CACHE_KEY.format(user_id=user_id))
+
+
+def bump_unfiltered_listings_version():
+    """
+    Mark the cached recommendations of every user without preferences as outdated after a listing appears.
+    """
+    _bump(UNFILTERED_LISTINGS_VERSION_CACHE_KEY)
+
+
+def get_recommendation_versions(user_id):
+    """
+    Get the versions of everything a user's recommendations depend on.
+
+    Args:
+        user_id: ID of the user
+
+    Returns:
+        tuple: (preferences, questionnaire, listings, seen) versions
+    """
+    has_preferences_key = HAS_PREFERENCES_CACHE_KEY.format(user_id=user_id)
+    new_listings_key = NEW_LISTINGS_VERSION_CACHE_KEY.format(user_id=user_id)
+    keys = [
+        PREFERENCES_VERSION_CACHE_KEY.format(user_id=user_id),
+        ANSWERS_VERSION_CACHE_KEY,
+        LISTINGS_VERSION_CACHE_KEY,
+        SEEN_VERSION_CACHE_KEY.format(user_id=user_id),
+        new_listings_key,
+        UNFILTERED_LISTINGS_VERSION_CACHE_KEY,
+    ]
+    versions = cache.get_many(keys + [has_preferences_key])
+    has_preferences = versions.pop(has_preferences_key, None)
+    if has_preferences is None:
+        has_preferences = UserPreferences.objects.filter(user_id=user_id).exists()
+        cache.add(has_preferences_key, has_preferences, timeout=RECOMMENDATIONS_CACHE_TIMEOUT)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key)
+
+    preferences_version, answers_version, listings_version, seen_version = (versions[key] for key in keys[:4])
+    # Users without preferences follow the counter shared by all of them
+    new_listings_version = versions[new_listings_key if has_preferences else UNFILTERED_LISTINGS_VERSION_CACHE_KEY]
+    questionnaire_version = f'{get_schema_version()}.{answers_version}'
+    return preferences_version, questionnaire_version, f'{listings_version}.{new_listings_version}', seen_version
+
+
+def _versions_token(versions):
+    return '-'.join(str(version) for version in versions)
+
+
+def recommendation_etag(user_id, limit, versions):
+    """
+    Build the ETag for a recommendations response.
+
+    Args:
+        user_id: ID of the user
+        limit: Requested number of apartments
+        versions: Tuple from get_recommendation_versions
+
+    Returns:
+        str: Quoted ETag value
+    """
+    digest = hashlib.sha1(f'{user_id}:{limit}:{_versions_token(versions)}'.encode()).hexdigest()[:20]
+    return f'"recommendations-{digest}"'
+
+
+def get_cached_recommendations(user_id, limit, versions):
+    """
+    Get a cached recommendations response body.
+
+    Args:
+        user_id: ID of the user
+        limit: Requested number of apartments
+        versions: Tuple from get_recommendation_versions
+
+    Returns:
+        dict: The response body, or None on a miss
+    """
+    try:
+        return cache.get(RECOMMENDATIONS_CACHE_KEY.format(
+            user_id=user_id, limit=limit, versions=_versions_token(versions)
+        ))
+    except Exception as e:
+        logger.error(f"Error reading cached recommendations for user {user_id}: {str(e)}")
+        return None
+
+
+def cache_recommendations(user_id, limit, versions, body):
+    """
+    Store a recommendations response body.
+
+    Args:
+        user_id: ID of the user
+        limit: Requested number of apartments
+        versions: Tuple from get_recommendation_versions the body was computed for
+        body: The response body
+    """
+    try:
+        cache.set(
+            RECOMMENDATIONS_CACHE_KEY.format(user_id=user_id, limit=limit, versions=_versions_token(versions)),
+            body,
+            timeout=RECOMMENDATIONS_CACHE_TIMEOUT,
+        )
+    except Exception as e:
+        logger.error(f"Error caching recommendations for user {user_id}: {str(e)}")
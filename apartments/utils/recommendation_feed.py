@@ -0,0 +1,158 @@
+"""
+Precomputed per-user recommendation feeds.
+Feeds are rebuilt in the background when their inputs change and the
+recommendation endpoint serves pages straight from them. Swipes only drop
+the swiped apartment, and new or removed listings mark feeds stale so they
+are rebuilt on their owner's next request.
+"""
+import logging
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from apartments.models import RecommendationFeed
+from apartments.utils.background import run_in_background
+from apartments.utils.recommendation import get_top_apartments, hydrate_apartments
+from apartments.utils.seen_apartments import get_seen_apartments
+
+logger = logging.getLogger(__name__)
+
+# Number of ranked apartments kept per feed
+FEED_SIZE = 200
+
+# Feeds older than this are not served (owners' answers may have changed meanwhile)
+FEED_MAX_AGE = timedelta(hours=6)
+
+
+def build_recommendation_feed(user_id, size=FEED_SIZE):
+    """
+    Rank apartments for a user and store the result as their feed.
+
+    Args:
+        user_id: ID of the user
+        size: Number of apartments to keep
+
+    Returns:
+        RecommendationFeed: The stored feed
+    """
+    top_apartments = get_top_apartments(user_id, size)
+    feed, _ = RecommendationFeed.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'apartment_ids': [str(apartment_id) for apartment_id, _ in top_apartments],
+            'scores': [score for _, score in top_apartments],
+            'is_stale': False,
+            'has_more': len(top_apartments) >= size,
+        }
+    )
+    logger.info(f"Built recommendation feed for user {user_id} with {len(top_apartments)} apartments")
+    return feed
+
+
+def rebuild_recommendation_feeds(user_ids):
+    """
+    Rebuild the feeds of several users, skipping any that fail.
+
+    Args:
+        user_ids: Iterable of user IDs
+    """
+    for user_id in user_ids:
+        try:
+            build_recommendation_feed(user_id)
+        except Exception as e:
+            logger.error(f"Error building recommendation feed for user {user_id}: {str(e)}")
+
+
+def schedule_feed_rebuild(user_id):
+    """
+    Rebuild a user's feed in the background after their inputs changed.
+
+    Args:
+        user_id: ID of the user
+    """
+    run_in_background(rebuild_recommendation_feeds, [user_id], key=('feed', user_id))
+
+
+def mark_feed_stale(user_id):
+    """
+    Stop serving a user's feed until it has been rebuilt, and schedule the rebuild.
+
+    Args:
+        user_id: ID of the user
+    """
+    RecommendationFeed.objects.filter(user_id=user_id).update(is_stale=True)
+    schedule_feed_rebuild(user_id)
+
+
+def drop_from_feed(user_id, apartment_id):
+    """
+    Remove a swiped apartment from a user's feed, keeping the rest of the ranking.
+
+    Args:
+        user_id: ID of the user who swiped
+        apartment_id: ID of the swiped apartment
+    """
+    feed = RecommendationFeed.objects.filter(user_id=user_id).first()
+    apartment_id = str(apartment_id)
+    if feed is None or apartment_id not in feed.apartment_ids:
+        return
+    position = feed.apartment_ids.index(apartment_id)
+    del feed.apartment_ids[position]
+    del feed.scores[position]
+    # Skipped if a rebuild wrote the feed meanwhile. update() leaves updated_at
+    # alone, so the feed still ages out on schedule. A drop lost to a concurrent
+    # one is harmless, since pages skip seen apartments anyway.
+    RecommendationFeed.objects.filter(pk=feed.pk, updated_at=feed.updated_at).update(
+        apartment_ids=feed.apartment_ids, scores=feed.scores
+    )
+
+
+def mark_city_feeds_stale(city_id):
+    """
+    Mark stale the feeds that can include apartments in a city.
+
+    They are rebuilt when their users next ask for recommendations, rather
+    than all at once. Users without preferences see every city, so their
+    feeds are included.
+
+    Args:
+        city_id: ID of the city whose inventory changed
+    """
+    feeds = RecommendationFeed.objects.filter(
+        Q(user__user_preferences__city_id=city_id) | Q(user__user_preferences__isnull=True)
+    )
+    RecommendationFeed.objects.filter(user_id__in=feeds.values('user_id')).update(is_stale=True)
+
+
+def get_feed_page(user_id, limit):
+    """
+    Get the next page of recommendations from a user's feed.
+
+    Apartments the user already swiped are skipped.
+
+    Args:
+        user_id: ID of the user
+        limit: Maximum number of apartments to return
+
+    Returns:
+        tuple: (list of apartments, list of scores), or None when the feed
+               is missing, stale or too short to fill the page
+    """
+    feed = RecommendationFeed.objects.filter(user_id=user_id).first()
+    if feed is None or feed.is_stale or feed.updated_at < timezone.now() - FEED_MAX_AGE:
+        return None
+
+    skipped = get_seen_apartments(user_id).contains_many(feed.apartment_ids)
+    page = [
+        (apartment_id, score)
+        for apartment_id, score, is_seen in zip(feed.apartment_ids, feed.scores, skipped)
+        if not is_seen
+    ][:limit]
+
+    # A feed cut at its size that ran short may have more candidates past its end
+    if len(page) < limit and feed.has_more:
+        return None
+
+    apartments = hydrate_apartments(page)
+    return apartments, [apartment.compatibility_score for apartment in apartments]
@@ -0,0 +1,182 @@
+"""
+Apartment search with keyset pagination.
+Results are ordered by a sort key with the apartment ID as a tiebreaker,
+and each page continues from the (sort key, id) of the previous page's last
+row. With the composite indexes on those columns, every page is an index
+seek instead of an OFFSET scan, so deep pages cost the same as the first.
+A text query narrows the results through the trigram index and enables
+sorting by relevance.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from apartments.models import Apartment
+from apartments.utils.filtering import (
+    apartments_with_all_features,
+    apply_area_filter,
+    apply_date_filter,
+    apply_distance_filter,
+    apply_max_floor_filter,
+    apply_price_filter,
+    apply_roommates_filter,
+)
+from apartments.utils.recommendation import recommendation_prefetches
+from apartments.utils.text_search import rank_by_text
+
+# Sort parameter values and the apartment field each orders by
+SORT_FIELDS = {
+    'price': 'total_price',
+    'created_at': 'created_at',
+    'entry_date': 'available_entry_date',
+    'relevance': 'rank',
+}
+DEFAULT_SORT = '-created_at'
+# Sort used when a text query is given without one
+DEFAULT_QUERY_SORT = '-relevance'
+
+
+def parse_sort(sort):
+    """
+    Resolve a sort parameter such as `price` or `-created_at`.
+
+    Args:
+        sort: Sort name, prefixed with `-` for descending order
+
+    Returns:
+        tuple: (apartment field name, whether the order is descending)
+
+    Raises:
+        ValidationError: If the sort name is unknown
+    """
+    descending = sort.startswith('-')
+    field = SORT_FIELDS.get(sort.lstrip('-'))
+    if field is None:
+        raise ValidationError(f"Sort must be one of: {', '.join(SORT_FIELDS)}")
+    return field, descending
+
+
+def encode_cursor(apartment, field):
+    """
+    Build the cursor pointing after an apartment.
+
+    Args:
+        apartment: Last apartment of a page
+        field: Field the results are sorted by
+
+    Returns:
+        str: Opaque URL-safe cursor
+    """
+    if field == 'rank':
+        value = apartment.rank
+    else:
+        value = Apartment._meta.get_field(field).value_to_string(apartment)
+    payload = json.dumps([value, str(apartment.pk)]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor, field):
+    """
+    Read the (sort key, id) position out of a cursor.
+
+    Args:
+        cursor: Cursor from encode_cursor
+        field: Field the results are sorted by
+
+    Returns:
+        tuple: (sort key value, apartment ID)
+
+    Raises:
+        ValidationError: If the cursor is malformed or from another sort
+    """
+    try:
+        value, apartment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if field == 'rank':
+            value = float(value)
+        else:
+            value = Apartment._meta.get_field(field).to_python(value)
+        return value, Apartment._meta.pk.to_python(apartment_id)
+    except (ValueError, TypeError, ValidationError):
+        raise ValidationError("Invalid cursor")
+
+
+def filter_search_results(user_prefs, feature_ids):
+    """
+    Filter apartments with the recommendation filter vocabulary.
+
+    Args:
+        user_prefs: Unsaved UserPreferences with the filter state
+        feature_ids: IDs of the required features
+
+    Returns:
+        Filtered QuerySet
+    """
+    query = Apartment.objects.all()
+    if user_prefs.city_id is not None:
+        query = query.filter(city_id=user_prefs.city_id)
+    query = apply_area_filter(query, user_prefs)
+    query = apply_price_filter(query, user_prefs)
+    query = apply_roommates_filter(query, user_prefs)
+    query = apply_date_filter(query, user_prefs)
+    query = apply_max_floor_filter(query, user_prefs)
+    query = apply_distance_filter(query, user_prefs)
+    if feature_ids:
+        query = query.filter(id__in=apartments_with_all_features(set(feature_ids)))
+    return query
+
+
+def search_apartments(user_prefs, feature_ids, sort=None, cursor=None, limit=20, text=''):
+    """
+    Get one page of search results.
+
+    Args:
+        user_prefs: Unsaved UserPreferences with the filter state
+        feature_ids: IDs of the required features
+        sort: Sort name, prefixed with `-` for descending order; by default
+              the best matches come first with a query and the newest without
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Maximum number of apartments on the page
+        text: Text to match against the street, area and description
+
+    Returns:
+        tuple: (list of apartments, cursor of the next page or None on the last page)
+
+    Raises:
+        ValidationError: If the sort or the cursor is invalid
+    """
+    text = text.strip()
+    field, descending = parse_sort(sort or (DEFAULT_QUERY_SORT if text else DEFAULT_SORT))
+    if field == 'rank' and not text:
+        raise ValidationError("Sorting by relevance needs a search query")
+
+    query = filter_search_results(user_prefs, feature_ids)
+    if text:
+        query = rank_by_text(query, text)
+
+    if cursor:
+        value, apartment_id = decode_cursor(cursor, field)
+        # Seek past the last row; the bound on the sort key alone lets the index do a range scan
+        if descending:
+            query = query.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': apartment_id}),
+                **{f'{field}__lte': value}
+            )
+        else:
+            query = query.filter(
+                Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': apartment_id}),
+                **{f'{field}__gte': value}
+            )
+
+    prefix = '-' if descending else ''
+    # One extra row tells whether another page follows
+    apartments = list(
+        query.order_by(f'{prefix}{field}', f'{prefix}id').select_related(
+            'city', 'user'
+        ).prefetch_related(*recommendation_prefetches())[:limit + 1]
+    )
+    if len(apartments) <= limit:
+        return apartments, None
+    apartments = apartments[:limit]
+    return apartments, encode_cursor(apartments[-1], field)
@@ -0,0 +1,212 @@
+"""
+Compact per-user set of apartments the user already swiped.
+Recommendation candidates are checked against it, or it is sent to the
+database as one array value, so excluding swiped apartments doesn't add an
+anti-join against the likes table that grows with the user's swipe history.
+"""
+import logging
+import time
+import uuid
+
+import numpy as np
+from django.core.cache import cache
+
+from apartments.models import ApartmentUserLike
+
+logger = logging.getLogger(__name__)
+
+SEEN_CACHE_KEY = 'apartments:seen:{user_id}'
+# Counts the swipe writes of a user; an entry is only current while it matches
+SEEN_GENERATION_CACHE_KEY = 'apartments:seen_generation:{user_id}'
+
+# Idle entries expire; the next read rebuilds them from the database
+SEEN_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Entries are rebuilt from the database after this many in-place updates or
+# this many seconds, dropping apartments that were deleted meanwhile
+SEEN_COMPACT_AFTER_UPDATES = 500
+SEEN_COMPACT_AFTER_SECONDS = 60 * 60 * 6
+
+
+def _to_bytes(apartment_id):
+    if isinstance(apartment_id, uuid.UUID):
+        return apartment_id.bytes
+    return uuid.UUID(str(apartment_id)).bytes
+
+
+class SeenApartments:
+    """
+    Sorted array of 16-byte apartment IDs with binary-search membership.
+    """
+
+    def __init__(self, packed=b''):
+        self._ids = np.frombuffer(packed, dtype='S16')
+
+    @classmethod
+    def from_ids(cls, apartment_ids):
+        ids = np.unique(np.array([_to_bytes(a) for a in apartment_ids], dtype='S16'))
+        return cls(ids.tobytes())
+
+    @property
+    def packed(self):
+        return self._ids.tobytes()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, apartment_id):
+        key = np.array(_to_bytes(apartment_id), dtype='S16')
+        position = np.searchsorted(self._ids, key)
+        return position < len(self._ids) and self._ids[position] == key
+
+    def contains_many(self, apartment_ids):
+        """
+        Check several apartment IDs at once.
+
+        Args:
+            apartment_ids: Sequence of apartment IDs
+
+        Returns:
+            ndarray: Boolean mask aligned with apartment_ids
+        """
+        if not len(self._ids) or not len(apartment_ids):
+            return np.zeros(len(apartment_ids), dtype=bool)
+        keys = np.array([_to_bytes(a) for a in apartment_ids], dtype='S16')
+        positions = np.minimum(np.searchsorted(self._ids, keys), len(self._ids) - 1)
+        return self._ids[positions] == keys
+
+    def ids(self):
+        """
+        List the apartment IDs in the set.
+
+        Returns:
+            list: UUIDs of the seen apartments
+        """
+        # Read from the packed bytes, since array items drop trailing zero bytes
+        packed = self.packed
+        return [uuid.UUID(bytes=packed[i:i + 16]) for i in range(0, len(packed), 16)]
+
+    def with_id(self, apartment_id):
+        """
+        Return a copy of the set that also holds apartment_id.
+        """
+        key = np.array(_to_bytes(apartment_id), dtype='S16')
+        position = np.searchsorted(self._ids, key)
+        if position < len(self._ids) and self._ids[position] == key:
+            return self
+        return SeenApartments(np.insert(self._ids, position, key).tobytes())
+
+
+def _new_generation():
+    # Time-based, so a counter recreated after eviction never repeats an old value
+    return time.time_ns() // 1000
+
+
+def _current_generation(user_id):
+    key = SEEN_GENERATION_CACHE_KEY.format(user_id=user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump_generation(user_id):
+    key = SEEN_GENERATION_CACHE_KEY.format(user_id=user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = _new_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def _store(user_id, seen, built_at, updates, generation):
+    cache.set(
+        SEEN_CACHE_KEY.format(user_id=user_id),
+        {'ids': seen.packed, 'built_at': built_at, 'updates': updates, 'generation': generation},
+        timeout=SEEN_CACHE_TIMEOUT,
+    )
+
+
+def rebuild_seen_apartments(user_id):
+    """
+    Build a user's seen-set from their likes and store it in the cache.
+
+    Args:
+        user_id: ID of the user
+
+    Returns:
+        SeenApartments: The rebuilt set
+    """
+    # Read before the likes, so a swipe committed meanwhile makes the entry outdated
+    generation = _current_generation(user_id)
+    seen = SeenApartments.from_ids(
+        ApartmentUserLike.objects.filter(user_id=user_id).values_list('apartment_id', flat=True)
+    )
+    _store(user_id, seen, time.time(), 0, generation)
+    return seen
+
+
+def get_seen_apartments(user_id):
+    """
+    Get the set of apartments a user already liked or disliked.
+
+    Args:
+        user_id: ID of the user
+
+    Returns:
+        SeenApartments: The user's seen-set
+    """
+    key = SEEN_CACHE_KEY.format(user_id=user_id)
+    generation_key = SEEN_GENERATION_CACHE_KEY.format(user_id=user_id)
+    try:
+        cached = cache.get_many([key, generation_key])
+        entry = cached.get(key)
+        if entry is not None and entry.get('generation') == cached.get(generation_key):
+            return SeenApartments(entry['ids'])
+    except Exception as e:
+        logger.error(f"Error reading seen apartments for user {user_id}: {str(e)}")
+    return rebuild_seen_apartments(user_id)
+
+
+def mark_apartment_seen(user_id, apartment_id):
+    """
+    Add a committed swipe to the user's cached seen-set.
+
+    Every swipe takes the next generation atomically, and only the swipe
+    whose generation directly follows the entry's may update it in place.
+    Concurrent swipes drop the entry instead, so none of them is lost.
+    Entries that have grown through many updates or are old are dropped
+    too, so the next read compacts them from the database.
+
+    Args:
+        user_id: ID of the user who swiped
+        apartment_id: ID of the swiped apartment
+    """
+    key = SEEN_CACHE_KEY.format(user_id=user_id)
+    generation = _bump_generation(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        return
+
+    too_old = time.time() - entry['built_at'] > SEEN_COMPACT_AFTER_SECONDS
+    raced = entry.get('generation') != generation - 1
+    if raced or too_old or entry['updates'] >= SEEN_COMPACT_AFTER_UPDATES:
+        cache.delete(key)
+        return
+
+    seen = SeenApartments(entry['ids']).with_id(apartment_id)
+    _store(user_id, seen, entry['built_at'], entry['updates'] + 1, generation)
+
+
+def forget_seen_apartments(user_id):
+    """
+    Drop a user's cached seen-set after a swipe was removed.
+
+    Args:
+        user_id: ID of the user
+    """
+    # Also outdates an entry a concurrent read is rebuilding from before the removal
+    _bump_generation(user_id)
+    cache.delete(SEEN_CACHE_KEY.format(user_id=user_id))
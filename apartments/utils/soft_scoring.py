@@ -0,0 +1,361 @@
+"""
+Soft scoring of recommendation candidates.
+Each scorer rates a whole batch of candidates at once from NumPy column
+arrays, returning scores between 0 and 1. A pipeline combines the weighted
+scorers in one matrix product, so price, entry date, floor and distance can
+rank candidates next to compatibility. A preference can also be made soft:
+its hard filter is replaced by a wider prefilter and its scorer penalizes
+candidates the more they miss, instead of dropping them outright.
+"""
+import logging
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+
+from apartments.utils.compatibility_cache import get_compatibility_scores
+from apartments.utils.geo import filter_within_radius, haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Going this fraction of the budget over max_price halves the price fit again
+PRICE_HALF_LIFE = 0.1
+# Soft price filters keep candidates within this fraction beyond the price range
+PRICE_PREFILTER_MARGIN = 0.3
+
+# Days after the move-in date, and before it, that halve the date fit
+DATE_LATE_HALF_LIFE_DAYS = 14
+DATE_EARLY_HALF_LIFE_DAYS = 60
+# Soft date filters keep candidates available up to this many days after the move-in date
+DATE_PREFILTER_DAYS = 60
+
+# Floors above max_floor that halve the floor fit
+FLOOR_HALF_LIFE = 1
+# Soft floor filters keep candidates up to this many floors above max_floor
+FLOOR_PREFILTER_MARGIN = 2
+
+# Soft distance filters keep candidates within this multiple of the radius
+DISTANCE_PREFILTER_FACTOR = 2
+
+ScoringContext = namedtuple('ScoringContext', ['user_id', 'preferences'])
+
+
+def _to_float(values):
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=float)
+
+
+def _to_ordinal(values):
+    return np.array([np.nan if value is None else value.toordinal() for value in values], dtype=float)
+
+
+def _to_list(values):
+    return list(values)
+
+
+class Scorer:
+    """
+    Base class for scorers.
+
+    Attributes:
+        name: Key of the scorer's weight
+        fields: Apartment fields the scorer reads, fetched as columns
+        preference: Name of the filter in filter_apartments the scorer can soften, if any
+        converters: Field name to function turning fetched values into a column;
+                    fields not listed become float arrays with NaN for missing values
+    """
+    name = None
+    fields = ()
+    preference = None
+    converters = {}
+
+    def score(self, columns, context):
+        """
+        Score a batch of candidates.
+
+        Args:
+            columns: Dictionary of field name to values aligned by candidate
+            context: ScoringContext of the searching user
+
+        Returns:
+            ndarray: Scores between 0 and 1
+        """
+        raise NotImplementedError
+
+    def prefilter(self, queryset, user_prefs):
+        """
+        Apply a wider version of the preference's hard filter.
+
+        Args:
+            queryset: Apartment queryset the hard filter was skipped for
+            user_prefs: UserPreferences instance
+
+        Returns:
+            Filtered QuerySet
+        """
+        return queryset
+
+
+class CompatibilityScorer(Scorer):
+    """
+    Questionnaire compatibility between the user and each apartment's owner.
+    """
+    name = 'compatibility'
+    fields = ('user_id',)
+    converters = {'user_id': _to_list}
+
+    def score(self, columns, context):
+        return get_compatibility_scores(context.user_id, columns['user_id'])
+
+
+class PriceScorer(Scorer):
+    """
+    Fit of the price to the user's range.
+
+    Within the range, cheaper is better, falling from 1 at the lower bound
+    to 0.5 at max_price. Above max_price, or below min_price, the fit keeps
+    halving every PRICE_HALF_LIFE of the bound.
+    """
+    name = 'price'
+    fields = ('total_price',)
+    preference = 'price'
+
+    def score(self, columns, context):
+        prices = columns['total_price']
+        prefs = context.preferences
+        scores = np.ones(len(prices))
+        if prefs is None:
+            return scores
+
+        low = float(prefs.min_price) if prefs.min_price is not None else 0.0
+        if prefs.max_price is not None:
+            high = float(prefs.max_price)
+            within = 1 - 0.5 * np.clip((prices - low) / max(high - low, 1.0), 0, 1)
+            over = 0.5 * np.exp2(-(prices - high) / (PRICE_HALF_LIFE * max(high, 1.0)))
+            scores = np.where(prices <= high, within, over)
+        if prefs.min_price is not None:
+            under = np.exp2(-(low - prices) / (PRICE_HALF_LIFE * max(low, 1.0)))
+            scores = np.where(prices < low, scores * under, scores)
+        return scores
+
+    def prefilter(self, queryset, user_prefs):
+        if user_prefs.max_price is not None:
+            queryset = queryset.filter(total_price__lte=float(user_prefs.max_price) * (1 + PRICE_PREFILTER_MARGIN))
+        if user_prefs.min_price is not None:
+            queryset = queryset.filter(total_price__gte=float(user_prefs.min_price) * (1 - PRICE_PREFILTER_MARGIN))
+        return queryset
+
+
+class EntryDateScorer(Scorer):
+    """
+    Proximity of the entry date to the user's move-in date.
+
+    Apartments available after the move-in date lose fit faster than ones
+    available before it, which the user can still take.
+    """
+    name = 'date'
+    fields = ('available_entry_date',)
+    preference = 'date'
+    converters = {'available_entry_date': _to_ordinal}
+
+    def score(self, columns, context):
+        entry_days = columns['available_entry_date']
+        prefs = context.preferences
+        if prefs is None or prefs.move_in_date is None:
+            return np.ones(len(entry_days))
+
+        days_late = entry_days - prefs.move_in_date.toordinal()
+        return np.where(
+            days_late > 0,
+            np.exp2(-days_late / DATE_LATE_HALF_LIFE_DAYS),
+            np.exp2(days_late / DATE_EARLY_HALF_LIFE_DAYS),
+        )
+
+    def prefilter(self, queryset, user_prefs):
+        if user_prefs.move_in_date is not None:
+            latest = user_prefs.move_in_date + timedelta(days=DATE_PREFILTER_DAYS)
+            queryset = queryset.filter(available_entry_date__lte=latest)
+        return queryset
+
+
+class FloorScorer(Scorer):
+    """
+    Fit of the floor to the user's max_floor, halving every FLOOR_HALF_LIFE floors above it.
+    """
+    name = 'floor'
+    fields = ('floor',)
+    preference = 'floor'
+
+    def score(self, columns, context):
+        floors = columns['floor']
+        prefs = context.preferences
+        if prefs is None or prefs.max_floor is None:
+            return np.ones(len(floors))
+        return np.exp2(-np.maximum(floors - prefs.max_floor, 0) / FLOOR_HALF_LIFE)
+
+    def prefilter(self, queryset, user_prefs):
+        if user_prefs.max_floor is not None:
+            queryset = queryset.filter(floor__lte=user_prefs.max_floor + FLOOR_PREFILTER_MARGIN)
+        return queryset
+
+
+class DistanceScorer(Scorer):
+    """
+    Closeness to the user's preferred point.
+
+    The fit is 0.5 at the edge of the radius and falls off quickly beyond
+    it; apartments without coordinates score 0.
+    """
+    name = 'distance'
+    fields = ('latitude', 'longitude')
+    preference = 'distance'
+
+    def score(self, columns, context):
+        latitudes, longitudes = columns['latitude'], columns['longitude']
+        prefs = context.preferences
+        if prefs is None or prefs.max_distance_km is None:
+            return np.ones(len(latitudes))
+
+        distances = haversine_km(prefs.latitude, prefs.longitude, latitudes, longitudes)
+        scores = np.exp2(-np.square(distances / prefs.max_distance_km))
+        return np.nan_to_num(scores, nan=0.0)
+
+    def prefilter(self, queryset, user_prefs):
+        if user_prefs.max_distance_km is not None:
+            queryset = filter_within_radius(
+                queryset, user_prefs.latitude, user_prefs.longitude,
+                user_prefs.max_distance_km * DISTANCE_PREFILTER_FACTOR,
+            )
+        return queryset
+
+
+# Registered scorers by name
+SCORERS = {}
+
+
+def register_scorer(scorer):
+    """
+    Make a scorer available to pipelines under its name.
+
+    Args:
+        scorer: Scorer instance
+
+    Returns:
+        Scorer: The registered scorer
+    """
+    SCORERS[scorer.name] = scorer
+    return scorer
+
+
+for _scorer in (CompatibilityScorer(), PriceScorer(), EntryDateScorer(), FloorScorer(), DistanceScorer()):
+    register_scorer(_scorer)
+
+
+class ScoringPipeline:
+    """
+    Weighted combination of scorers.
+
+    The combined score is the weighted mean of the scorers' scores, so it
+    stays between 0 and 1. Scorers with a zero weight are left out entirely.
+    """
+
+    def __init__(self, weights, soft_preferences=()):
+        """
+        Args:
+            weights: Dictionary of scorer name to weight
+            soft_preferences: Names of filters to replace with a prefilter and a penalty
+        """
+        unknown = set(weights) - set(SCORERS)
+        if unknown:
+            raise ValueError(f"Unknown scorers: {', '.join(sorted(unknown))}")
+
+        self.scorers = [SCORERS[name] for name, weight in weights.items() if weight > 0]
+        if not self.scorers:
+            raise ValueError("At least one scorer needs a positive weight")
+        weights = np.array([weights[scorer.name] for scorer in self.scorers], dtype=float)
+        self.weights = weights / weights.sum()
+
+        # A filter is only softened when its scorer is weighted to penalize the misses
+        weighted = {scorer.preference: scorer for scorer in self.scorers if scorer.preference}
+        self.soft_preferences = tuple(name for name in soft_preferences if name in weighted)
+        self._softened = [weighted[name] for name in self.soft_preferences]
+
+        self.fields = tuple(dict.fromkeys(field for scorer in self.scorers for field in scorer.fields))
+        self._converters = {}
+        for scorer in self.scorers:
+            self._converters.update(scorer.converters)
+
+    @property
+    def compatibility_only(self):
+        return [scorer.name for scorer in self.scorers] == [CompatibilityScorer.name]
+
+    def prefilter(self, queryset, user_prefs, relax=()):
+        """
+        Apply the wide prefilters of the soft preferences.
+
+        Args:
+            queryset: Apartment queryset filtered without the soft preferences
+            user_prefs: UserPreferences instance or None
+            relax: Names of preferences dropped altogether, which get no prefilter
+
+        Returns:
+            Filtered QuerySet
+        """
+        if user_prefs is None:
+            return queryset
+        for scorer in self._softened:
+            if scorer.preference not in relax:
+                queryset = scorer.prefilter(queryset, user_prefs)
+        return queryset
+
+    def columns(self, rows):
+        """
+        Turn fetched rows into column arrays.
+
+        Args:
+            rows: Tuples of (apartment_id, *fields)
+
+        Returns:
+            dict: Field name to column values
+        """
+        columns = {}
+        for i, field in enumerate(self.fields, start=1):
+            values = [row[i] for row in rows]
+            columns[field] = self._converters.get(field, _to_float)(values)
+        return columns
+
+    def score(self, columns, context):
+        """
+        Score a batch of candidates with every weighted scorer.
+
+        Args:
+            columns: Dictionary from columns()
+            context: ScoringContext of the searching user
+
+        Returns:
+            ndarray: Combined scores between 0 and 1
+        """
+        if len(self.scorers) == 1:
+            return self.scorers[0].score(columns, context)
+        scores = np.vstack([scorer.score(columns, context) for scorer in self.scorers])
+        return self.weights @ scores
+
+
+# Ranking by compatibility alone, which needs no preferences or extra columns
+COMPATIBILITY_PIPELINE = ScoringPipeline({CompatibilityScorer.name: 1.0})
+
+
+def get_scoring_pipeline():
+    """
+    Get the pipeline configured in settings.
+
+    Returns:
+        ScoringPipeline: Pipeline with RECOMMENDATION_SCORE_WEIGHTS and
+                         RECOMMENDATION_SOFT_PREFERENCES, or ranking by
+                         compatibility alone if they are invalid
+    """
+    try:
+        return ScoringPipeline(settings.RECOMMENDATION_SCORE_WEIGHTS, settings.RECOMMENDATION_SOFT_PREFERENCES)
+    except Exception as e:
+        logger.error(f"Error building scoring pipeline: {str(e)}")
+        return COMPATIBILITY_PIPELINE
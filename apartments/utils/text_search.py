@@ -0,0 +1,147 @@
+"""
+Free-text search over apartment listings.
+The street, area and description are normalized into one search_text column
+with a pg_trgm GIN index, so typed keywords match through the index and rank
+by trigram word similarity. Without pg_trgm, matching falls back to plain
+substring filters on the same normalized text.
+"""
+import logging
+import re
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import DatabaseError, connections, transaction
+from django.db.models import FloatField, Value
+
+from apartments.utils.text_similarity import preprocess_text
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_NAME = 'apartment_search_text_trgm_idx'
+
+CREATE_SEARCH_INDEX_SQL = f"""
+CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME}
+ON apartments_apartment USING gin (search_text gin_trgm_ops);
+"""
+
+DROP_SEARCH_INDEX_SQL = f"DROP INDEX IF EXISTS {SEARCH_INDEX_NAME};"
+
+# Hyphens, the Hebrew maqaf and slashes join words, so they become spaces
+_WORD_JOINERS = re.compile(r'[-־–/]')
+
+# Hebrew final letter forms, folded so partially typed words still match
+_FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+
+# Database aliases where pg_trgm was found, checked once per process
+_trigram_available = {}
+
+
+def normalize_search_text(text):
+    """
+    Normalize Hebrew or English text for searching.
+
+    Args:
+        text: Input text string
+
+    Returns:
+        str: Lowercase text without punctuation or vowel points, with final letters folded
+    """
+    if not text:
+        return ""
+    return preprocess_text(_WORD_JOINERS.sub(' ', text)).translate(_FINAL_LETTERS)
+
+
+def build_search_text(apartment):
+    """
+    Build the searchable text of an apartment.
+
+    Args:
+        apartment: Apartment instance
+
+    Returns:
+        str: Normalized street, area and description
+    """
+    parts = (apartment.street, apartment.area, apartment.about)
+    return ' '.join(filter(None, (normalize_search_text(part) for part in parts)))
+
+
+def trigram_search_available(using='default'):
+    """
+    Check whether the database has pg_trgm installed.
+
+    Args:
+        using: Alias of the database to check
+
+    Returns:
+        bool: True when trigram lookups can be used
+    """
+    if using not in _trigram_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'postgresql':
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                    available = cursor.fetchone() is not None
+            except DatabaseError as e:
+                logger.error(f"Error checking for pg_trgm: {str(e)}")
+        _trigram_available[using] = available
+    return _trigram_available[using]
+
+
+def install_trigram_search(using='default'):
+    """
+    Create the pg_trgm extension and the search index, where the server provides pg_trgm.
+
+    Args:
+        using: Alias of the database to install into
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+            cursor.execute(CREATE_SEARCH_INDEX_SQL)
+    except DatabaseError as e:
+        logger.error(f"Error installing trigram search: {str(e)}")
+    _trigram_available.pop(using, None)
+
+
+def filter_by_text(queryset, query):
+    """
+    Keep the apartments whose street, area or description match a query.
+
+    Args:
+        queryset: Apartment queryset
+        query: Text typed by the user
+
+    Returns:
+        Filtered QuerySet
+    """
+    normalized = normalize_search_text(query)
+    if not normalized:
+        return queryset
+    if trigram_search_available(queryset.db):
+        return queryset.filter(search_text__trigram_word_similar=normalized)
+    for word in normalized.split():
+        queryset = queryset.filter(search_text__contains=word)
+    return queryset
+
+
+def rank_by_text(queryset, query):
+    """
+    Keep the apartments matching a query, annotated with their relevance as `rank`.
+
+    Args:
+        queryset: Apartment queryset
+        query: Text typed by the user
+
+    Returns:
+        Filtered QuerySet with a `rank` between 0 and 1, higher for better matches
+    """
+    normalized = normalize_search_text(query)
+    queryset = filter_by_text(queryset, query)
+    if normalized and trigram_search_available(queryset.db):
+        return queryset.annotate(rank=TrigramWordSimilarity(Value(normalized), 'search_text'))
+    # Substring matches are all equally relevant
+    return queryset.annotate(rank=Value(1.0, output_field=FloatField()))
@@ -8,6 +8,10 @@ from .apartment_detail_views import ApartmentView
 from .like_views import ApartmentLikeView, ApartmentLikersView
 from .user_apartment_views import UserApartmentsView, UserLikedApartmentsView
 from .recommendation_views import ApartmentRecommendationView
+from .nearby_views import ApartmentNearbyView
+from .match_count_views import ApartmentMatchCountView
+from .facet_views import ApartmentFacetsView
+from .search_views import ApartmentSearchView
 
 __all__ = [
     'ApartmentCreateView',
@@ -18,4 +22,8 @@ __all__ = [
     'UserApartmentsView',
     'UserLikedApartmentsView',
     'ApartmentRecommendationView',
+    'ApartmentNearbyView',
+    'ApartmentMatchCountView',
+    'ApartmentFacetsView',
+    'ApartmentSearchView',
 ]
@@ -1,6 +1,7 @@
 """
 Core apartment-related views for the apartments app.
 """
+from django.db import transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -9,6 +10,7 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from apartments.serializers.apartment import ApartmentSerializer
 from apartments.models.photo import ApartmentPhoto
 from apartments.utils.location import add_random_offset, get_area_from_coordinates, truncate_coordinates
+from apartments.utils.near_duplicates import flag_duplicate
 from apartments.models import Feature, City
 from apartments.serializers.feature import FeatureSerializer
 from apartments.serializers.city import CitySerializer
@@ -45,12 +47,17 @@ class ApartmentCreateView(APIView):
             if not serializer.is_valid():
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
-            # Save apartment
-            apartment = serializer.save()
-            
-            # Handle photos
-            for photo in photos:
-                ApartmentPhoto.objects.create(apartment=apartment, photo=photo)
+            # Save the listing with its features and photos at once, so the
+            # new-listing announcement only runs for the finished listing
+            with transaction.atomic():
+                apartment = serializer.save()
+                
+                # Flag reposts of an existing listing; the listing is still created
+                flag_duplicate(apartment)
+                
+                # Handle photos
+                for photo in photos:
+                    ApartmentPhoto.objects.create(apartment=apartment, photo=photo)
             
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
@@ -0,0 +1,77 @@
+"""
+Faceted search views for the apartments app.
+"""
+import logging
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from apartments.utils.facets import facets_etag, get_facets
+from apartments.utils.inventory_index import get_inventory_version
+from apartments.views.match_count_views import PREFERENCE_PARAMS, parse_draft_preferences
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that make up the filter state
+FILTER_PARAMS = ('city', 'features') + tuple(PREFERENCE_PARAMS)
+
+
+def _filters_token(params):
+    """
+    Canonical form of the filter state, so equivalent requests share a cache entry.
+    """
+    items = []
+    for name in FILTER_PARAMS:
+        value = params.get(name, '')
+        if value == '':
+            continue
+        if name in ('features', 'number_of_roommates'):
+            value = ','.join(sorted(item.strip() for item in value.split(',') if item.strip()))
+        items.append((name, value))
+    return urlencode(items)
+
+
+class ApartmentFacetsView(APIView):
+    """
+    API View to count apartments per city, area, room count, price bucket
+    and feature for the current filter state.
+
+    Takes the same query parameters as the match count, with the city
+    optional. Responses carry an ETag that changes with the inventory.
+    """
+
+    def get(self, request):
+        if request.token_error:
+            return request.token_error
+
+        try:
+            draft, feature_ids = parse_draft_preferences(request.query_params, require_city=False)
+        except ValidationError as e:
+            return Response(
+                {"error": e.messages[0]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            token = _filters_token(request.query_params)
+            # Let clients skip the download when the inventory hasn't changed
+            if request.headers.get('If-None-Match') == facets_etag(get_inventory_version(), token):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = request.headers['If-None-Match']
+                return response
+
+            body, version = get_facets(draft, feature_ids, token)
+            response = Response(body, status=status.HTTP_200_OK)
+            response['ETag'] = facets_etag(version, token)
+            return response
+
+        except Exception as e:
+            logger.error(f"Error in ApartmentFacetsView: {str(e)}")
+            return Response(
+                {"error": "An unexpected error occurred"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
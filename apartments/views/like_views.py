@@ -10,7 +10,8 @@ from rest_framework import status
 
 from apartments.models import Apartment, ApartmentUserLike
 from apartments.serializers.apartment import ApartmentSerializer
-from apartments.utils.compatibility import calculate_user_compatibility
+from apartments.utils.compatibility_cache import get_compatibility_scores
+from apartments.utils.recommendation_feed import drop_from_feed
 from users.models.user_details import UserDetails
 from users.models.user_like import UserUserLike
 from users.serializers.api_user_details import ApiUserDetailsSerializer
@@ -46,6 +47,7 @@ class ApartmentLikeView(APIView):
                 apartment=apartment,
                 defaults={'like': like}
             )
+            drop_from_feed(user_id, apartment.id)
             
             # Send push notification if the user liked the apartment (not if they unliked it)
             if like and (created or not obj.like):
@@ -153,6 +155,10 @@ class ApartmentLikersView(APIView):
                 user_serializer = ApiUserDetailsSerializer(user_details, many=True)
                 users_data = user_serializer.data
                 
+                # Read all likers' scores in one batch from the pairwise cache
+                liker_ids = [user_data.get('id') for user_data in users_data]
+                compatibility_scores = dict(zip(liker_ids, get_compatibility_scores(user_id, liker_ids).tolist()))
+                
                 # Add apartment and compatibility score to each user
                 for i, user_data in enumerate(users_data):
                     liker_id = user_data.get('id')
@@ -165,7 +171,7 @@ class ApartmentLikersView(APIView):
                         users_data[i]['liked_apartment'] = apartment_serializer.data
                     
                     # Calculate compatibility score (0-1) and convert to percentage (0-100)
-                    compatibility_score = calculate_user_compatibility(user_id, liker_id) * 100
+                    compatibility_score = compatibility_scores[liker_id] * 100
                     # Round to nearest integer
                     users_data[i]['compatibility_score'] = round(compatibility_score)
                 
@@ -0,0 +1,106 @@
+"""
+Live match count views for the apartments app.
+"""
+import logging
+import uuid
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from apartments.utils.inventory_index import count_matching_apartments
+from users.models import UserPreferences
+
+logger = logging.getLogger(__name__)
+
+
+def _list_param(value, parse=int):
+    return [parse(item) for item in value.split(',') if item.strip()]
+
+
+# Draft preference query parameters and how each is parsed
+PREFERENCE_PARAMS = {
+    'min_price': int,
+    'max_price': int,
+    'max_floor': int,
+    'number_of_roommates': _list_param,
+    'area': str,
+    'move_in_date': date.fromisoformat,
+    'latitude': float,
+    'longitude': float,
+    'max_distance_km': float,
+}
+
+
+def parse_draft_preferences(params, require_city=True):
+    """
+    Build unsaved preferences from query parameters.
+
+    Args:
+        params: Query parameters with the preference fields, the city as `city`
+                and the required feature IDs as comma-separated `features`
+        require_city: Whether the city must be given
+
+    Returns:
+        tuple: (unsaved UserPreferences validated like saved ones, list of feature IDs)
+
+    Raises:
+        ValidationError: If a value is missing, malformed or invalid
+    """
+    try:
+        city = params.get('city', '')
+        if require_city and city == '':
+            raise ValidationError("City is required")
+        values = {
+            name: parse(params[name])
+            for name, parse in PREFERENCE_PARAMS.items()
+            if params.get(name, '') != ''
+        }
+        draft = UserPreferences(city_id=uuid.UUID(city) if city != '' else None, **values)
+        feature_ids = _list_param(params.get('features', ''), uuid.UUID)
+    except ValueError:
+        raise ValidationError("Invalid preference value")
+
+    draft.clean()
+    return draft, feature_ids
+
+
+class ApartmentMatchCountView(APIView):
+    """
+    API View to count the apartments matching draft preferences.
+
+    Counts come from the in-memory inventory index without touching the
+    database, so the preferences screen can call it on every slider change.
+    Takes the preference fields as query parameters, with the city as `city`
+    and the required feature IDs as comma-separated `features`.
+    """
+
+    def get(self, request):
+        if request.token_error:
+            return request.token_error
+
+        try:
+            draft, feature_ids = parse_draft_preferences(request.query_params)
+        except ValidationError as e:
+            return Response(
+                {"error": e.messages[0]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            count, city_total = count_matching_apartments(draft, feature_ids)
+            return Response(
+                {
+                    "count": count,
+                    "city_total": city_total
+                },
+                status=status.HTTP_200_OK
+            )
+        except Exception as e:
+            logger.error(f"Error in ApartmentMatchCountView: {str(e)}")
+            return Response(
+                {"error": "An unexpected error occurred"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
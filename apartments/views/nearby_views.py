@@ -0,0 +1,106 @@
+"""
+Radius search views for the apartments app.
+"""
+import logging
+from django.db import DatabaseError
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from apartments.models import Apartment
+from apartments.serializers.apartment import ApartmentSerializer
+from apartments.utils.geo import apartments_within_radius
+from apartments.utils.recommendation import recommendation_prefetches
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RADIUS_KM = 2
+MAX_RADIUS_KM = 50
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class ApartmentNearbyView(APIView):
+    """
+    API View to retrieve the apartments closest to a point, within a radius.
+    """
+    
+    def get(self, request):
+        if request.token_error:
+            return request.token_error
+        
+        try:
+            latitude = float(request.query_params['latitude'])
+            longitude = float(request.query_params['longitude'])
+            radius_km = float(request.query_params.get('radius_km', DEFAULT_RADIUS_KM))
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except KeyError:
+            return Response(
+                {"error": "Latitude and longitude are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError:
+            return Response(
+                {"error": "Latitude, longitude, radius_km and limit must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            return Response(
+                {"error": "Latitude or longitude is out of range"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            return Response(
+                {"error": f"Radius must be between 0 and {MAX_RADIUS_KM} km"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < limit <= MAX_LIMIT:
+            return Response(
+                {"error": f"Limit must be between 1 and {MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            nearest = apartments_within_radius(Apartment.objects.all(), latitude, longitude, radius_km, limit)
+            if not nearest:
+                return Response(
+                    {
+                        "message": "No apartments found within the requested distance",
+                        "apartments": []
+                    },
+                    status=status.HTTP_200_OK
+                )
+            
+            # Load full rows for the nearest apartments only, then restore distance order
+            apartments = Apartment.objects.filter(
+                pk__in=[apartment_id for apartment_id, _ in nearest]
+            ).select_related('city', 'user').prefetch_related(*recommendation_prefetches())
+            by_id = {apartment.pk: apartment for apartment in apartments}
+            ordered = [by_id[apartment_id] for apartment_id, _ in nearest if apartment_id in by_id]
+            distances = {apartment_id: distance for apartment_id, distance in nearest}
+            
+            apartments_data = ApartmentSerializer(ordered, many=True).data
+            for apartment, apartment_data in zip(ordered, apartments_data):
+                apartment_data['distance_km'] = round(distances[apartment.pk], 2)
+            
+            return Response(
+                {
+                    "message": "Nearby apartments retrieved successfully",
+                    "apartments": apartments_data
+                },
+                status=status.HTTP_200_OK
+            )
+        
+        except DatabaseError:
+            logger.error("Database error in ApartmentNearbyView")
+            return Response(
+                {"error": "An error occurred while fetching nearby apartments"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        except Exception as e:
+            logger.error(f"Error in ApartmentNearbyView: {str(e)}")
+            return Response(
+                {"error": "An unexpected error occurred"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
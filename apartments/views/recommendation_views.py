@@ -2,13 +2,27 @@
 Apartment recommendation views for the apartments app.
 """
 import logging
+import random
+
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.db import DatabaseError
+from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
 from apartments.serializers.apartment import ApartmentSerializer
-from apartments.utils.recommendation import get_recommended_apartments
+from apartments.utils.recommendation import get_owner_compatibility, get_recommended_apartments
+from apartments.utils.recommendation_cache import (
+    cache_recommendations,
+    get_cached_recommendations,
+    get_recommendation_versions,
+    recommendation_etag,
+)
+from apartments.utils.filtering import best_relaxation, count_relaxed_matches
+from apartments.utils.profiling import get_histograms, profile_stage, profiling, record_profile
+from apartments.utils.recommendation_feed import get_feed_page, schedule_feed_rebuild
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +31,9 @@ class ApartmentRecommendationView(APIView):
     """
     API View to retrieve apartments recommended for the authenticated user
     based on their preferences, up to a specified limit.
+    
+    Staff can add ?explain=1 (or an X-Explain: 1 header) to skip the response
+    cache and get per-stage timings in the body and a Server-Timing header.
     """
     
     def get(self, request):
@@ -38,36 +55,60 @@ class ApartmentRecommendationView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
+        explain = self._explain_requested(request, user_id)
+        sample_rate = settings.RECOMMENDATION_PROFILE_SAMPLE_RATE
+        if not explain and not (sample_rate and random.random() < sample_rate):
+            return self._respond(request, user_id, limit)
+        
+        with profiling() as profiler:
+            response = self._respond(request, user_id, limit, use_cache=not explain)
+        record_profile(profiler)
+        
+        if explain and isinstance(response, Response):
+            response.data = {
+                **response.data,
+                "explain": {"stages": profiler.report(), "histograms": get_histograms()},
+            }
+            response['Server-Timing'] = profiler.server_timing()
+        return response
+
+    def _explain_requested(self, request, user_id):
+        """
+        Check whether a staff user asked for the request's profile.
+        """
+        requested = request.query_params.get('explain') == '1' or request.headers.get('X-Explain') == '1'
+        return requested and User.objects.filter(id=user_id, is_staff=True).exists()
+
+    def _respond(self, request, user_id, limit, use_cache=True):
+        """
+        Serve a user's recommendations, from the response cache when allowed.
+        
+        Args:
+            request: The request being served
+            user_id: ID of the user to get recommendations for
+            limit: Maximum number of apartments to return
+            use_cache: Whether cached bodies and ETags may be used
+            
+        Returns:
+            Response with the recommendations body, or a 304 response
+        """
         try:
-            # Get recommended apartments using the utility function
-            # Now returns both apartments and compatibility scores
-            recommended_apartments, compatibility_scores = get_recommended_apartments(user_id, limit)
+            # Responses only change when one of these versions does
+            versions = get_recommendation_versions(user_id)
+            etag = recommendation_etag(user_id, limit, versions)
+            if use_cache and request.headers.get('If-None-Match') == etag:
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
             
-            if not recommended_apartments.exists():
-                return Response(
-                    {
-                        "message": "No matching apartments found based on your preferences",
-                        "apartments": []
-                    },
-                    status=status.HTTP_200_OK
-                )
-                
-            serializer = ApartmentSerializer(recommended_apartments, many=True)
-            apartments_data = serializer.data
+            body = get_cached_recommendations(user_id, limit, versions) if use_cache else None
+            if body is None:
+                body = self._build_body(user_id, limit)
+                cache_recommendations(user_id, limit, versions, body)
             
-            # Add compatibility scores to each apartment (multiply by 100 to get percentage)
-            for i, apartment in enumerate(apartments_data):
-                if i < len(compatibility_scores):
-                    # Convert score to percentage (0-100) and round to integer
-                    apartments_data[i]['compatibility_score'] = round(compatibility_scores[i] * 100)
-            
-            return Response(
-                {
-                    "message": "Recommended apartments retrieved successfully",
-                    "apartments": apartments_data
-                },
-                status=status.HTTP_200_OK
-            )
+            response = Response(body, status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            return response
             
         except DatabaseError:
             logger.error(f"Database error in ApartmentRecommendationView for user {user_id}")
@@ -81,3 +122,66 @@ class ApartmentRecommendationView(APIView):
                 {"error": "An unexpected error occurred"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    def _build_body(self, user_id, limit):
+        """
+        Rank and serialize a user's recommendations.
+        
+        Args:
+            user_id: ID of the user to get recommendations for
+            limit: Maximum number of apartments to return
+            
+        Returns:
+            dict: The response body
+        """
+        # Serve the precomputed feed when it is current, otherwise rank live
+        # and rebuild the feed for the next request
+        with profile_stage('feed'):
+            feed_page = get_feed_page(user_id, limit)
+        if feed_page is not None:
+            recommended_apartments, match_scores = feed_page
+        else:
+            recommended_apartments, match_scores = get_recommended_apartments(user_id, limit)
+            schedule_feed_rebuild(user_id)
+        
+        body = {"message": "Recommended apartments retrieved successfully"}
+        if not recommended_apartments:
+            # Tell the client which preference to loosen, and show what loosening it brings back
+            with profile_stage('relaxation'):
+                relaxed_counts = count_relaxed_matches(user_id)
+            relaxed = best_relaxation(relaxed_counts)
+            if relaxed is None:
+                return {
+                    "message": "No matching apartments found based on your preferences",
+                    "apartments": [],
+                    "relaxed_counts": relaxed_counts,
+                }
+            recommended_apartments, match_scores = get_recommended_apartments(
+                user_id, limit, relax=(relaxed,)
+            )
+            body = {
+                "message": f"No apartments match all your preferences; showing matches without your {relaxed} preference",
+                "relaxed_preference": relaxed,
+                "relaxed_counts": relaxed_counts,
+            }
+        
+
+        # Apartments arrive with their related rows prefetched
+        with profile_stage('serialization'):
+            serializer = ApartmentSerializer(recommended_apartments, many=True)
+            apartments_data = serializer.data
+        
+        # The ranking score blends in soft preferences, so compatibility with the owner is reported on its own
+        with profile_stage('scoring'):
+            compatibility_scores = get_owner_compatibility(user_id, recommended_apartments, match_scores)
+        
+        # Add both scores to each apartment (multiply by 100 to get percentage)
+        for apartment_data, match_score, compatibility_score in zip(
+            apartments_data, match_scores, compatibility_scores
+        ):
+            # Convert scores to percentage (0-100) and round to integer
+            apartment_data['match_score'] = round(match_score * 100)
+            apartment_data['compatibility_score'] = round(compatibility_score * 100)
+        
+        body["apartments"] = apartments_data
+        return body
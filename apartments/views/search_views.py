@@ -0,0 +1,85 @@
+"""
+Search views for the apartments app.
+"""
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from apartments.serializers.apartment import ApartmentSerializer
+from apartments.utils.search import search_apartments
+from apartments.views.match_count_views import parse_draft_preferences
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class ApartmentSearchView(APIView):
+    """
+    API View to browse apartments matching filters, one page at a time.
+
+    Takes the same filter parameters as the match count, with the city
+    optional, plus `q` to match the street, area and description, `sort`
+    (price, created_at, entry_date or relevance, prefixed with `-` for
+    descending order), `limit`, and the `cursor` returned with the previous
+    page.
+    """
+
+    def get(self, request):
+        if request.token_error:
+            return request.token_error
+
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": "Limit must be a number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < limit <= MAX_LIMIT:
+            return Response(
+                {"error": f"Limit must be between 1 and {MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            draft, feature_ids = parse_draft_preferences(request.query_params, require_city=False)
+            apartments, next_cursor = search_apartments(
+                draft,
+                feature_ids,
+                sort=request.query_params.get('sort') or None,
+                cursor=request.query_params.get('cursor') or None,
+                limit=limit,
+                text=request.query_params.get('q', ''),
+            )
+        except ValidationError as e:
+            return Response(
+                {"error": e.messages[0]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except DatabaseError:
+            logger.error("Database error in ApartmentSearchView")
+            return Response(
+                {"error": "An error occurred while searching apartments"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        except Exception as e:
+            logger.error(f"Error in ApartmentSearchView: {str(e)}")
+            return Response(
+                {"error": "An unexpected error occurred"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response(
+            {
+                "message": "Apartments retrieved successfully",
+                "apartments": ApartmentSerializer(apartments, many=True).data,
+                "next_cursor": next_cursor
+            },
+            status=status.HTTP_200_OK
+        )
@@ -21,6 +21,10 @@ django_asgi_app = get_asgi_application()
 # Import after Django setup to avoid AppRegistryNotReady exception
 from chat.consumers import ChatConsumer, UserConsumer
 from appartners.jwt_auth_middleware import JWTAuthMiddleware
+from apartments.utils.inventory_index import warm_inventory_index
+
+# Load the optional inventory index before serving requests
+warm_inventory_index()
 
 # Define WebSocket URL patterns
 websocket_urlpatterns = [
@@ -54,6 +54,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'django_extensions',
 
@@ -137,6 +138,35 @@ else:
         },
     }
 
+# Cache
+# Share the Redis instance so cache version counters are seen by every worker;
+# fall back to Django's per-process local memory cache locally
+if redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': redis_url,
+        },
+    }
+
+# Keep an in-process bitmap index of the apartment inventory for preference filtering
+INVENTORY_INDEX_ENABLED = env.bool('INVENTORY_INDEX_ENABLED', default=False)
+
+# Fraction of recommendation requests profiled per stage into the shared histograms
+RECOMMENDATION_PROFILE_SAMPLE_RATE = env.float('RECOMMENDATION_PROFILE_SAMPLE_RATE', default=0.0)
+
+# Weights of the recommendation scorers; compatibility alone keeps ranking in the database
+RECOMMENDATION_SCORE_WEIGHTS = {
+    'compatibility': env.float('RECOMMENDATION_WEIGHT_COMPATIBILITY', default=1.0),
+    'price': env.float('RECOMMENDATION_WEIGHT_PRICE', default=0.0),
+    'date': env.float('RECOMMENDATION_WEIGHT_DATE', default=0.0),
+    'floor': env.float('RECOMMENDATION_WEIGHT_FLOOR', default=0.0),
+    'distance': env.float('RECOMMENDATION_WEIGHT_DISTANCE', default=0.0),
+}
+
+# Preferences (price, date, floor, distance) filtered loosely and penalized by their weighted scorer instead
+RECOMMENDATION_SOFT_PREFERENCES = env.list('RECOMMENDATION_SOFT_PREFERENCES', default=[])
+
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
 
@@ -7,7 +7,7 @@ from apartments.models import Apartment
 from apartments.models.apartment_user_like import ApartmentUserLike
 from apartments.serializers.apartment import ApartmentSerializer
 import logging
-from apartments.utils.compatibility import calculate_user_compatibility
+from apartments.utils.compatibility_cache import get_compatibility_scores
 
 
 logger = logging.getLogger(__name__)
@@ -268,10 +268,8 @@ class ChatRoomSerializer(serializers.ModelSerializer):
             if not other_user:
                 return None
                 
-            # Import here to avoid circular imports
-            
-            # Calculate compatibility and convert to percentage
-            compatibility_score = calculate_user_compatibility(current_user.id, other_user.id) * 100
+            # Read compatibility from the pairwise cache and convert to percentage
+            compatibility_score = float(get_compatibility_scores(current_user.id, [other_user.id])[0]) * 100
             return round(compatibility_score)
             
         except Exception as e:
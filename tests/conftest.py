@@ -6,6 +6,24 @@ from django.conf import settings
 from unittest.mock import Mock
 from django.db.models.query import QuerySet
 
+@pytest.fixture(autouse=True)
+def clear_answer_store():
+    """Fixture that empties the per-worker questionnaire caches between tests"""
+    from apartments.utils.answer_store import answer_store
+    from users.utils.questionnaire_schema import bump_schema_version
+    answer_store.clear()
+    bump_schema_version()
+    yield
+    answer_store.clear()
+
+@pytest.fixture(autouse=True)
+def reset_inventory_version():
+    """Fixture that makes any loaded inventory or preference index reload, since test writes are rolled back"""
+    from apartments.utils.inventory_index import bump_inventory_version
+    from apartments.utils.preference_index import bump_preference_index_version
+    bump_inventory_version()
+    bump_preference_index_version()
+
 @pytest.fixture
 def api_client():
     """Fixture that returns a DRF API client"""
@@ -0,0 +1,24 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from apartments.models import Apartment
+
+
+@pytest.mark.django_db
+def test_benchmark_recommendations_reports_and_rolls_back(tmp_path):
+    """Test that the benchmark writes per-stage results and leaves no seeded rows behind"""
+    output = tmp_path / 'results.json'
+
+    call_command('benchmark_recommendations', sizes=[60], users=3, repeat=1, output=str(output), verbosity=0)
+
+    report = json.loads(output.read_text())
+    result = report['results'][0]
+    assert result['apartments'] == 60
+    assert set(result['stages']) == {
+        'filter_apartments', 'rank_apartments_by_compatibility', 'get_top_apartments', 'hydrate_and_serialize'
+    }
+    assert all(stats['p50_ms'] <= stats['p99_ms'] for stats in result['stages'].values())
+    assert result['stages']['hydrate_and_serialize']['mean_queries'] > 0
+    assert not Apartment.objects.exists()
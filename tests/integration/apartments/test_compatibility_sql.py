@@ -0,0 +1,208 @@
+import importlib
+import random
+from datetime import date, timedelta
+
+import pytest
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apartments.models import Apartment, City
+from apartments.utils.compatibility import (
+    calculate_responses_compatibility,
+    get_questions_metadata,
+    get_responses_for_users,
+    score_many,
+)
+from apartments.utils.compatibility_sql import order_by_compatibility, save_answer_vectors
+from apartments.utils.filtering import filter_apartments
+from apartments.utils.recommendation import (
+    get_recommended_apartments,
+    rank_apartments_by_compatibility,
+    rank_apartments_in_database,
+)
+from apartments.utils.seen_apartments import SeenApartments
+from users.models import Question, QuestionnaireTemplate, UserAnswerVector, UserResponse
+from users.serializers.questionnaire import UserResponseBulkSerializer
+
+YEAR_ANSWERS = ['1', '2', '3', '4', '03', 'first', 'first', '', None]
+
+
+def _make_questions(extra_text=False):
+    template = QuestionnaireTemplate.objects.create(title='Lifestyle')
+    questions = [
+        Question.objects.create(id=1, questionnaire=template, title='Major', question_type='text', order=1),
+        Question.objects.create(id=2, questionnaire=template, title='Year', question_type='text', order=2),
+    ]
+    for q_id in range(3, 10):
+        questions.append(Question.objects.create(
+            id=q_id, questionnaire=template, title=f'Question {q_id}', question_type='radio',
+            order=q_id, weight=1.0 + (q_id % 3) * 0.7
+        ))
+    if extra_text:
+        questions.append(Question.objects.create(
+            id=12, questionnaire=template, title='Free text', question_type='text', order=12
+        ))
+    return questions
+
+
+def _answer_randomly(rng, user, questions):
+    for question in questions:
+        roll = rng.random()
+        if roll < 0.15:
+            continue
+        if question.question_type == 'text':
+            text = rng.choice(YEAR_ANSWERS) if question.id == 2 else rng.choice(['Biology', '', None])
+            UserResponse.objects.create(user=user, question=question, text_response=text)
+        else:
+            numeric = None if roll < 0.25 else rng.randint(1, 5)
+            UserResponse.objects.create(user=user, question=question, numeric_response=numeric)
+
+
+def _make_inventory(questions, seed, owners=40):
+    rng = random.Random(seed)
+    city = City.objects.create(name='Beer Sheva', hebrew_name='באר שבע')
+    searcher = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    _answer_randomly(rng, searcher, questions)
+    for i in range(owners):
+        owner = User.objects.create_user(username=f'owner{i}', email=f'owner{i}@example.com', password='testpass123')
+        if i % 10:
+            _answer_randomly(rng, owner, questions)
+        Apartment.objects.create(
+            user=owner,
+            city=city,
+            street='Rager',
+            type='Apartment',
+            floor=1,
+            number_of_rooms=3,
+            number_of_available_rooms=1,
+            total_price=2000 + i,
+            available_entry_date=date.today() + timedelta(days=30),
+        )
+    save_answer_vectors(User.objects.values_list('id', flat=True))
+    return searcher
+
+
+def _reference_scores(searcher, apartments):
+    metadata = get_questions_metadata()
+    responses = get_responses_for_users([searcher.id] + [a.user_id for a in apartments])
+    return [
+        calculate_responses_compatibility(
+            responses.get(searcher.id, {}), responses.get(apartment.user_id, {}), metadata
+        )
+        for apartment in apartments
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_sql_scores_match_python_scorer(seed):
+    """Test that scores computed in Postgres equal the Python reference"""
+    searcher = _make_inventory(_make_questions(), seed)
+
+    apartments = list(order_by_compatibility(Apartment.objects.all(), searcher.id))
+    sql_scores = [apartment.compatibility_score for apartment in apartments]
+
+    assert sql_scores == _reference_scores(searcher, apartments)
+    assert sql_scores == score_many(searcher.id, [a.user_id for a in apartments]).tolist()
+    assert sql_scores == sorted(sql_scores, reverse=True)
+
+@pytest.mark.django_db
+def test_sql_scores_unsupported_text_question():
+    """Test that answered free-text questions give a neutral score in SQL too"""
+    searcher = _make_inventory(_make_questions(extra_text=True), seed=4)
+
+    apartments = list(order_by_compatibility(Apartment.objects.all(), searcher.id))
+
+    assert [a.compatibility_score for a in apartments] == _reference_scores(searcher, apartments)
+
+@pytest.mark.django_db
+def test_recommendations_ranked_in_database():
+    """Test that the database path returns the same winners as Python ranking"""
+    searcher = _make_inventory(_make_questions(), seed=5)
+    expected = rank_apartments_by_compatibility(list(filter_apartments(searcher.id)), searcher.id, 40)
+    expected_scores = [score for _, score in expected]
+
+    apartments, scores = get_recommended_apartments(searcher.id, limit=5)
+    ids = [apartment.id for apartment in apartments]
+
+    assert scores == expected_scores[:5]
+    assert len(ids) == 5
+    assert {a.id for a, score in expected if score > scores[-1]} <= set(ids)
+
+@pytest.mark.django_db
+def test_seen_top_apartments_skipped_in_one_query():
+    """Test that swipes clustered at the top of the ranking are excluded in the scoring query"""
+    searcher = _make_inventory(_make_questions(), seed=6)
+    ranked = [a.id for a in order_by_compatibility(Apartment.objects.all(), searcher.id)]
+    seen = SeenApartments.from_ids(ranked[:30])
+
+    with CaptureQueriesContext(connection) as queries:
+        top = rank_apartments_in_database(Apartment.objects.all(), searcher.id, 5, seen=seen)
+
+    scoring = [query['sql'] for query in queries if 'appartners_compatibility' in query['sql']]
+    assert len(scoring) == 1
+    # The seen-set is one array value, and only the requested rows are fetched
+    assert 'ANY(' in scoring[0] and ' IN (' not in scoring[0]
+    assert scoring[0].rstrip().endswith('LIMIT 5')
+    assert [apartment_id for apartment_id, _ in top] == ranked[30:35]
+
+@pytest.mark.django_db
+def test_answer_vector_saved_with_responses(django_capture_on_commit_callbacks):
+    """Test that submitting responses stores the packed vector"""
+    _make_questions()
+    user = User.objects.create_user(username='answerer', email='answerer@example.com', password='testpass123')
+    serializer = UserResponseBulkSerializer(
+        data={'responses': [
+            {'question': 2, 'text_response': '3'},
+            {'question': 4, 'numeric_response': 5},
+        ]},
+        context={'user': user},
+    )
+    assert serializer.is_valid(), serializer.errors
+    with django_capture_on_commit_callbacks() as callbacks:
+        serializer.save()
+
+    # One rebuild for the whole submission; the other callbacks start background refreshes
+    saves = [callback for callback in callbacks if callback.__name__ == 'save']
+    assert len(saves) == 1
+    saves[0]()
+
+    vector = UserAnswerVector.objects.get(user=user)
+    assert vector.answers == [-128, 1, -128, 5]
+    assert (vector.year_value, vector.year_text) == (3, '3')
+
+@pytest.mark.django_db
+def test_answer_vector_follows_direct_response_writes(django_capture_on_commit_callbacks):
+    """Test that responses written outside the questionnaire endpoint keep the vector current"""
+    questions = _make_questions()
+    user = User.objects.create_user(username='answerer', email='answerer@example.com', password='testpass123')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = UserResponse.objects.create(user=user, question=questions[3], numeric_response=2)
+    assert UserAnswerVector.objects.get(user=user).answers == [-128, -128, -128, 2]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response.numeric_response = 4
+        response.save()
+    assert UserAnswerVector.objects.get(user=user).answers == [-128, -128, -128, 4]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response.delete()
+    assert UserAnswerVector.objects.get(user=user).answers == []
+
+
+@pytest.mark.django_db
+def test_backfill_migration_packs_existing_answers():
+    """Test that the data migration stores vectors for users who answered before"""
+    questions = _make_questions()
+    _make_inventory(questions, seed=7)
+    answered = set(UserResponse.objects.values_list('user_id', flat=True))
+    expected = {v.user_id: v.answers for v in UserAnswerVector.objects.filter(user_id__in=answered)}
+    UserAnswerVector.objects.all().delete()
+
+    backfill = importlib.import_module('users.migrations.0034_backfill_answer_vectors')
+    backfill.backfill_answer_vectors(django_apps, None)
+
+    assert {v.user_id: v.answers for v in UserAnswerVector.objects.all()} == expected
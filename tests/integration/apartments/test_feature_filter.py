@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from apartments.models import Apartment, ApartmentFeature, City, Feature
+from apartments.utils.filtering import apartments_with_all_features
+
+
+@pytest.fixture
+def featured_apartments():
+    """Fixture with apartments holding growing subsets of four features"""
+    city = City.objects.create(name='Beer Sheva', hebrew_name='באר שבע')
+    owner = User.objects.create_user(username='owner', email='owner@example.com', password='testpass123')
+    features = [Feature.objects.create(name=f'Feature {i}') for i in range(4)]
+    apartments = []
+    for i in range(5):
+        apartment = Apartment.objects.create(
+            user=owner,
+            city=city,
+            street='Rager',
+            type='Apartment',
+            floor=1,
+            number_of_rooms=3,
+            number_of_available_rooms=1,
+            total_price=2000,
+            available_entry_date=date.today() + timedelta(days=30),
+        )
+        for feature in features[:i]:
+            ApartmentFeature.objects.create(apartment=apartment, feature=feature)
+        apartments.append(apartment)
+    return apartments, features
+
+
+@pytest.mark.django_db
+def test_grouped_feature_match_equals_joins(featured_apartments):
+    """Test that the grouped subquery matches one join per feature"""
+    apartments, features = featured_apartments
+
+    for n in range(1, 5):
+        joined = Apartment.objects.all()
+        for feature in features[:n]:
+            joined = joined.filter(apartment_features__feature_id=feature.id)
+        grouped = Apartment.objects.filter(id__in=apartments_with_all_features({f.id for f in features[:n]}))
+
+        assert set(grouped) == set(joined) == set(apartments[n:])
+        assert str(grouped.query).count('JOIN') == 0
+
+@pytest.mark.django_db
+def test_benchmark_feature_filter_command(featured_apartments):
+    """Test that the benchmark prints a plan per strategy and a summary row per feature count"""
+    out = StringIO()
+    call_command('benchmark_feature_filter', '--max-features', '3', '--repeat', '1', stdout=out)
+    output = out.getvalue()
+
+    assert output.count('grouped subquery') == 3
+    assert output.count('one join per feature') == 3
+    assert '5 apartments' in output
@@ -0,0 +1,89 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from apartments.models import Apartment, City
+from apartments.utils.filtering import filter_apartments
+from apartments.utils.geo import apartments_within_radius, grid_cell, haversine_km
+from appartners.utils import generate_jwt
+from users.models import UserPreferences
+
+CENTER = (31.2520, 34.7915)
+
+
+@pytest.fixture
+def scattered_apartments():
+    """Fixture with apartments scattered up to ~15 km around a point"""
+    rng = random.Random(3)
+    city = City.objects.create(name='Beer Sheva', hebrew_name='באר שבע')
+    owner = User.objects.create_user(username='owner', email='owner@example.com', password='testpass123')
+    for i in range(80):
+        Apartment.objects.create(
+            user=owner,
+            city=city,
+            street='Rager',
+            type='Apartment',
+            floor=1,
+            number_of_rooms=3,
+            number_of_available_rooms=1,
+            total_price=2000,
+            available_entry_date=date.today() + timedelta(days=30),
+            latitude=Decimal(f'{CENTER[0] + rng.uniform(-0.14, 0.14):.7f}'),
+            longitude=Decimal(f'{CENTER[1] + rng.uniform(-0.16, 0.16):.7f}'),
+        )
+    return city
+
+
+def _brute_force(radius_km):
+    rows = list(Apartment.objects.values_list('id', 'latitude', 'longitude'))
+    distances = haversine_km(*CENTER, [r[1] for r in rows], [r[2] for r in rows])
+    return {row[0] for row, distance in zip(rows, distances) if distance <= radius_km}
+
+
+@pytest.mark.django_db
+def test_geo_cell_set_on_save(scattered_apartments):
+    """Test that saving an apartment stores the grid cell of its coordinates"""
+    apartment = Apartment.objects.first()
+
+    assert apartment.geo_cell == grid_cell(apartment.latitude, apartment.longitude)
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('radius_km', [0.5, 3, 8, 25])
+def test_radius_search_matches_brute_force(scattered_apartments, radius_km):
+    """Test that the grid prefilter never drops an apartment inside the radius"""
+    nearest = apartments_within_radius(Apartment.objects.all(), *CENTER, radius_km)
+    distances = [distance for _, distance in nearest]
+
+    assert {apartment_id for apartment_id, _ in nearest} == _brute_force(radius_km)
+    assert distances == sorted(distances)
+
+@pytest.mark.django_db
+def test_distance_preference_filters_recommendations(scattered_apartments):
+    """Test that a search radius preference limits the filtered apartments"""
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    UserPreferences.objects.create(
+        user=user, city=scattered_apartments,
+        latitude=Decimal(str(CENTER[0])), longitude=Decimal(str(CENTER[1])), max_distance_km=6,
+    )
+
+    assert set(filter_apartments(user.id).values_list('id', flat=True)) == _brute_force(6)
+
+@pytest.mark.django_db
+def test_nearby_view(scattered_apartments, api_client):
+    """Test that the nearby endpoint returns the closest apartments with distances"""
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(user)}')
+    url = reverse('apartment-nearby')
+
+    response = api_client.get(url, {'latitude': CENTER[0], 'longitude': CENTER[1], 'radius_km': 8, 'limit': 5})
+    apartments = response.json()['apartments']
+
+    assert response.status_code == 200
+    assert len(apartments) == 5
+    assert [a['distance_km'] for a in apartments] == sorted(a['distance_km'] for a in apartments)
+    assert api_client.get(url, {'latitude': CENTER[0]}).status_code == 400
+    assert api_client.get(url, {'latitude': 95, 'longitude': 0}).status_code == 400
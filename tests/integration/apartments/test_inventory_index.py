@@ -0,0 +1,292 @@
+import random
+import uuid
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from apartments.models import Apartment, ApartmentFeature, ApartmentUserLike, City, Feature
+from apartments.utils.filtering import filter_apartments
+from apartments.utils.inventory_index import (
+    InventoryIndex,
+    bump_inventory_version,
+    count_matching_apartments,
+    inventory_index,
+)
+from appartners.utils import generate_jwt
+from users.models import UserPreferences, UserPreferencesFeatures
+
+
+@pytest.fixture
+def inventory():
+    """Fixture with a varied inventory across two cities"""
+    rng = random.Random(11)
+    cities = [
+        City.objects.create(name='Beer Sheva', hebrew_name='באר שבע'),
+        City.objects.create(name='Tel Aviv', hebrew_name='תל אביב'),
+    ]
+    features = [Feature.objects.create(name=f'Feature {i}') for i in range(4)]
+    owner = User.objects.create_user(username='owner', email='owner@example.com', password='testpass123')
+    for i in range(60):
+        rooms = rng.randint(1, 6)
+        apartment = Apartment.objects.create(
+            user=owner,
+            city=rng.choice(cities),
+            street='Rager',
+            type='Apartment',
+            floor=rng.randint(1, 8),
+            number_of_rooms=rooms,
+            number_of_available_rooms=rng.randint(1, rooms),
+            total_price=rng.choice([1500, 2000, 2500, 3000, 3500]) + rng.choice([0, 0.5]),
+            available_entry_date=date.today() + timedelta(days=rng.randint(1, 90)),
+            area=rng.choice([None, '', 'Old City', 'Ramot']),
+        )
+        for feature in rng.sample(features, rng.randint(0, 3)):
+            ApartmentFeature.objects.create(apartment=apartment, feature=feature)
+    return cities, features
+
+
+def _preference_cases(cities, features):
+    today = date.today()
+    yield {}
+    yield {'city': cities[0]}
+    yield {'city': cities[1], 'min_price': 2000, 'max_price': 3000}
+    yield {'city': cities[0], 'max_price': 2500, 'max_floor': 4}
+    yield {'city': cities[0], 'min_price': 3000, 'number_of_roommates': [2, 4]}
+    yield {'city': cities[1], 'area': 'Ramot', 'move_in_date': today + timedelta(days=45)}
+    yield {'city': cities[0], 'features': features[:2]}
+    yield {'city': cities[1], 'features': features[1:2], 'number_of_roommates': [1], 'max_floor': 6}
+
+
+@pytest.mark.django_db
+def test_index_matches_orm_filters(inventory, settings):
+    """Test that index filtering returns the same apartments as the SQL filter chain"""
+    cities, features = inventory
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    liked = Apartment.objects.filter(city=cities[0]).first()
+    ApartmentUserLike.objects.create(user=user, apartment=liked, like=True)
+
+    for case in _preference_cases(cities, features):
+        UserPreferences.objects.filter(user=user).delete()
+        if case:
+            prefs = UserPreferences.objects.create(
+                user=user, **{k: v for k, v in case.items() if k != 'features'}
+            )
+            for feature in case.get('features', []):
+                UserPreferencesFeatures.objects.create(user_preferences=prefs, feature=feature)
+
+        settings.INVENTORY_INDEX_ENABLED = False
+        expected = set(filter_apartments(user.id).values_list('id', flat=True))
+        settings.INVENTORY_INDEX_ENABLED = True
+        actual = set(filter_apartments(user.id).values_list('id', flat=True))
+
+        assert actual == expected, case
+        assert liked.id not in actual
+
+@pytest.mark.django_db
+def test_index_relaxes_like_orm_filters(inventory, settings):
+    """Test that relaxed preferences, like soft scoring ones, are skipped by the index too"""
+    cities, features = inventory
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+
+    for case in _preference_cases(cities, features):
+        UserPreferences.objects.filter(user=user).delete()
+        if case:
+            prefs = UserPreferences.objects.create(
+                user=user, **{k: v for k, v in case.items() if k != 'features'}
+            )
+            for feature in case.get('features', []):
+                UserPreferencesFeatures.objects.create(user_preferences=prefs, feature=feature)
+
+        for relax in (('price', 'date', 'floor', 'distance'), ('roommates', 'features'), ('area',)):
+            settings.INVENTORY_INDEX_ENABLED = False
+            expected = set(filter_apartments(user.id, relax=relax).values_list('id', flat=True))
+            settings.INVENTORY_INDEX_ENABLED = True
+            with patch('apartments.utils.filtering.apply_price_filter') as sql_filter:
+                actual = set(filter_apartments(user.id, relax=relax).values_list('id', flat=True))
+
+            sql_filter.assert_not_called()
+            assert actual == expected, (case, relax)
+
+@pytest.mark.django_db
+def test_index_candidates_sent_as_one_array(inventory, settings, django_assert_num_queries):
+    """Test that index candidates reach SQL as one array value instead of an IN list"""
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    settings.INVENTORY_INDEX_ENABLED = True
+    inventory_index.ensure_current()
+    candidates = filter_apartments(user.id)
+
+    with django_assert_num_queries(1) as queries:
+        ids = set(candidates.values_list('id', flat=True))
+
+    assert ids == set(Apartment.objects.values_list('id', flat=True))
+    assert ' IN (' not in queries.captured_queries[0]['sql']
+    assert 'ANY(' in queries.captured_queries[0]['sql']
+
+@pytest.mark.django_db
+def test_index_follows_apartment_writes(inventory, django_capture_on_commit_callbacks):
+    """Test that signals keep a loaded index current without a reload"""
+    cities, features = inventory
+    inventory_index.load()
+    version = inventory_index.version
+    apartment = Apartment.objects.filter(city=cities[0]).first()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ApartmentFeature.objects.filter(apartment=apartment).delete()
+        ApartmentFeature.objects.create(apartment=apartment, feature=features[3])
+    index_ids = inventory_index.filter_ids(None, feature_ids=[features[3].id])
+    assert apartment.id in index_ids
+
+    with django_capture_on_commit_callbacks(execute=True):
+        apartment.delete()
+    assert apartment.id not in inventory_index.filter_ids(None)
+    assert len(inventory_index) == 59
+    assert inventory_index.version > version
+
+@pytest.mark.django_db
+def test_index_reloads_after_other_worker_write(inventory):
+    """Test that a version bump from elsewhere makes the index reload"""
+    index = InventoryIndex()
+    index.load()
+    Apartment.objects.first().delete()
+
+    bump_inventory_version()
+    index.ensure_current()
+
+    assert len(index) == 59
+
+@pytest.mark.django_db
+def test_match_counts_agree_with_orm_filters(inventory, settings):
+    """Test that draft preference counts equal the size of the SQL filter result"""
+    cities, features = inventory
+    settings.INVENTORY_INDEX_ENABLED = False
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    for apartment in Apartment.objects.filter(city=cities[0])[:20]:
+        apartment.latitude, apartment.longitude = '31.25', '34.79'
+        apartment.save()
+    index = InventoryIndex()
+    index.load()
+
+    cases = [case for case in _preference_cases(cities, features) if case]
+    cases.append({'city': cities[0], 'latitude': '31.25', 'longitude': '34.795', 'max_distance_km': 1})
+    for case in cases:
+        UserPreferences.objects.filter(user=user).delete()
+        prefs = UserPreferences.objects.create(user=user, **{k: v for k, v in case.items() if k != 'features'})
+        feature_ids = [feature.id for feature in case.get('features', [])]
+        for feature_id in feature_ids:
+            UserPreferencesFeatures.objects.create(user_preferences=prefs, feature_id=feature_id)
+
+        count, city_total = index.count_matches(prefs, feature_ids)
+
+        assert count == filter_apartments(user.id).count(), case
+        assert city_total == Apartment.objects.filter(city=case['city']).count()
+
+@pytest.mark.django_db
+def test_match_count_endpoint(inventory, api_client, django_assert_num_queries):
+    """Test that the endpoint counts draft preferences, without database queries once the index is warm"""
+    cities, features = inventory
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(user)}')
+    url = reverse('apartment-match-count')
+    params = {'city': cities[1].id, 'max_price': 2500, 'number_of_roommates': '1,3', 'features': str(features[0].id)}
+
+    response = api_client.get(url, params)
+    # Counting itself only reads the warm index
+    draft = UserPreferences(city=cities[1], max_price=2500)
+    with django_assert_num_queries(0):
+        count_matching_apartments(draft)
+
+    expected = Apartment.objects.filter(
+        city=cities[1], total_price__lte=2500, number_of_rooms__gte=2, apartment_features__feature=features[0]
+    ).count()
+    assert response.status_code == 200
+    assert response.data == {'count': expected, 'city_total': Apartment.objects.filter(city=cities[1]).count()}
+
+    assert api_client.get(url, {'max_price': 2500}).status_code == 400
+    assert api_client.get(url, {'city': cities[1].id, 'max_floor': 'high'}).status_code == 400
+    assert api_client.get(url, {'city': cities[1].id, 'min_price': 3000, 'max_price': 2000}).status_code == 400
+
+@pytest.mark.django_db
+def test_facet_counts_agree_with_orm(inventory):
+    """Test that each facet is counted with every filter except its own"""
+    cities, features = inventory
+    index = InventoryIndex()
+    index.load()
+    draft = UserPreferences(city=cities[0], max_price=3000, number_of_roommates=[2])
+    edges = (0, 2000, 3000)
+
+    counts = index.facet_counts(draft, [features[1].id], edges)
+
+    base = Apartment.objects.filter(apartment_features__feature=features[1])
+    matching = base.filter(city=cities[0], total_price__lte=3000, number_of_rooms__gte=3)
+    assert counts['total'] == matching.count()
+    assert counts['city'] == {
+        city.id: base.filter(city=city, total_price__lte=3000, number_of_rooms__gte=3).count()
+        for city in cities
+        if base.filter(city=city, total_price__lte=3000, number_of_rooms__gte=3).exists()
+    }
+    without_price = base.filter(city=cities[0], number_of_rooms__gte=3)
+    assert counts['price'] == [
+        without_price.filter(total_price__lt=2000).count(),
+        without_price.filter(total_price__gte=2000, total_price__lt=3000).count(),
+        without_price.filter(total_price__gte=3000).count(),
+    ]
+    without_rooms = base.filter(city=cities[0], total_price__lte=3000)
+    assert sum(counts['rooms'].values()) == without_rooms.count()
+    assert counts['feature'][features[1].id] == counts['total']
+    for feature in features:
+        assert counts['feature'].get(feature.id, 0) == matching.filter(
+            id__in=ApartmentFeature.objects.filter(feature=feature).values('apartment_id')
+        ).count()
+
+@pytest.mark.django_db
+def test_facets_endpoint_cached_by_inventory_version(inventory, api_client, django_capture_on_commit_callbacks):
+    """Test that facets are served from cache with an ETag until the inventory changes"""
+    cities, features = inventory
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(user)}')
+    url = reverse('apartment-facets')
+
+    first = api_client.get(url, {'max_price': 2500, 'features': f'{features[0].id}'})
+    assert first.status_code == 200
+    assert first.data['total'] == Apartment.objects.filter(
+        total_price__lte=2500, apartment_features__feature=features[0]
+    ).count()
+    assert {row['name'] for row in first.data['cities']} <= {'Beer Sheva', 'Tel Aviv'}
+    assert sum(bucket['count'] for bucket in first.data['price_buckets']) == Apartment.objects.filter(
+        apartment_features__feature=features[0]
+    ).count()
+
+    with patch('apartments.utils.facets.compute_facets') as compute:
+        cached = api_client.get(url, {'features': f'{features[0].id}', 'max_price': 2500})
+        not_modified = api_client.get(
+            url, {'max_price': 2500, 'features': f'{features[0].id}'}, HTTP_IF_NONE_MATCH=first['ETag']
+        )
+    compute.assert_not_called()
+    assert cached.data == first.data
+    assert not_modified.status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Apartment.objects.filter(apartment_features__feature=features[0], total_price__lte=2500).first().delete()
+    changed = api_client.get(url, {'max_price': 2500, 'features': f'{features[0].id}'})
+    assert changed['ETag'] != first['ETag']
+    assert changed.data['total'] == first.data['total'] - 1
+
+    assert api_client.get(url, {'max_floor': 'top'}).status_code == 400
+
+@pytest.mark.django_db
+def test_unknown_filter_values_add_no_bitmaps(inventory):
+    """Test that counting with values no apartment has leaves the index unchanged"""
+    cities, features = inventory
+    index = InventoryIndex()
+    index.load()
+    sizes = {name: len(bitmaps) for name, bitmaps in index._bitmaps.items()}
+
+    for prefix in ('R', 'Ra', 'Ram'):
+        draft = UserPreferences(city_id=uuid.uuid4(), area=prefix)
+        assert index.count_matches(draft, [uuid.uuid4()]) == (0, 0)
+        index.facet_counts(draft, [uuid.uuid4()], (0, 2000))
+
+    assert {name: len(bitmaps) for name, bitmaps in index._bitmaps.items()} == sizes
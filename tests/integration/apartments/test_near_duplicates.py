@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from apartments.models import Apartment, ApartmentTextSignature, City
+from apartments.utils.near_duplicates import flag_duplicate
+
+DESCRIPTION = (
+    "Bright four room apartment on a quiet street, two minutes from the campus "
+    "gate, with a sunny balcony, new air conditioners and a storage room."
+)
+
+
+@pytest.fixture
+def make_apartment():
+    """Fixture that creates apartments with a given description"""
+    city = City.objects.create(name='Beer Sheva', hebrew_name='באר שבע')
+    owner = User.objects.create_user(username='owner', email='owner@example.com', password='testpass123')
+
+    def make(about):
+        return Apartment.objects.create(
+            user=owner,
+            city=city,
+            street='Rager',
+            type='Apartment',
+            floor=1,
+            number_of_rooms=4,
+            number_of_available_rooms=1,
+            total_price=3000,
+            available_entry_date=date.today() + timedelta(days=30),
+            about=about,
+        )
+    return make
+
+
+@pytest.mark.django_db
+def test_signature_stored_on_save(make_apartment):
+    """Test that saving an apartment stores or clears its description signature"""
+    apartment = make_apartment(DESCRIPTION)
+    assert ApartmentTextSignature.objects.filter(apartment=apartment).exists()
+
+    apartment.about = 'Nice place'
+    apartment.save()
+    assert not ApartmentTextSignature.objects.filter(apartment=apartment).exists()
+
+@pytest.mark.django_db
+def test_flag_duplicate_points_at_original(make_apartment):
+    """Test that reposts are flagged against the earliest listing"""
+    original = make_apartment(DESCRIPTION)
+    make_apartment('Tiny studio downtown above a bakery, furnished, internet included, for one student.')
+    repost = make_apartment(DESCRIPTION + ' Available now.')
+    second_repost = make_apartment(DESCRIPTION)
+
+    assert flag_duplicate(repost) == original
+    assert flag_duplicate(second_repost) == original
+    assert Apartment.objects.get(id=repost.id).duplicate_of_id == original.id
+    assert flag_duplicate(original) is None
+
+@pytest.mark.django_db
+def test_find_duplicate_apartments_command(make_apartment):
+    """Test that the command clusters reposts and marks them"""
+    original = make_apartment(DESCRIPTION)
+    repost = make_apartment(DESCRIPTION.replace('quiet', 'calm'))
+    unique = make_apartment('Tiny studio downtown above a bakery, furnished, internet included, for one student.')
+    ApartmentTextSignature.objects.all().delete()
+
+    call_command('find_duplicate_apartments', '--mark', '--store-signatures', '--threshold', '0.6')
+
+    assert Apartment.objects.get(id=repost.id).duplicate_of_id == original.id
+    assert Apartment.objects.get(id=unique.id).duplicate_of_id is None
+    assert ApartmentTextSignature.objects.count() == 3
@@ -0,0 +1,102 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from apartments.management.commands.precompute_recommendations import shard_users
+from apartments.models import Apartment, City, RecommendationFeed
+from users.models import Question, QuestionnaireTemplate, UserResponse
+
+
+@pytest.fixture
+def users(db):
+    """Fixture with five users, each owning one apartment"""
+    template = QuestionnaireTemplate.objects.create(title='Lifestyle')
+    question = Question.objects.create(questionnaire=template, title='Cleanliness', question_type='radio', order=1)
+    city = City.objects.create(name='Beer Sheva', hebrew_name='באר שבע')
+    created = []
+    for i in range(5):
+        user = User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='testpass123')
+        UserResponse.objects.create(user=user, question=question, numeric_response=i + 1)
+        Apartment.objects.create(
+            user=user, city=city, street='Rager', type='Apartment', floor=1, number_of_rooms=3,
+            number_of_available_rooms=1, total_price=2000 + i,
+            available_entry_date=date.today() + timedelta(days=30),
+        )
+        created.append(user)
+    return created
+
+
+def test_shard_users():
+    """Test that shards keep order and cover every user once"""
+    assert shard_users([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert shard_users([], 2) == []
+
+@pytest.mark.django_db
+def test_precompute_builds_feeds_and_clears_checkpoint(users, tmp_path):
+    """Test that every user gets a full feed and a finished run leaves no checkpoint"""
+    checkpoint = tmp_path / 'run.checkpoint'
+
+    call_command('precompute_recommendations', workers=1, shard_size=2, checkpoint=str(checkpoint), verbosity=0)
+
+    feeds = RecommendationFeed.objects.all()
+    assert feeds.count() == 5
+    # Nobody has swiped yet, so every feed holds all five apartments
+    assert all(len(feed.apartment_ids) == 5 for feed in feeds)
+    assert not checkpoint.exists()
+
+@pytest.mark.django_db
+def test_precompute_users_filter(users, tmp_path):
+    """Test that --users limits the run to the given users"""
+    call_command(
+        'precompute_recommendations', users=[users[0].id, users[3].id], workers=1,
+        checkpoint=str(tmp_path / 'run.checkpoint'), verbosity=0,
+    )
+
+    assert set(RecommendationFeed.objects.values_list('user_id', flat=True)) == {users[0].id, users[3].id}
+
+@pytest.mark.django_db
+def test_precompute_resume_skips_finished_users(users, tmp_path):
+    """Test that --resume only builds feeds missing from the interrupted run"""
+    checkpoint = tmp_path / 'run.checkpoint'
+    started_at = timezone.now() - timedelta(minutes=5)
+    checkpoint.write_text(json.dumps({'started_at': started_at.isoformat()}))
+
+    finished = RecommendationFeed.objects.create(user=users[0], apartment_ids=[], scores=[])
+    outdated = RecommendationFeed.objects.create(user=users[1], apartment_ids=[], scores=[])
+    RecommendationFeed.objects.filter(id=outdated.id).update(updated_at=started_at - timedelta(hours=1))
+
+    call_command('precompute_recommendations', workers=1, resume=True, checkpoint=str(checkpoint), verbosity=0)
+
+    finished.refresh_from_db()
+    assert finished.apartment_ids == []
+    assert RecommendationFeed.objects.get(user=users[1]).apartment_ids != []
+    assert RecommendationFeed.objects.count() == 5
+    assert not checkpoint.exists()
+
+@pytest.mark.django_db
+def test_precompute_resume_requires_checkpoint(users, tmp_path):
+    """Test that resuming without a recorded run is an error"""
+    with pytest.raises(CommandError):
+        call_command(
+            'precompute_recommendations', workers=1, resume=True,
+            checkpoint=str(tmp_path / 'missing.checkpoint'), verbosity=0,
+        )
+
+@pytest.mark.django_db(transaction=True)
+def test_precompute_in_worker_processes(users, tmp_path):
+    """Test that worker processes build the same feeds as an in-process run"""
+    call_command(
+        'precompute_recommendations', workers=2, shard_size=2,
+        checkpoint=str(tmp_path / 'run.checkpoint'), verbosity=0,
+    )
+    parallel = {feed.user_id: feed.apartment_ids for feed in RecommendationFeed.objects.all()}
+
+    call_command('precompute_recommendations', workers=1, checkpoint=str(tmp_path / 'run.checkpoint'), verbosity=0)
+    serial = {feed.user_id: feed.apartment_ids for feed in RecommendationFeed.objects.all()}
+
+    assert len(parallel) == 5
+    assert parallel == serial
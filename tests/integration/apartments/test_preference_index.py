@@ -0,0 +1,250 @@
+import random
+from datetime import date, timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.urls import reverse
+from firebase_admin import messaging
+
+from apartments.models import Apartment, ApartmentFeature, City, Feature
+from apartments.utils.background import wait_for_background_tasks
+from apartments.utils.filtering import filter_apartments
+from apartments.utils.preference_index import PreferenceIndex, find_interested_users, preference_index
+from appartners.utils import generate_jwt
+from users.models import DeviceToken, UserPreferences, UserPreferencesFeatures
+from users.services.firebase_service import FirebaseService
+
+
+@pytest.fixture
+def cities(db):
+    return [
+        City.objects.create(name='Beer Sheva', hebrew_name='באר שבע'),
+        City.objects.create(name='Tel Aviv', hebrew_name='תל אביב'),
+    ]
+
+
+@pytest.fixture
+def owner(db):
+    return User.objects.create_user(username='owner', email='owner@example.com', password='testpass123')
+
+
+@pytest.fixture
+def background_tasks():
+    """Fixture that lets background tasks started by committed writes finish before the database is flushed"""
+    yield
+    wait_for_background_tasks()
+
+
+def _create_apartment(owner, city, features=(), **fields):
+    values = {
+        'street': 'Rager', 'type': 'Apartment', 'floor': 2, 'number_of_rooms': 3,
+        'number_of_available_rooms': 1, 'total_price': 2500,
+        'available_entry_date': date.today() + timedelta(days=10),
+    }
+    values.update(fields)
+    apartment = Apartment.objects.create(user=owner, city=city, **values)
+    for feature in features:
+        ApartmentFeature.objects.create(apartment=apartment, feature=feature)
+    return apartment
+
+
+@pytest.mark.django_db
+def test_matches_agree_with_preference_filters(cities, owner, settings):
+    """Test that the users found for a listing are those whose filters return it"""
+    rng = random.Random(13)
+    settings.INVENTORY_INDEX_ENABLED = False
+    features = [Feature.objects.create(name=f'Feature {i}') for i in range(3)]
+
+    searchers = []
+    for i in range(40):
+        user = User.objects.create_user(username=f'searcher{i}', email=f'searcher{i}@example.com', password='x')
+        min_price = rng.choice([None, 1500, 2000, 2500])
+        prefs = UserPreferences.objects.create(
+            user=user,
+            city=rng.choice(cities),
+            min_price=min_price,
+            max_price=rng.choice([None, 3000, 3500]) if min_price else rng.choice([None, 2000, 3000]),
+            max_floor=rng.choice([None, 2, 5]),
+            number_of_roommates=rng.choice([[], [1], [2, 3]]),
+            area=rng.choice([None, '', 'Ramot']),
+            move_in_date=rng.choice([None, date.today() + timedelta(days=rng.randint(5, 60))]),
+        )
+        for feature in rng.sample(features, rng.choice([0, 0, 1, 2])):
+            UserPreferencesFeatures.objects.create(user_preferences=prefs, feature=feature)
+        searchers.append(user.id)
+
+    for _ in range(15):
+        apartment = _create_apartment(
+            owner, rng.choice(cities), rng.sample(features, rng.randint(0, 3)),
+            floor=rng.randint(1, 6), number_of_rooms=rng.randint(1, 5),
+            total_price=rng.choice([1500, 2000, 2500, 3000, 3500]),
+            available_entry_date=date.today() + timedelta(days=rng.randint(1, 60)),
+            area=rng.choice([None, 'Ramot', 'Old City']),
+        )
+        expected = {
+            user_id for user_id in searchers
+            if filter_apartments(user_id, exclude_interacted=False).filter(id=apartment.id).exists()
+        }
+        assert set(find_interested_users(apartment)) == expected
+
+@pytest.mark.django_db
+def test_distance_preference(cities, owner):
+    """Test that listings outside a user's radius don't match"""
+    searcher = User.objects.create_user(username='searcher', email='searcher@example.com', password='x')
+    UserPreferences.objects.create(
+        user=searcher, city=cities[0], latitude='31.25', longitude='34.79', max_distance_km=2,
+    )
+
+    near = _create_apartment(owner, cities[0], latitude='31.255', longitude='34.795')
+    far = _create_apartment(owner, cities[0], latitude='31.4', longitude='34.79')
+    unknown = _create_apartment(owner, cities[0])
+
+    assert find_interested_users(near) == [searcher.id]
+    assert find_interested_users(far) == []
+    assert find_interested_users(unknown) == []
+
+@pytest.mark.django_db
+def test_preference_write_updates_loaded_index(cities, owner, django_capture_on_commit_callbacks):
+    """Test that a preferences write is applied in place instead of reloading"""
+    searcher = User.objects.create_user(username='searcher', email='searcher@example.com', password='x')
+    apartment = _create_apartment(owner, cities[0])
+    index = preference_index
+    index.ensure_current()
+    loaded_version = index.version
+
+    with django_capture_on_commit_callbacks(execute=True):
+        UserPreferences.objects.create(user=searcher, city=cities[0], max_price=3000)
+
+    assert index.version == loaded_version + 1
+    assert index.match(apartment, []) == [searcher.id]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        UserPreferences.objects.filter(user=searcher).update(max_price=2000)
+        UserPreferences.objects.get(user=searcher).save()
+
+    assert index.match(apartment, []) == []
+
+@pytest.mark.django_db(transaction=True)
+def test_preferences_view_indexes_required_features(cities, owner, api_client, background_tasks):
+    """Test that features saved through the preferences API reach the loaded index"""
+    parking = Feature.objects.create(name='Parking')
+    searcher = User.objects.create_user(username='searcher', email='searcher@example.com', password='x')
+    preference_index.ensure_current()
+    listing = Apartment(
+        user=owner, city=cities[0], floor=2, number_of_rooms=3, total_price=2500,
+        available_entry_date=date.today() + timedelta(days=10),
+    )
+
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(searcher)}')
+    response = api_client.post(
+        reverse('user-preferences'), {'city': str(cities[0].id), 'features': [str(parking.id)]}, format='json'
+    )
+
+    assert response.status_code == 200
+    preference_index.ensure_current()
+    assert preference_index._entries[searcher.id].feature_ids == frozenset([parking.id])
+    assert preference_index.match(listing, []) == []
+    assert preference_index.match(listing, [parking.id]) == [searcher.id]
+
+@pytest.mark.django_db
+def test_index_rebuilds_only_changed_cities(cities):
+    """Test that a write outdates only its own city's tree"""
+    searchers = [
+        User.objects.create_user(username=f'searcher{i}', email=f'searcher{i}@example.com', password='x')
+        for i in range(2)
+    ]
+    for searcher, city in zip(searchers, cities):
+        UserPreferences.objects.create(user=searcher, city=city)
+    index = PreferenceIndex()
+    index.load()
+    trees = [index._tree(city.id) for city in cities]
+
+    UserPreferences.objects.filter(user=searchers[0]).update(max_price=1000)
+    index.refresh_user(searchers[0].id)
+
+    assert index._tree(cities[1].id) is trees[1]
+    assert index._tree(cities[0].id) is not trees[0]
+
+def _run_on_commit(func, *args, key=None):
+    transaction.on_commit(lambda: func(*args))
+
+
+@pytest.mark.django_db
+def test_new_listing_outdates_only_matching_recommendations(cities, owner, api_client, django_capture_on_commit_callbacks):
+    """Test that a new listing changes the ETag of matching and unfiltered users only and alerts the matching ones"""
+    matching = User.objects.create_user(username='matching', email='matching@example.com', password='x')
+    other = User.objects.create_user(username='other', email='other@example.com', password='x')
+    unfiltered = User.objects.create_user(username='unfiltered', email='unfiltered@example.com', password='x')
+    UserPreferences.objects.create(user=matching, city=cities[0], max_price=3000)
+    UserPreferences.objects.create(user=other, city=cities[1])
+
+    url = reverse('apartment-recommendations')
+
+    def etag(user):
+        api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(user)}')
+        return api_client.get(url, {'limit': 5})['ETag']
+
+    before = {user.id: etag(user) for user in (matching, other, unfiltered)}
+    with patch('apartments.utils.preference_index.run_in_background', _run_on_commit), \
+            patch.object(FirebaseService, 'send_new_listing_notification') as notify:
+        with django_capture_on_commit_callbacks(execute=True):
+            apartment = _create_apartment(owner, cities[0])
+
+    assert etag(matching) != before[matching.id]
+    assert etag(unfiltered) != before[unfiltered.id]
+    assert etag(other) == before[other.id]
+    notify.assert_called_once()
+    assert notify.call_args.args[0] == [matching.id]
+    assert notify.call_args.args[1].id == apartment.id
+
+@pytest.mark.django_db(transaction=True)
+def test_listing_created_through_the_api_is_announced_with_its_features(cities, api_client, background_tasks):
+    """Test that the announcement sees the features saved with a listing"""
+    parking = Feature.objects.create(name='Parking')
+    searcher = User.objects.create_user(username='searcher', email='searcher@example.com', password='x')
+    prefs = UserPreferences.objects.create(user=searcher, city=cities[0])
+    UserPreferencesFeatures.objects.create(user_preferences=prefs, feature=parking)
+    lister = User.objects.create_user(username='lister', email='lister@example.com', password='x')
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(lister)}')
+
+    with patch('apartments.utils.preference_index.run_in_background', _run_on_commit), \
+            patch.object(FirebaseService, 'send_new_listing_notification') as notify:
+        response = api_client.post(reverse('apartment-create'), {
+            'city': str(cities[0].id), 'street': 'Rager', 'type': 'Apartment', 'floor': 2,
+            'number_of_rooms': 3, 'number_of_available_rooms': 1, 'total_price': 2500,
+            'available_entry_date': (date.today() + timedelta(days=10)).isoformat(),
+            'features': [str(parking.id)],
+            'photos': SimpleUploadedFile('photo.jpg', b'', content_type='image/jpeg'),
+        })
+
+    assert response.status_code == 201
+    notify.assert_called_once()
+    assert notify.call_args.args[0] == [searcher.id]
+
+@pytest.mark.django_db
+def test_multicast_batches_and_deactivates_unregistered_tokens(owner):
+    """Test that alerts go out in batches and unregistered tokens are switched off"""
+    users = [
+        User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='x') for i in range(3)
+    ]
+    for i, user in enumerate(users):
+        DeviceToken.objects.create(user=user, token=f'token-{i}', device_type='android')
+
+    def send(message):
+        results = [
+            Mock(success=token != 'token-1',
+                 exception=messaging.UnregisteredError('gone') if token == 'token-1' else None)
+            for token in message.tokens
+        ]
+        return Mock(success_count=sum(result.success for result in results), responses=results)
+
+    with patch('users.services.firebase_service.MULTICAST_BATCH_SIZE', 2):
+        with patch('users.services.firebase_service.messaging.send_each_for_multicast', side_effect=send) as sender:
+            delivered = FirebaseService.send_multicast_notification([user.id for user in users], 'Title', 'Body')
+
+    assert sender.call_count == 2
+    assert delivered == 2
+    assert list(DeviceToken.objects.filter(is_active=False).values_list('token', flat=True)) == ['token-1']
@@ -0,0 +1,444 @@
+import datetime
+import random
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import jwt
+import pytest
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apartments.models import Apartment, ApartmentFeature, ApartmentUserLike, City, Feature, RecommendationFeed
+from apartments.utils.compatibility_cache import get_compatibility_scores
+from apartments.utils.filtering import best_relaxation, count_relaxed_matches, filter_apartments
+from apartments.utils.recommendation import (
+    get_recommended_apartments,
+    get_top_apartments,
+    rank_apartments_by_compatibility,
+    select_top_apartments,
+)
+from apartments.utils.recommendation_cache import bump_answers_version
+from apartments.utils.recommendation_feed import build_recommendation_feed, drop_from_feed, get_feed_page
+from apartments.utils.seen_apartments import (
+    SEEN_CACHE_KEY,
+    SEEN_COMPACT_AFTER_UPDATES,
+    SEEN_GENERATION_CACHE_KEY,
+    get_seen_apartments,
+    mark_apartment_seen,
+)
+from users.models import Question, QuestionnaireTemplate, UserDetails, UserPreferences, UserResponse
+from users.serializers.questionnaire import UserResponseBulkSerializer
+
+
+@pytest.fixture
+def recommendation_data():
+    """Fixture with a searcher and owners whose answers spread scores out"""
+    rng = random.Random(7)
+    template = QuestionnaireTemplate.objects.create(title='Lifestyle')
+    questions = [
+        Question.objects.create(questionnaire=template, title=f'Question {i}', question_type='radio', order=i)
+        for i in range(4)
+    ]
+    city = City.objects.create(name='Beer Sheva', hebrew_name='באר שבע')
+
+    def make_user(name):
+        user = User.objects.create_user(username=name, email=f'{name}@example.com', password='testpass123')
+        for question in questions:
+            UserResponse.objects.create(user=user, question=question, numeric_response=rng.randint(1, 5))
+        return user
+
+    searcher = make_user('searcher')
+    for i in range(25):
+        owner = make_user(f'owner{i}')
+        Apartment.objects.create(
+            user=owner,
+            city=city,
+            street='Rager',
+            type='Apartment',
+            floor=1,
+            number_of_rooms=3,
+            number_of_available_rooms=1,
+            total_price=2000 + i,
+            available_entry_date=date.today() + timedelta(days=30),
+        )
+    return searcher
+
+
+@pytest.fixture
+def searcher_client(recommendation_data, api_client):
+    """Fixture that returns an API client authenticated as the searcher"""
+    token = jwt.encode(
+        {'user_id': recommendation_data.id, 'exp': datetime.datetime.utcnow() + timedelta(minutes=10)},
+        settings.SECRET_KEY, algorithm='HS256'
+    )
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return api_client
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('chunk_size', [1, 4, 1000])
+def test_select_top_apartments_matches_full_ranking(recommendation_data, chunk_size):
+    """Test that streaming top-K returns the same winners as a full sort"""
+    user_id = recommendation_data.id
+    expected = rank_apartments_by_compatibility(list(filter_apartments(user_id)), user_id, 5)
+
+    top = select_top_apartments(filter_apartments(user_id), user_id, 5, chunk_size=chunk_size)
+
+    assert len(top) == 5
+    assert [(apartment.id, score) for apartment, score in expected] == top
+
+@pytest.mark.django_db
+def test_get_recommended_apartments_limit(recommendation_data):
+    """Test that recommendations are limited and ordered by score"""
+    apartments, scores = get_recommended_apartments(recommendation_data.id, limit=3)
+
+    assert len(list(apartments)) == 3
+    assert scores == sorted(scores, reverse=True)
+
+@pytest.mark.django_db
+def test_get_recommended_apartments_empty(recommendation_data):
+    """Test that a user with every apartment excluded gets nothing"""
+    Apartment.objects.all().delete()
+    apartments, scores = get_recommended_apartments(recommendation_data.id)
+
+    assert apartments == []
+    assert scores == []
+
+@pytest.mark.django_db
+def test_feed_page_matches_live_recommendations(recommendation_data):
+    """Test that a fresh feed serves the same page as live ranking"""
+    user_id = recommendation_data.id
+    build_recommendation_feed(user_id)
+
+    apartments, scores = get_feed_page(user_id, 5)
+    expected_apartments, expected_scores = get_recommended_apartments(user_id, 5)
+
+    assert [a.id for a in apartments] == [a.id for a in expected_apartments]
+    assert scores == expected_scores
+
+@pytest.mark.django_db
+def test_feed_page_skips_swiped_apartments(recommendation_data, django_capture_on_commit_callbacks):
+    """Test that apartments swiped after the feed was built are not served"""
+    user_id = recommendation_data.id
+    build_recommendation_feed(user_id)
+    first, _ = get_feed_page(user_id, 2)
+    first = list(first)
+    with django_capture_on_commit_callbacks(execute=True):
+        ApartmentUserLike.objects.create(user_id=user_id, apartment=first[0], like=False)
+
+    apartments, _ = get_feed_page(user_id, 2)
+
+    assert [a.id for a in apartments][0] == first[1].id
+
+@pytest.mark.django_db
+def test_swipe_drops_apartment_from_feed(recommendation_data, searcher_client):
+    """Test that a swipe removes the apartment from the feed instead of rebuilding it"""
+    user_id = recommendation_data.id
+    feed = build_recommendation_feed(user_id)
+    swiped = feed.apartment_ids[1]
+
+    with patch('apartments.utils.recommendation_feed.run_in_background') as background:
+        response = searcher_client.post(reverse('apartment-like'), {'apartment_id': swiped, 'like': False})
+
+    assert response.status_code in (200, 201)
+    background.assert_not_called()
+    updated = RecommendationFeed.objects.get(user_id=user_id)
+    assert updated.apartment_ids == feed.apartment_ids[:1] + feed.apartment_ids[2:]
+    assert updated.scores == feed.scores[:1] + feed.scores[2:]
+    assert updated.updated_at == feed.updated_at
+
+@pytest.mark.django_db
+def test_feed_with_every_match_serves_short_pages(recommendation_data):
+    """Test that a feed holding every match keeps serving after drops, while a cut one falls back"""
+    user_id = recommendation_data.id
+    feed = build_recommendation_feed(user_id)
+    for apartment_id in feed.apartment_ids[:3]:
+        drop_from_feed(user_id, apartment_id)
+
+    apartments, _ = get_feed_page(user_id, 100)
+    assert [str(a.id) for a in apartments] == feed.apartment_ids[3:]
+
+    build_recommendation_feed(user_id, size=len(feed.apartment_ids) - 1)
+    assert get_feed_page(user_id, 100) is None
+
+@pytest.mark.django_db
+def test_feed_marked_stale_by_new_apartment(recommendation_data):
+    """Test that a new listing in the user's city invalidates their feed, to be rebuilt lazily"""
+    user_id = recommendation_data.id
+    build_recommendation_feed(user_id)
+    owner = User.objects.get(username='owner0')
+
+    with patch('apartments.utils.recommendation_feed.run_in_background') as background:
+        Apartment.objects.create(
+            user=owner,
+            city=City.objects.get(name='Beer Sheva'),
+            street='Rager',
+            type='Apartment',
+            floor=1,
+            number_of_rooms=3,
+            number_of_available_rooms=1,
+            total_price=1500,
+            available_entry_date=date.today() + timedelta(days=30),
+        )
+
+    background.assert_not_called()
+    assert RecommendationFeed.objects.get(user_id=user_id).is_stale
+    assert get_feed_page(user_id, 5) is None
+
+@pytest.mark.django_db
+def test_top_apartments_skip_seen(recommendation_data, django_capture_on_commit_callbacks):
+    """Test that swiped apartments are skipped even when they fill the first page"""
+    user_id = recommendation_data.id
+    best = get_top_apartments(user_id, 6)
+    with django_capture_on_commit_callbacks(execute=True):
+        for apartment_id, _ in best[:4]:
+            ApartmentUserLike.objects.create(user_id=user_id, apartment_id=apartment_id, like=True)
+
+    top = get_top_apartments(user_id, 2)
+
+    assert top == best[4:6]
+
+@pytest.mark.django_db
+def test_seen_set_compacts_after_many_updates(recommendation_data, django_capture_on_commit_callbacks):
+    """Test that a heavily updated seen-set is rebuilt from the database"""
+    user_id = recommendation_data.id
+    get_seen_apartments(user_id)
+    key = SEEN_CACHE_KEY.format(user_id=user_id)
+    entry = cache.get(key)
+    cache.set(key, dict(entry, updates=SEEN_COMPACT_AFTER_UPDATES))
+
+    apartment = Apartment.objects.first()
+    with django_capture_on_commit_callbacks(execute=True):
+        ApartmentUserLike.objects.create(user_id=user_id, apartment=apartment, like=False)
+
+    assert cache.get(key) is None
+    assert apartment.id in get_seen_apartments(user_id)
+    assert cache.get(key)['updates'] == 0
+
+@pytest.mark.django_db
+def test_concurrent_swipes_are_not_lost(recommendation_data):
+    """Test that a swipe racing another one drops the seen-set instead of overwriting it"""
+    user_id = recommendation_data.id
+    first, second = Apartment.objects.all()[:2]
+    get_seen_apartments(user_id)
+    key = SEEN_CACHE_KEY.format(user_id=user_id)
+    stale = cache.get(key)
+
+    ApartmentUserLike.objects.create(user_id=user_id, apartment=first, like=True)
+    ApartmentUserLike.objects.create(user_id=user_id, apartment=second, like=True)
+    mark_apartment_seen(user_id, first.id)
+    # The second swipe read the entry before the first one wrote it back
+    cache.set(key, stale)
+    mark_apartment_seen(user_id, second.id)
+
+    assert cache.get(key) is None
+    seen = get_seen_apartments(user_id)
+    assert first.id in seen and second.id in seen
+
+    # A write that lost the race to a newer generation is never served
+    cache.set(key, stale)
+    assert cache.get(key)['generation'] != cache.get(SEEN_GENERATION_CACHE_KEY.format(user_id=user_id))
+    assert first.id in get_seen_apartments(user_id)
+
+@pytest.mark.django_db
+def test_recommendations_hydrated_in_ranked_order(recommendation_data):
+    """Test that hydrated winners keep the ranked order and carry their scores"""
+    user_id = recommendation_data.id
+    top = get_top_apartments(user_id, 5)
+
+    apartments, scores = get_recommended_apartments(user_id, 5)
+
+    assert [(a.id, a.compatibility_score) for a in apartments] == top
+    assert scores == [score for _, score in top]
+
+@pytest.mark.django_db
+def test_recommendation_view_query_count_independent_of_limit(recommendation_data, searcher_client):
+    """Test that the recommendations response runs the same number of queries for any limit"""
+    feature = Feature.objects.create(name='Balcony')
+    for i, apartment in enumerate(Apartment.objects.select_related('user')):
+        ApartmentFeature.objects.create(apartment=apartment, feature=feature)
+        UserDetails.objects.create(
+            user=apartment.user, first_name='Owner', last_name=str(i), gender='Other',
+            occupation='Student', birth_date=date(2000, 1, 1), preferred_city='beer sheva',
+            phone_number=f'050{i:07d}',
+        )
+    api_client = searcher_client
+    url = reverse('apartment-recommendations')
+    # Warm the per-user caches so both measured requests start from the same state
+    api_client.get(url, {'limit': 1})
+
+    query_counts = {}
+    for limit in (3, 10):
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url, {'limit': limit})
+        assert response.status_code == 200
+        apartments = response.json()['apartments']
+        assert len(apartments) == limit
+        assert apartments[0]['user_details']['preferred_city']['name'] == 'Beer Sheva'
+        assert apartments[0]['feature_details'][0]['name'] == 'Balcony'
+        assert len(apartments[0]['user_details']['questionnaire_responses']) == 4
+        query_counts[limit] = len(queries)
+
+    assert query_counts[3] == query_counts[10]
+    assert query_counts[10] <= 13
+
+@pytest.mark.django_db
+def test_recommendation_view_cached_until_versions_change(recommendation_data, searcher_client):
+    """Test that repeated requests are served from cache with a stable ETag"""
+    url = reverse('apartment-recommendations')
+    first = searcher_client.get(url, {'limit': 5})
+    etag = first['ETag']
+
+    with patch('apartments.views.recommendation_views.get_recommended_apartments') as ranked:
+        with patch('apartments.views.recommendation_views.get_feed_page') as feed:
+            cached = searcher_client.get(url, {'limit': 5})
+            not_modified = searcher_client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=etag)
+    ranked.assert_not_called()
+    feed.assert_not_called()
+
+    assert cached.json() == first.json()
+    assert cached['ETag'] == etag
+    assert not_modified.status_code == 304
+    assert searcher_client.get(url, {'limit': 6})['ETag'] != etag
+
+@pytest.mark.django_db
+def test_recommendation_etag_changes_on_relevant_writes(
+    recommendation_data, searcher_client, django_capture_on_commit_callbacks
+):
+    """Test that swipes, preferences, answers and inventory writes each change the ETag"""
+    url = reverse('apartment-recommendations')
+    apartment = Apartment.objects.first()
+    response = UserResponse.objects.filter(user=apartment.user).first()
+
+    def swipe():
+        with django_capture_on_commit_callbacks(execute=True):
+            ApartmentUserLike.objects.create(user=recommendation_data, apartment=apartment, like=True)
+
+    def set_preferences():
+        UserPreferences.objects.create(user=recommendation_data, city=apartment.city, max_floor=3)
+
+    def answer():
+        serializer = UserResponseBulkSerializer(
+            data={'responses': [
+                {'question': response.question_id, 'numeric_response': response.numeric_response % 5 + 1}
+            ]},
+            context={'user': apartment.user},
+        )
+        assert serializer.is_valid(), serializer.errors
+        with django_capture_on_commit_callbacks() as callbacks:
+            serializer.save()
+        # One bump per submission; the background refreshes don't matter here
+        assert callbacks.count(bump_answers_version) == 1
+        bump_answers_version()
+
+    def delist():
+        with django_capture_on_commit_callbacks(execute=True):
+            Apartment.objects.last().delete()
+
+    etags = [searcher_client.get(url, {'limit': 5})['ETag']]
+    for write in (swipe, set_preferences, answer, delist):
+        write()
+        etags.append(searcher_client.get(url, {'limit': 5})['ETag'])
+
+    assert len(set(etags)) == len(etags)
+
+@pytest.mark.django_db
+def test_recommendation_explain_for_staff(recommendation_data, searcher_client):
+    """Test that staff get per-stage timings and histograms while others get the plain response"""
+    url = reverse('apartment-recommendations')
+    plain = searcher_client.get(url, {'limit': 5, 'explain': 1})
+    assert 'explain' not in plain.json()
+    assert 'Server-Timing' not in plain
+
+    User.objects.filter(id=recommendation_data.id).update(is_staff=True)
+    # Explained requests bypass the cached body, so the pipeline runs again
+    response = searcher_client.get(url, {'limit': 5}, HTTP_X_EXPLAIN='1')
+
+    assert response.status_code == 200
+    assert len(response.json()['apartments']) == 5
+    stages = response.json()['explain']['stages']
+    for name in ('preferences', 'filter', 'scoring', 'hydration', 'serialization', 'total'):
+        assert name in stages
+    assert stages['total']['queries'] == sum(
+        stats['queries'] for name, stats in stages.items() if name != 'total'
+    )
+    assert stages['hydration']['queries'] >= 1
+    assert response.json()['explain']['histograms']['total']['count'] >= 1
+    assert 'serialization;dur=' in response['Server-Timing']
+
+@pytest.mark.django_db
+def test_relaxed_counts_in_one_aggregate_query(recommendation_data, django_assert_num_queries):
+    """Test that each dropped preference gets its own count from a single aggregate"""
+    city = City.objects.get()
+    UserPreferences.objects.create(
+        user=recommendation_data, city=city, max_price=2010, max_floor=0, move_in_date=date.today() + timedelta(days=1)
+    )
+
+    # Preferences, preference features and the aggregate itself
+    with django_assert_num_queries(3):
+        counts = count_relaxed_matches(recommendation_data.id)
+
+    # Prices run from 2000 to 2024, every apartment is on floor 1 and free in 30 days
+    assert counts == {'price': 0, 'date': 0, 'floor': 0}
+
+    UserPreferences.objects.filter(user=recommendation_data).update(move_in_date=None)
+    assert count_relaxed_matches(recommendation_data.id) == {'price': 0, 'floor': 11}
+
+@pytest.mark.django_db
+def test_empty_recommendations_fall_back_to_best_relaxation(recommendation_data, searcher_client):
+    """Test that an empty result returns the best relaxed result with every relaxation count"""
+    UserPreferences.objects.create(user=recommendation_data, city=City.objects.get(), max_price=1500, max_floor=3)
+
+    body = searcher_client.get(reverse('apartment-recommendations'), {'limit': 5}).json()
+
+    assert body['relaxed_preference'] == 'price'
+    assert body['relaxed_counts'] == {'price': 25, 'floor': 0}
+    assert len(body['apartments']) == 5
+    assert best_relaxation({'floor': 3, 'price': 3}) == 'floor'
+    assert best_relaxation({'floor': 0, 'price': 0}) is None
+
+@pytest.mark.django_db
+def test_soft_price_preference_ranks_near_misses_lower(recommendation_data, settings):
+    """Test that a soft price preference keeps slightly pricier apartments, ranked below cheaper ones"""
+    city = City.objects.get(name='Beer Sheva')
+    UserPreferences.objects.create(user=recommendation_data, city=city, max_price=2010)
+    assert len(get_top_apartments(recommendation_data.id, 30)) == 11
+
+    settings.RECOMMENDATION_SCORE_WEIGHTS = {'compatibility': 1.0, 'price': 4.0}
+    settings.RECOMMENDATION_SOFT_PREFERENCES = ['price']
+    ranked = get_top_apartments(recommendation_data.id, 30)
+    prices = dict(Apartment.objects.values_list('id', 'total_price'))
+
+    # All 25 apartments are within the wide prefilter of the 2010 budget
+    assert len(ranked) == 25
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+    assert all(0 <= score <= 1 for _, score in ranked)
+
+    # Ranked on price fit alone, cheaper apartments come first and near misses follow
+    settings.RECOMMENDATION_SCORE_WEIGHTS = {'compatibility': 0.0, 'price': 1.0}
+    ranked = get_top_apartments(recommendation_data.id, 30)
+    assert [prices[apartment_id] for apartment_id, _ in ranked] == sorted(prices.values())
+
+@pytest.mark.django_db
+def test_recommendation_view_reports_match_and_compatibility(recommendation_data, searcher_client, settings):
+    """Test that the blended ranking score isn't reported as compatibility with the owner"""
+    UserPreferences.objects.create(user=recommendation_data, city=City.objects.get(), max_price=2010)
+    settings.RECOMMENDATION_SCORE_WEIGHTS = {'compatibility': 1.0, 'price': 4.0}
+    settings.RECOMMENDATION_SOFT_PREFERENCES = ['price']
+
+    apartments = searcher_client.get(reverse('apartment-recommendations'), {'limit': 25}).json()['apartments']
+    owners = {str(apartment_id): owner_id for apartment_id, owner_id in Apartment.objects.values_list('id', 'user_id')}
+    compatibility = get_compatibility_scores(
+        recommendation_data.id, [owners[apartment['id']] for apartment in apartments]
+    )
+
+    assert [apartment['compatibility_score'] for apartment in apartments] == [
+        round(score * 100) for score in compatibility
+    ]
+    assert [apartment['match_score'] for apartment in apartments] != [
+        apartment['compatibility_score'] for apartment in apartments
+    ]
@@ -0,0 +1,202 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+from apartments.admin import ApartmentAdmin
+from apartments.models import Apartment, ApartmentFeature, City, Feature
+from apartments.utils.search import search_apartments
+from apartments.utils.text_search import filter_by_text, trigram_search_available
+from appartners.utils import generate_jwt
+from users.models import UserPreferences
+
+
+@pytest.fixture
+def listings():
+    """Fixture with many listings sharing prices and entry dates, so pages split ties"""
+    rng = random.Random(5)
+    cities = [
+        City.objects.create(name='Beer Sheva', hebrew_name='באר שבע'),
+        City.objects.create(name='Tel Aviv', hebrew_name='תל אביב'),
+    ]
+    features = [Feature.objects.create(name=f'Feature {i}') for i in range(3)]
+    owner = User.objects.create_user(username='owner', email='owner@example.com', password='testpass123')
+    for _ in range(45):
+        rooms = rng.randint(1, 5)
+        apartment = Apartment.objects.create(
+            user=owner,
+            city=rng.choice(cities),
+            street='Rager',
+            type='Apartment',
+            floor=rng.randint(1, 6),
+            number_of_rooms=rooms,
+            number_of_available_rooms=rng.randint(1, rooms),
+            total_price=rng.choice([1500, 2000, 2500]),
+            available_entry_date=date.today() + timedelta(days=rng.choice([10, 20, 30])),
+        )
+        for feature in rng.sample(features, rng.randint(0, 2)):
+            ApartmentFeature.objects.create(apartment=apartment, feature=feature)
+    return cities, features
+
+
+def _all_pages(draft, feature_ids, sort, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        apartments, cursor = search_apartments(draft, feature_ids, sort=sort, cursor=cursor, limit=limit)
+        ids.extend(apartment.id for apartment in apartments)
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('sort,ordering', [
+    ('price', ('total_price', 'id')),
+    ('-price', ('-total_price', '-id')),
+    ('entry_date', ('available_entry_date', 'id')),
+    ('-created_at', ('-created_at', '-id')),
+])
+def test_pages_follow_the_full_ordering(listings, sort, ordering):
+    """Test that walking the cursors visits every match once, in sort order"""
+    cities, features = listings
+    draft = UserPreferences(city=cities[0], max_price=2000)
+
+    ids, pages = _all_pages(draft, [], sort, limit=4)
+
+    expected = list(
+        Apartment.objects.filter(city=cities[0], total_price__lte=2000).order_by(*ordering).values_list('id', flat=True)
+    )
+    assert ids == expected
+    assert pages == max(1, -(-len(expected) // 4))
+
+
+@pytest.mark.django_db
+def test_search_applies_recommendation_filters(listings):
+    """Test that search filters like the recommendations do"""
+    cities, features = listings
+    draft = UserPreferences(number_of_roommates=[2], max_floor=4, move_in_date=date.today() + timedelta(days=20))
+
+    ids, _ = _all_pages(draft, [features[0].id], 'price', limit=10)
+
+    expected = Apartment.objects.filter(
+        number_of_rooms__gte=3,
+        floor__lte=4,
+        available_entry_date__lte=date.today() + timedelta(days=20),
+        apartment_features__feature=features[0],
+    )
+    assert sorted(ids) == sorted(expected.values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+def test_search_endpoint(listings, api_client):
+    """Test that the endpoint pages with cursors and rejects invalid parameters"""
+    cities, features = listings
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(user)}')
+    url = reverse('apartment-search')
+    params = {'city': cities[1].id, 'sort': '-price', 'limit': 5}
+
+    first = api_client.get(url, params)
+    second = api_client.get(url, {**params, 'cursor': first.data['next_cursor']})
+
+    expected = [str(apartment_id) for apartment_id in Apartment.objects.filter(
+        city=cities[1]
+    ).order_by('-total_price', '-id').values_list('id', flat=True)[:10]]
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert [apartment['id'] for apartment in first.data['apartments'] + second.data['apartments']] == expected
+
+    assert api_client.get(url, {'sort': 'floor'}).status_code == 400
+    assert api_client.get(url, {'cursor': 'not-a-cursor'}).status_code == 400
+    assert api_client.get(url, {'limit': 500}).status_code == 400
+    assert api_client.get(url, {'min_price': 3000, 'max_price': 2000}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_text_query_matches_street_area_and_description(listings):
+    """Test that the text query matches normalized Hebrew and English text"""
+    cities, features = listings
+    owner = User.objects.get(username='owner')
+    details = dict(
+        user=owner, city=cities[0], type='Apartment', floor=1, number_of_rooms=3,
+        number_of_available_rooms=2, total_price=2000, available_entry_date=date.today() + timedelta(days=5),
+    )
+    on_street = Apartment.objects.create(street='שְׁדֵרוֹת רגר', **details)
+    in_area = Apartment.objects.create(street='Yehuda Halevi', area='Ramot', **details)
+    described = Apartment.objects.create(street='Ringelblum', about='Renovated, close to Ben-Gurion University', **details)
+    draft = UserPreferences()
+
+    assert on_street.search_text == 'שדרות רגר'
+    assert [a.id for a in search_apartments(draft, [], text='שדרות')[0]] == [on_street.id]
+    assert [a.id for a in search_apartments(draft, [], text='ramot')[0]] == [in_area.id]
+    assert [a.id for a in search_apartments(draft, [], text='ben gurion university')[0]] == [described.id]
+
+    with pytest.raises(ValidationError):
+        search_apartments(draft, [], sort='relevance')
+
+
+@pytest.mark.django_db
+def test_text_query_pages_by_relevance(listings, api_client):
+    """Test that relevance-sorted pages cover every match once"""
+    cities, features = listings
+    Apartment.objects.filter(pk__in=list(Apartment.objects.values_list('pk', flat=True)[:7])).update(
+        search_text='רגר'
+    )
+    user = User.objects.create_user(username='searcher', email='searcher@example.com', password='testpass123')
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(user)}')
+    url = reverse('apartment-search')
+
+    ids, cursor = [], None
+    while True:
+        params = {'q': 'רגר', 'limit': 3, **({'cursor': cursor} if cursor else {})}
+        response = api_client.get(url, params)
+        assert response.status_code == 200
+        ids.extend(apartment['id'] for apartment in response.data['apartments'])
+        cursor = response.data['next_cursor']
+        if cursor is None:
+            break
+
+    expected = filter_by_text(Apartment.objects.all(), 'רגר').values_list('id', flat=True)
+    assert sorted(ids) == sorted(str(apartment_id) for apartment_id in expected)
+    assert len(ids) == len(set(ids)) >= 7
+    assert api_client.get(url, {'sort': '-relevance'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_text_query_ranks_closer_matches_first(listings):
+    """Test that trigram ranking puts exact words ahead of near misses"""
+    if not trigram_search_available():
+        pytest.skip("pg_trgm is not installed")
+    Apartment.objects.update(search_text='')
+    apartments = list(Apartment.objects.all()[:2])
+    apartments[0].search_text = 'רחוב הרצליה'
+    apartments[1].search_text = 'רחוב הרצל'
+    Apartment.objects.bulk_update(apartments, ['search_text'])
+
+    results, _ = search_apartments(UserPreferences(), [], text='הרצל')
+
+    assert [a.id for a in results][:2] == [apartments[1].id, apartments[0].id]
+
+
+@pytest.mark.django_db
+def test_admin_search_covers_text_city_and_type(listings):
+    """Test that the admin search matches the city and type alongside the trigram text search"""
+    if not trigram_search_available():
+        pytest.skip("pg_trgm is not installed")
+    cities, features = listings
+    Apartment.objects.update(search_text='')
+    apartment = Apartment.objects.filter(city=cities[0]).first()
+    Apartment.objects.filter(pk=apartment.pk).update(search_text='רחוב הרצל', type='Studio')
+    model_admin = ApartmentAdmin(Apartment, site)
+
+    def search(term):
+        results, _ = model_admin.get_search_results(None, Apartment.objects.all(), term)
+        return set(results.values_list('id', flat=True))
+
+    assert search('הרצל') == {apartment.id}
+    assert search('studio') == {apartment.id}
+    assert search('tel aviv') == set(Apartment.objects.filter(city=cities[1]).values_list('id', flat=True))
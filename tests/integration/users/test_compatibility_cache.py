@@ -0,0 +1,125 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth.models import User
+from faker import Faker
+
+from apartments.utils.answer_store import answer_store
+from apartments.utils.compatibility import score_many
+from apartments.utils.compatibility_cache import get_compatibility_scores, recompute_user_compatibility
+from users.models import UserResponse, Question, QuestionnaireTemplate, UserCompatibility
+from users.utils.questionnaire_schema import bump_schema_version
+
+fake = Faker()
+
+@pytest.mark.django_db
+class TestCompatibilityCacheIntegration(TestCase):
+    def setUp(self):
+        """Set up users with radio answers"""
+        answer_store.clear()
+        self.questionnaire = QuestionnaireTemplate.objects.create(title='Test Questionnaire')
+        self.questions = [
+            Question.objects.create(
+                questionnaire=self.questionnaire,
+                title=f'Question {i}',
+                question_type='radio',
+                order=i
+            )
+            for i in range(3)
+        ]
+        self.users = []
+        for answers in ([1, 2, 3], [1, 2, 4], [5, 5, 5]):
+            user = User.objects.create_user(username=fake.email(), email=fake.email(), password='testpass123')
+            for question, answer in zip(self.questions, answers):
+                UserResponse.objects.create(user=user, question=question, numeric_response=answer)
+            self.users.append(user)
+        self.ids = [user.id for user in self.users]
+
+    def test_scores_are_stored_and_reused(self):
+        """Test that the first read stores pairs and the second read uses them"""
+        expected = score_many(self.ids[0], self.ids[1:])
+        scores = get_compatibility_scores(self.ids[0], self.ids[1:])
+
+        self.assertEqual(list(scores), list(expected))
+        self.assertEqual(UserCompatibility.objects.count(), 2)
+
+        # Reads from the table don't need the questionnaire at all
+        answer_store.clear()
+        with self.assertNumQueries(2):
+            self.assertEqual(list(get_compatibility_scores(self.ids[0], self.ids[1:])), list(expected))
+
+    def test_pair_is_stored_once_in_order(self):
+        """Test that reads from both sides share one ordered row"""
+        get_compatibility_scores(self.ids[2], [self.ids[0]])
+        get_compatibility_scores(self.ids[0], [self.ids[2]])
+
+        row = UserCompatibility.objects.get()
+        self.assertEqual((row.user_a_id, row.user_b_id), (self.ids[0], self.ids[2]))
+
+    def test_stale_rows_are_recomputed(self):
+        """Test that changed responses invalidate stored pairs"""
+        get_compatibility_scores(self.ids[0], [self.ids[1]])
+        before = UserCompatibility.objects.get().score
+
+        response = UserResponse.objects.get(user=self.users[1], question=self.questions[2])
+        response.numeric_response = 3
+        response.save()
+        answer_store.invalidate(self.ids[1])
+
+        self.assertEqual(list(get_compatibility_scores(self.ids[0], [self.ids[1]])), [1.0])
+        self.assertNotEqual(before, UserCompatibility.objects.get().score)
+
+    def test_saved_scores_skip_outdated_store_entries(self):
+        """Test that scores written to the table use the stored answers, not another worker's old copy"""
+        score_many(self.ids[0], [self.ids[1]])
+        # Answered through another worker, so this worker's store still holds the old answers
+        UserResponse.objects.filter(user=self.users[1], question=self.questions[2]).update(numeric_response=3)
+
+        self.assertEqual(list(get_compatibility_scores(self.ids[0], [self.ids[1]])), [1.0])
+        self.assertEqual(UserCompatibility.objects.get().score, 1.0)
+
+    def test_each_side_version_is_checked(self):
+        """Test that a row is stale when one side changed, even if the versions still add up"""
+        get_compatibility_scores(self.ids[0], [self.ids[1]])
+        row = UserCompatibility.objects.get()
+        UserCompatibility.objects.update(
+            score=0.5, user_a_version=row.user_a_version + 1, user_b_version=row.user_b_version - 1
+        )
+
+        self.assertEqual(
+            list(get_compatibility_scores(self.ids[0], [self.ids[1]])),
+            list(score_many(self.ids[0], [self.ids[1]]))
+        )
+
+    def test_schema_change_outdates_rows(self):
+        """Test that rows scored against an older questionnaire are recomputed"""
+        get_compatibility_scores(self.ids[0], [self.ids[1]])
+        UserCompatibility.objects.update(score=0.5)
+
+        bump_schema_version()
+
+        self.assertEqual(
+            list(get_compatibility_scores(self.ids[0], [self.ids[1]])),
+            list(score_many(self.ids[0], [self.ids[1]]))
+        )
+
+    def test_recompute_refreshes_only_user_rows(self):
+        """Test that recomputing a user touches only the pairs they belong to"""
+        get_compatibility_scores(self.ids[0], self.ids[1:])
+        get_compatibility_scores(self.ids[1], [self.ids[2]])
+
+        UserResponse.objects.filter(user=self.users[2]).update(numeric_response=1)
+        answer_store.clear()
+
+        self.assertEqual(recompute_user_compatibility(self.ids[2]), 2)
+        self.assertEqual(
+            UserCompatibility.objects.get(user_a=self.users[0], user_b=self.users[2]).score,
+            score_many(self.ids[0], [self.ids[2]])[0]
+        )
+
+    def test_backfill_command(self):
+        """Test that the backfill command stores every pair"""
+        call_command('backfill_compatibility', stdout=StringIO())
+        self.assertEqual(UserCompatibility.objects.count(), 3)
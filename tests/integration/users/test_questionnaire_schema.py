@@ -0,0 +1,66 @@
+import pytest
+from django.urls import reverse
+
+from users.models import Question, QuestionnaireTemplate
+from users.utils.questionnaire_schema import get_questionnaire_schema, get_schema_version
+
+
+@pytest.fixture
+def questionnaire():
+    """Fixture for a template with two questions"""
+    template = QuestionnaireTemplate.objects.create(title='Lifestyle', description='Daily habits', order=1)
+    Question.objects.create(questionnaire=template, title='Cleanliness', question_type='radio', order=2, weight=2.0)
+    Question.objects.create(questionnaire=template, title='Year', question_type='text', order=1)
+    return template
+
+
+@pytest.mark.django_db
+def test_schema_is_built_once_per_version(questionnaire, django_assert_num_queries):
+    """Test that the schema is only reloaded after a version bump"""
+    schema = get_questionnaire_schema()
+    assert [q['title'] for q in schema.templates[0]['questions']] == ['Year', 'Cleanliness']
+
+    with django_assert_num_queries(0):
+        assert get_questionnaire_schema() is schema
+
+@pytest.mark.django_db
+def test_schema_version_bumped_by_signals(questionnaire):
+    """Test that saving or deleting questions and templates bumps the version"""
+    version = get_schema_version()
+    question = Question.objects.create(questionnaire=questionnaire, title='Noise', question_type='radio')
+    assert get_schema_version() > version
+
+    version = get_schema_version()
+    question.delete()
+    assert get_schema_version() > version
+
+    version = get_schema_version()
+    questionnaire.title = 'Habits'
+    questionnaire.save()
+    assert get_schema_version() > version
+    assert get_questionnaire_schema().templates[0]['title'] == 'Habits'
+
+@pytest.mark.django_db
+def test_questionnaire_view_etag(api_client, questionnaire):
+    """Test that the questionnaire endpoint supports conditional requests"""
+    url = reverse('questionnaire')
+    response = api_client.get(url)
+    assert response.status_code == 200
+    assert response.json()[0]['questions'][1]['title'] == 'Cleanliness'
+    etag = response['ETag']
+
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    Question.objects.create(questionnaire=questionnaire, title='Guests', question_type='radio', order=3)
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert len(response.json()[0]['questions']) == 3
+
+@pytest.mark.django_db
+def test_questionnaire_view_by_id(api_client, questionnaire):
+    """Test fetching a single template and a missing one"""
+    url = reverse('questionnaire')
+    assert api_client.get(url, {'id': questionnaire.id}).json()['title'] == 'Lifestyle'
+    assert api_client.get(url, {'id': 999999}).status_code == 404
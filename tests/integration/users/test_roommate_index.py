@@ -0,0 +1,153 @@
+import random
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from apartments.utils.compatibility import invalidate_user_answers, score_many
+from appartners.utils import generate_jwt
+from users.models import Question, QuestionnaireTemplate, UserDetails, UserResponse
+from users.utils.roommate_index import (
+    BRUTE_FORCE_LIMIT,
+    RoommateIndex,
+    bump_roommate_index_version,
+    rebuild_roommate_index,
+)
+
+NUM_USERS = 600
+
+
+@pytest.fixture
+def questions(db):
+    template = QuestionnaireTemplate.objects.create(title='Roommates')
+    return [
+        Question.objects.create(
+            questionnaire=template, title=f'Question {i}', question_type='radio', order=i, weight=1.0 + i % 3
+        )
+        for i in range(3, 11)
+    ]
+
+
+@pytest.fixture
+def population(questions):
+    """Users answering around a few personas, like real respondents"""
+    rng = random.Random(5)
+    personas = [[rng.randint(1, 5) for _ in questions] for _ in range(12)]
+    users = User.objects.bulk_create([
+        User(username=f'roommate-{i}', email=f'roommate-{i}@example.com', password='!') for i in range(NUM_USERS)
+    ])
+    responses = []
+    for user in users:
+        persona = rng.choice(personas)
+        for question, center in zip(questions, persona):
+            value = min(5, max(1, center + rng.choice([-1, 0, 0, 1])))
+            responses.append(UserResponse(user=user, question=question, numeric_response=value))
+    UserResponse.objects.bulk_create(responses)
+    return [user.id for user in users]
+
+
+@pytest.mark.django_db
+def test_recall_against_brute_force(population):
+    """Test that index results are nearly as compatible as scoring every user"""
+    assert NUM_USERS > BRUTE_FORCE_LIMIT
+    index = RoommateIndex()
+    index.build()
+
+    recalls = []
+    for user_id in population[:20]:
+        others = [other for other in population if other != user_id]
+        exact = np.sort(score_many(user_id, others))[::-1][:10]
+        found = index.query(user_id, 10)
+
+        # Scores tie a lot, so count results at least as good as the tenth best
+        assert len(found) == 10
+        recalls.append(np.mean([score >= exact[-1] - 1e-9 for _, score in found]))
+        assert len(index.candidates(index._vectors[index._slots[user_id]], exclude=user_id)) < len(others)
+
+    assert np.mean(recalls) >= 0.9
+
+@pytest.mark.django_db
+def test_exact_query_matches_brute_force(population):
+    """Test that exact queries return the brute-force ranking"""
+    index = RoommateIndex()
+    index.build()
+    user_id = population[0]
+    others = [other for other in population if other != user_id]
+
+    scores = score_many(user_id, others)
+    expected = sorted(scores, reverse=True)[:5]
+
+    assert [score for _, score in index.query(user_id, 5, exact=True)] == pytest.approx(expected)
+
+@pytest.mark.django_db
+def test_incremental_insert_after_answering(questions, population):
+    """Test that a user who just answered is found without a rebuild"""
+    index = RoommateIndex()
+    index.build()
+    built_version = index.version
+
+    newcomer = User.objects.create_user(username='newcomer', email='newcomer@example.com', password='testpass123')
+    twin_answers = UserResponse.objects.filter(user_id=population[0]).values_list('question_id', 'numeric_response')
+    UserResponse.objects.bulk_create([
+        UserResponse(user=newcomer, question_id=question_id, numeric_response=value)
+        for question_id, value in twin_answers
+    ])
+    invalidate_user_answers(newcomer.id)
+
+    index.refresh_user(newcomer.id)
+
+    assert index.version == built_version + 1
+    assert newcomer.id in index._slots
+    _, best_score = index.query(population[0], 1)[0]
+    assert best_score == 1.0
+
+@pytest.mark.django_db
+def test_outdated_index_serves_while_rebuilt_in_background(population):
+    """Test that answers written through another worker don't make a query rebuild the index inline"""
+    index = RoommateIndex()
+    index.build()
+    built_version = index.version
+    # Another worker's refresh
+    remote_version = bump_roommate_index_version()
+
+    with patch.object(index, 'build', wraps=index.build) as build:
+        with patch('users.utils.roommate_index.run_in_background') as background:
+            index.ensure_current()
+            assert index.query(population[0], 5)
+        build.assert_not_called()
+        background.assert_called_once_with(rebuild_roommate_index, key=('roommate_index',))
+        assert index.version == built_version
+
+        index.rebuild_if_outdated()
+        index.rebuild_if_outdated()
+    build.assert_called_once()
+    assert index.version == remote_version
+
+@pytest.mark.django_db
+def test_roommates_endpoint(api_client, questions):
+    """Test that the endpoint lists the most compatible users with details, best first"""
+    users = []
+    for name, answers in (('me', [1] * 8), ('close', [1] * 7 + [2]), ('far', [5] * 8), ('silent', None)):
+        user = User.objects.create_user(username=name, email=f'{name}@example.com', password='testpass123')
+        UserDetails.objects.create(
+            user=user, first_name=name, last_name='Test', birth_date='2000-01-01',
+            phone_number=f'050{len(users):07d}',
+        )
+        for question, answer in zip(questions, answers or []):
+            UserResponse.objects.create(user=user, question=question, numeric_response=answer)
+        users.append(user)
+
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(users[0])}')
+    response = api_client.get(reverse('compatible-roommates'), {'limit': 5})
+
+    assert response.status_code == 200
+    assert [row['first_name'] for row in response.data] == ['close', 'far']
+    assert response.data[0]['compatibility_score'] > response.data[1]['compatibility_score']
+    # Percentages, like the other endpoints
+    assert all(isinstance(row['compatibility_score'], int) for row in response.data)
+    assert 50 < response.data[0]['compatibility_score'] <= 100
+
+    response = api_client.get(reverse('compatible-roommates'), {'limit': 'many'})
+    assert response.status_code == 400
@@ -4,7 +4,9 @@ from django.contrib.auth.models import User
 from faker import Faker
 from datetime import date
 
+from apartments.models import City
 from users.models import UserDetails
+from users.serializers.user_details import UserDetailsSerializer
 
 fake = Faker()
 
@@ -145,4 +147,24 @@ class TestUserDetailsIntegration(TestCase):
         with self.assertRaises(Exception):  # Should raise ValidationError or IntegrityError
             user_details = UserDetails(**self.user_details_data)
             user_details.full_clean()
-            user_details.save() 
\ No newline at end of file
+            user_details.save() 
+
+    def test_preferred_city_looked_up_once_per_name(self):
+        """Test that serializing many users queries each preferred city once"""
+        tel_aviv = City.objects.create(name='Tel Aviv', hebrew_name='תל אביב')
+        City.objects.create(name='Haifa', hebrew_name='חיפה')
+        details = [UserDetails.objects.create(**self.user_details_data)]
+        for i, city_name in enumerate(('tel aviv', 'Tel Aviv', 'Eilat')):
+            user = User.objects.create_user(username=fake.email(), email=fake.email(), password='testpass123')
+            details.append(UserDetails.objects.create(**{
+                **self.user_details_data, 'user': user, 'preferred_city': city_name, 'phone_number': f'+97250123450{i}'
+            }))
+
+        context = {}
+        with self.assertNumQueries(3):
+            cities = [
+                UserDetailsSerializer(detail, context=context).get_preferred_city(detail) for detail in details
+            ]
+
+        self.assertEqual(cities[:3], [{'id': tel_aviv.id, 'name': 'Tel Aviv'}] * 3)
+        self.assertEqual(cities[3], {'name': 'Eilat'})
@@ -1,8 +1,13 @@
+from unittest.mock import patch
+
 import pytest
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.urls import reverse
 from faker import Faker
+from rest_framework.test import APIClient
 
+from appartners.utils import generate_jwt
 from users.models import UserResponse, Question, QuestionnaireTemplate
 
 fake = Faker()
@@ -129,3 +134,36 @@ class TestUserResponseIntegration(TestCase):
         # Since there's no validation for required fields, this should pass
         response = UserResponse.objects.create(**data)
         self.assertEqual(response.text_response, '')
+
+    def test_invalid_submission_keeps_existing_responses(self):
+        """Test that a rejected submission doesn't delete the user's answers"""
+        UserResponse.objects.create(**self.response_data)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(self.user)}')
+
+        response = client.post(
+            reverse('questionnaire-responses'), {'responses': [{'question': 999999}]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UserResponse.objects.filter(user=self.user).count(), 1)
+
+    def test_submission_drops_cached_answers_after_commit(self):
+        """Test that the answer store is only invalidated once the submission commits"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_jwt(self.user)}')
+
+        with patch('users.serializers.questionnaire.invalidate_user_answers') as invalidate:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = client.post(
+                    reverse('questionnaire-responses'),
+                    {'responses': [{'question': self.question.id, 'text_response': 'Green'}]},
+                    format='json',
+                )
+            self.assertEqual(response.status_code, 201)
+            invalidate.assert_not_called()
+
+            for callback in callbacks:
+                if getattr(callback, '__name__', '') == '<lambda>':
+                    callback()
+        invalidate.assert_called_with(self.user.id)
@@ -110,6 +110,9 @@ REDIS_URL = None
 CHANNEL_LAYERS = {
     "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
 }
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
 
 # ── 6) Test-only flags ───────────────────────────────────────
 DEBUG = True
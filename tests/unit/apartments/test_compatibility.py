@@ -1,9 +1,14 @@
+import random
 from unittest.mock import Mock, patch
 from apartments.utils.compatibility import (
     text_field_similarity,
     calculate_question_similarity,
     calculate_user_compatibility,
+    calculate_responses_compatibility,
+    invalidate_user_answers,
+    score_many,
 )
+from apartments.utils.answer_store import AnswerVectorStore
 
 
 def test_text_field_similarity_identical():
@@ -78,7 +83,7 @@ def test_calculate_question_similarity_boolean(mock_question_metadata):
     similarity = calculate_question_similarity(3, response1, response2, mock_question_metadata)
     assert similarity < 1.0
 
-@patch('apartments.utils.compatibility.get_user_responses')
+@patch('apartments.utils.compatibility.get_responses_for_users')
 @patch('apartments.utils.compatibility.get_questions_metadata')
 def test_calculate_user_compatibility(mock_get_metadata, mock_get_responses):
     """Test compatibility score calculation between users"""
@@ -95,7 +100,9 @@ def test_calculate_user_compatibility(mock_get_metadata, mock_get_responses):
     }
     
     # Define mock behaviors
-    mock_get_responses.side_effect = lambda user_id: user1_responses if user_id == 1 else user2_responses
+    mock_get_responses.side_effect = lambda ids: {
+        uid: user1_responses if uid == 1 else user2_responses for uid in ids
+    }
     mock_get_metadata.return_value = {
         1: {"type": "radio", "weight": 1.0, "title": "Question 1"},
         2: {"type": "text", "weight": 1.0, "title": "Question 2"},
@@ -110,15 +117,15 @@ def test_calculate_user_compatibility(mock_get_metadata, mock_get_responses):
     score = calculate_user_compatibility(1, 2)
     assert 0.0 < score < 1.0  # Positive but not full score
 
-@patch('apartments.utils.compatibility.get_user_responses')
+@patch('apartments.utils.compatibility.get_responses_for_users')
 @patch('apartments.utils.compatibility.get_questions_metadata')
 def test_calculate_user_compatibility_missing_responses(mock_get_metadata, mock_get_responses):
     """Test compatibility score calculation with missing responses"""
     # Define mock behaviors with missing responses
-    mock_get_responses.side_effect = lambda user_id: {
-        1: Mock(numeric_response=5, text_response=None)
-    } if user_id == 1 else {
-        2: Mock(numeric_response=None, text_response="Hello")
+    mock_get_responses.side_effect = lambda ids: {
+        uid: {1: Mock(numeric_response=5, text_response=None)} if uid == 1
+        else {2: Mock(numeric_response=None, text_response="Hello")}
+        for uid in ids
     }
     mock_get_metadata.return_value = {
         1: {"type": "radio", "weight": 1.0, "title": "Question 1"},
@@ -129,7 +136,7 @@ def test_calculate_user_compatibility_missing_responses(mock_get_metadata, mock_
     score = calculate_user_compatibility(1, 2)
     assert 0.0 < score < 1.0  # Positive but not full score
 
-@patch('apartments.utils.compatibility.get_user_responses')
+@patch('apartments.utils.compatibility.get_responses_for_users')
 @patch('apartments.utils.compatibility.get_questions_metadata')
 def test_calculate_user_compatibility_no_responses(mock_get_metadata, mock_get_responses):
     """Test compatibility score calculation with no responses"""
@@ -139,4 +146,91 @@ def test_calculate_user_compatibility_no_responses(mock_get_metadata, mock_get_r
     
     # Test compatibility with no responses
     score = calculate_user_compatibility(1, 2)
-    assert score == 0.5  # Neutral score when there are no responses 
\ No newline at end of file
+    assert score == 0.5  # Neutral score when there are no responses 
+
+def _random_responses(rng, metadata):
+    """Build a random set of responses covering missing and empty answers"""
+    responses = {}
+    for q_id, meta in metadata.items():
+        if rng.random() < 0.15:
+            continue
+        if meta['type'] == 'text':
+            text = rng.choice([None, '', 'None', '1', '2', '3', '4', '03', 'first', 'second'])
+            responses[q_id] = Mock(numeric_response=None, text_response=text)
+        else:
+            numeric = rng.choice([None, 1, 2, 3, 4, 5])
+            responses[q_id] = Mock(numeric_response=numeric, text_response=None)
+    return responses
+
+
+@patch('apartments.utils.compatibility.get_responses_for_users')
+@patch('apartments.utils.compatibility.get_questions_metadata')
+def test_score_many_matches_pairwise(mock_get_metadata, mock_get_many):
+    """Test that batch scoring returns exactly the per-pair scores"""
+    rng = random.Random(42)
+    metadata = {q_id: {"type": "radio", "weight": rng.choice([0.5, 1.0, 1.5, 2.0]), "title": f"Q{q_id}"}
+                for q_id in range(1, 11)}
+    metadata[1]['type'] = 'text'
+    metadata[2]['type'] = 'text'
+    users = {uid: _random_responses(rng, metadata) for uid in range(1, 200)}
+    users[200] = {}
+
+    mock_get_metadata.return_value = metadata
+    mock_get_many.side_effect = lambda ids: {uid: users[uid] for uid in ids if uid in users}
+
+    other_ids = list(users) + [None]
+    for user_id in (1, 2, 3, 200):
+        expected = [calculate_responses_compatibility(users[user_id], users.get(other_id, {}), metadata)
+                    for other_id in other_ids]
+        assert list(score_many(user_id, other_ids)) == expected
+
+@patch('apartments.utils.compatibility.get_responses_for_users')
+@patch('apartments.utils.compatibility.get_questions_metadata')
+def test_score_many_unsupported_text_question(mock_get_metadata, mock_get_many):
+    """Test that free-text questions fall back to a neutral score like the per-pair path"""
+    mock_get_metadata.return_value = {
+        3: {"type": "radio", "weight": 1.0, "title": "Question 3"},
+        4: {"type": "text", "weight": 1.0, "title": "Question 4"}
+    }
+    mock_get_many.return_value = {
+        1: {3: Mock(numeric_response=1, text_response=None), 4: Mock(numeric_response=None, text_response="a")},
+        2: {3: Mock(numeric_response=1, text_response=None), 4: Mock(numeric_response=None, text_response="b")}
+    }
+    assert list(score_many(1, [2])) == [0.5]
+
+@patch('apartments.utils.compatibility.get_responses_for_users')
+@patch('apartments.utils.compatibility.get_questions_metadata')
+def test_answer_store_reads_and_invalidation(mock_get_metadata, mock_get_many):
+    """Test that cached answers skip the database until the user is invalidated"""
+    mock_get_metadata.return_value = {3: {"type": "radio", "weight": 1.0, "title": "Question 3"}}
+    answers = {1: 1, 2: 1}
+    mock_get_many.side_effect = lambda ids: {
+        uid: {3: Mock(numeric_response=answers[uid], text_response=None)} for uid in ids
+    }
+
+    assert calculate_user_compatibility(1, 2) == 1.0
+    assert calculate_user_compatibility(2, 1) == 1.0
+    assert mock_get_many.call_count == 1
+
+    answers[2] = 5
+    assert calculate_user_compatibility(1, 2) == 1.0  # Still served from the store
+    invalidate_user_answers(2)
+    assert calculate_user_compatibility(1, 2) == 0.0
+    assert mock_get_many.call_count == 2
+
+def test_answer_store_lru_eviction():
+    """Test that the store drops the least recently used users when full"""
+    store = AnswerVectorStore(max_users=2)
+    loader = lambda ids: {uid: f"vector-{uid}" for uid in ids}
+    store.get_many([1, 2], "schema", loader)
+    store.get_many([1], "schema", loader)
+    store.get_many([3], "schema", loader)
+    assert len(store) == 2
+    assert store.get_many([1], "schema", lambda ids: {}) == {1: "vector-1"}
+    assert store.get_many([2], "schema", lambda ids: {}) == {}
+
+def test_answer_store_schema_change():
+    """Test that a questionnaire schema change empties the store"""
+    store = AnswerVectorStore()
+    store.get_many([1], "schema-1", lambda ids: {uid: "old" for uid in ids})
+    assert store.get_many([1], "schema-2", lambda ids: {uid: "new" for uid in ids}) == {1: "new"}
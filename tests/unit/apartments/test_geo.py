@@ -0,0 +1,46 @@
+import math
+
+import numpy as np
+
+from apartments.utils.geo import (
+    CELLS_PER_ROW,
+    _column_ranges,
+    bounding_box,
+    grid_cell,
+    haversine_km,
+)
+
+
+def test_grid_cell_numbering():
+    """Test that neighbouring cells in a row have consecutive IDs"""
+    cell = grid_cell(31.25, 34.79)
+
+    assert grid_cell(31.25, 34.80) == cell + 1
+    assert grid_cell(31.26, 34.79) == cell + CELLS_PER_ROW
+    assert grid_cell(None, 34.79) is None
+
+def test_haversine_known_distance():
+    """Test distances against a known city pair and the origin itself"""
+    distances = haversine_km(31.2520, 34.7915, [31.7683, 31.2520], [35.2137, 34.7915])
+
+    assert abs(distances[0] - 69.0) < 1.0
+    assert distances[1] == 0
+
+def test_bounding_box_contains_circle():
+    """Test that points on the circle's edge fall inside the bounding box"""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(31.25, 34.79, 5)
+    bearings = np.radians(np.arange(0, 360, 5))
+    lat1, lon1 = math.radians(31.25), math.radians(34.79)
+    angular = 4.999 / 6371.0088
+    lats = np.arcsin(np.sin(lat1) * np.cos(angular) + np.cos(lat1) * np.sin(angular) * np.cos(bearings))
+    lons = lon1 + np.arctan2(
+        np.sin(bearings) * np.sin(angular) * np.cos(lat1), np.cos(angular) - np.sin(lat1) * np.sin(lats)
+    )
+
+    assert np.all((np.degrees(lats) >= min_lat) & (np.degrees(lats) <= max_lat))
+    assert np.all((np.degrees(lons) >= min_lon) & (np.degrees(lons) <= max_lon))
+
+def test_column_ranges_wrap_antimeridian():
+    """Test that a box crossing the antimeridian is split into two column ranges"""
+    assert _column_ranges(179.5, 180.5) == [(35950, CELLS_PER_ROW - 1), (0, 50)]
+    assert _column_ranges(-200, 200) == [(0, CELLS_PER_ROW - 1)]
@@ -0,0 +1,42 @@
+from apartments.utils.near_duplicates import (
+    cluster_near_duplicates,
+    estimated_similarity,
+    minhash_signature,
+    shingles,
+)
+
+LISTING = (
+    "Spacious three room apartment near the university with a large balcony, "
+    "renovated kitchen, air conditioning in every room and a short walk to the "
+    "central bus station. Quiet building, friendly neighbours, parking available."
+)
+REPOST = LISTING.replace("friendly neighbours", "nice neighbours") + " Call now!"
+OTHER = (
+    "Small studio in the old city above a cafe, perfect for a single student, "
+    "includes furniture, washing machine and fast internet, bills not included."
+)
+
+
+def test_shingles_use_preprocessed_words():
+    """Test that shingles ignore case and punctuation"""
+    assert shingles("Big, bright ROOM!") == {"big bright room"}
+    assert shingles("") == set()
+
+def test_signature_similarity():
+    """Test that signatures estimate similarity of reposts and unrelated texts"""
+    assert estimated_similarity(minhash_signature(LISTING), minhash_signature(LISTING.upper())) == 1.0
+    assert estimated_similarity(minhash_signature(LISTING), minhash_signature(REPOST)) >= 0.7
+    assert estimated_similarity(minhash_signature(LISTING), minhash_signature(OTHER)) < 0.2
+
+def test_short_descriptions_not_signed():
+    """Test that generic short descriptions are never called duplicates"""
+    assert minhash_signature("Nice apartment") is None
+    assert minhash_signature(None) is None
+
+def test_cluster_near_duplicates():
+    """Test that reposts cluster together and unrelated texts stay apart"""
+    texts = [(1, LISTING), (2, OTHER), (3, "Nice apartment"), (4, REPOST), (5, LISTING), (6, OTHER + " ")]
+
+    clusters = cluster_near_duplicates(texts, threshold=0.6)
+
+    assert sorted(clusters) == [[1, 4, 5], [2, 6]]
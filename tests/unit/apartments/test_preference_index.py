@@ -0,0 +1,33 @@
+import random
+
+from apartments.utils.preference_index import IntervalTree
+
+INF = float('inf')
+
+
+def test_stab_matches_brute_force():
+    """Test that stabbing queries return exactly the intervals containing the point"""
+    rng = random.Random(3)
+    intervals = []
+    for i in range(300):
+        low = rng.choice([-INF, rng.randint(0, 50) * 100])
+        high = rng.choice([INF, (low if low != -INF else 0) + rng.randint(0, 30) * 100])
+        intervals.append((low, high, i))
+    tree = IntervalTree(intervals)
+
+    for point in [rng.randint(-10, 8000) for _ in range(200)] + [0, 2500, 5000]:
+        expected = {item for low, high, item in intervals if low <= point <= high}
+        found = tree.stab(point)
+        assert sorted(found) == sorted(expected)
+
+def test_stab_includes_bounds_and_open_ranges():
+    """Test that bounds are inclusive and missing bounds are unbounded"""
+    tree = IntervalTree([(2000, 3000, 'closed'), (-INF, 2500, 'max only'), (2500, INF, 'min only'), (-INF, INF, 'any')])
+
+    assert sorted(tree.stab(2000)) == ['any', 'closed', 'max only']
+    assert sorted(tree.stab(2500)) == ['any', 'closed', 'max only', 'min only']
+    assert sorted(tree.stab(9000)) == ['any', 'min only']
+
+def test_empty_tree():
+    """Test that a tree without intervals matches nothing"""
+    assert IntervalTree([]).stab(1000) == []
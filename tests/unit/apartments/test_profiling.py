@@ -0,0 +1,47 @@
+import time
+
+from apartments.utils.profiling import (
+    StageProfiler,
+    _bucket,
+    _disabled,
+    profile_stage,
+    profiling,
+)
+
+
+def test_profile_stage_is_noop_without_profiler():
+    """Test that stages share one no-op context manager when profiling is off"""
+    assert profile_stage('filter') is _disabled
+    assert profile_stage('scoring') is _disabled
+
+def test_nested_stage_time_is_exclusive():
+    """Test that time in a nested stage is not counted in the outer stage"""
+    profiler = StageProfiler()
+    with profiler.stage('filter'):
+        with profiler.stage('preferences'):
+            time.sleep(0.02)
+
+    assert profiler.stages['preferences']['wall_ms'] >= 20
+    assert profiler.stages['filter']['wall_ms'] < 20
+
+def test_repeated_stages_accumulate_in_first_run_order():
+    """Test that entering a stage again adds to its totals"""
+    with profiling() as profiler:
+        for _ in range(3):
+            with profile_stage('candidate_fetch'):
+                pass
+            with profile_stage('scoring'):
+                time.sleep(0.001)
+
+    report = profiler.report()
+    assert list(report) == ['candidate_fetch', 'scoring', 'total']
+    assert report['scoring']['wall_ms'] >= 3
+    assert report['total']['wall_ms'] >= report['scoring']['wall_ms']
+    assert profile_stage('scoring') is _disabled
+
+def test_histogram_buckets():
+    """Test that times fall in the first bucket whose bound they don't exceed"""
+    assert _bucket(0.4) == 'le_1'
+    assert _bucket(1) == 'le_1'
+    assert _bucket(30) == 'le_50'
+    assert _bucket(60000) == 'inf'
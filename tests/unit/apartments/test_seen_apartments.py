@@ -0,0 +1,40 @@
+import uuid
+
+from apartments.utils.seen_apartments import SeenApartments
+
+
+def test_seen_apartments_membership():
+    """Test that members are found whether given as UUIDs or strings"""
+    ids = [uuid.uuid4() for _ in range(50)]
+    seen = SeenApartments.from_ids(ids[:25])
+
+    assert len(seen) == 25
+    assert all(apartment_id in seen for apartment_id in ids[:25])
+    assert str(ids[0]) in seen
+    assert not any(apartment_id in seen for apartment_id in ids[25:])
+    assert seen.contains_many(ids).tolist() == [True] * 25 + [False] * 25
+
+def test_seen_apartments_with_id_keeps_order():
+    """Test that adding IDs keeps the set sorted and free of duplicates"""
+    ids = [uuid.uuid4() for _ in range(10)]
+    seen = SeenApartments()
+    for apartment_id in ids + ids[:3]:
+        seen = seen.with_id(apartment_id)
+
+    assert len(seen) == 10
+    assert seen.packed == SeenApartments.from_ids(ids).packed
+
+def test_seen_apartments_empty():
+    """Test lookups against an empty set"""
+    seen = SeenApartments()
+
+    assert uuid.uuid4() not in seen
+    assert seen.contains_many([uuid.uuid4()]).tolist() == [False]
+
+def test_seen_apartments_ids():
+    """Test that the listed IDs match the members, including ones ending in zero bytes"""
+    ids = [uuid.uuid4() for _ in range(5)] + [uuid.UUID(bytes=b'\x01' + b'\x00' * 15)]
+    seen = SeenApartments.from_ids(ids)
+
+    assert sorted(seen.ids()) == sorted(ids)
+    assert SeenApartments().ids() == []
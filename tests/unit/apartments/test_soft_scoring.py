@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from apartments.utils.soft_scoring import (
+    COMPATIBILITY_PIPELINE,
+    DistanceScorer,
+    EntryDateScorer,
+    FloorScorer,
+    PriceScorer,
+    Scorer,
+    ScoringContext,
+    ScoringPipeline,
+    register_scorer,
+    SCORERS,
+)
+
+
+def _prefs(**values):
+    fields = dict.fromkeys(
+        ('min_price', 'max_price', 'move_in_date', 'max_floor', 'latitude', 'longitude', 'max_distance_km')
+    )
+    fields.update(values)
+    return SimpleNamespace(**fields)
+
+
+def _context(**values):
+    return ScoringContext(1, _prefs(**values))
+
+
+def test_price_fit_is_continuous_at_the_limit():
+    """Test that one shekel over max_price costs almost nothing and bargains beat the limit"""
+    scores = PriceScorer().score({'total_price': np.array([2000.0, 3000.0, 3001.0, 3300.0])}, _context(max_price=3000))
+
+    assert scores[0] > scores[1]
+    assert scores[1] == pytest.approx(0.5)
+    assert scores[2] == pytest.approx(0.5, abs=0.01)
+    assert scores[3] == pytest.approx(0.25)
+
+def test_price_fit_penalizes_below_min_price():
+    """Test that apartments cheaper than min_price lose fit"""
+    scores = PriceScorer().score(
+        {'total_price': np.array([1800.0, 2000.0])}, _context(min_price=2000, max_price=3000)
+    )
+    assert scores[0] == pytest.approx(0.5)
+    assert scores[1] == pytest.approx(1.0)
+
+def test_date_fit_penalizes_late_entry_more_than_early():
+    """Test that being available late costs more than being available early"""
+    move_in = date.today() + timedelta(days=30)
+    entry_dates = np.array([(move_in + timedelta(days=offset)).toordinal() for offset in (0, -14, 14)], dtype=float)
+
+    on_time, early, late = EntryDateScorer().score({'available_entry_date': entry_dates}, _context(move_in_date=move_in))
+
+    assert on_time == 1.0
+    assert late == pytest.approx(0.5)
+    assert early > late
+
+def test_floor_fit():
+    """Test that floors above max_floor halve the fit per floor"""
+    scores = FloorScorer().score({'floor': np.array([1.0, 3.0, 4.0, 5.0])}, _context(max_floor=3))
+    np.testing.assert_allclose(scores, [1.0, 1.0, 0.5, 0.25])
+
+def test_distance_fit_without_coordinates():
+    """Test that the fit is 0.5 at the radius and 0 without coordinates"""
+    context = _context(latitude=31.25, longitude=34.79, max_distance_km=1.0)
+    scores = DistanceScorer().score(
+        {'latitude': np.array([31.25, 31.25 + 1 / 111.195, np.nan]), 'longitude': np.array([34.79, 34.79, np.nan])},
+        context,
+    )
+    np.testing.assert_allclose(scores, [1.0, 0.5, 0.0], atol=1e-3)
+
+def test_scorers_ignore_unset_preferences():
+    """Test that scorers rate every candidate fully when the preference isn't set"""
+    columns = {'total_price': np.array([1.0, 9999.0]), 'floor': np.array([0.0, 30.0])}
+    assert list(PriceScorer().score(columns, _context())) == [1.0, 1.0]
+    assert list(FloorScorer().score(columns, ScoringContext(1, None))) == [1.0, 1.0]
+
+def test_pipeline_combines_weighted_mean():
+    """Test that the pipeline takes the weighted mean of its scorers"""
+    pipeline = ScoringPipeline({'compatibility': 0, 'price': 3, 'floor': 1})
+    columns = pipeline.columns([(10, 3000, 4), (11, 2000, 1)])
+
+    scores = pipeline.score(columns, _context(max_price=3000, max_floor=3))
+
+    assert pipeline.fields == ('total_price', 'floor')
+    assert not pipeline.compatibility_only
+    np.testing.assert_allclose(scores, [0.75 * 0.5 + 0.25 * 0.5, 0.75 * (1 - 0.5 * 2 / 3) + 0.25])
+
+def test_soft_preferences_need_a_weighted_scorer():
+    """Test that only preferences whose scorer is weighted are softened"""
+    pipeline = ScoringPipeline({'compatibility': 1, 'price': 1, 'floor': 0}, soft_preferences=['price', 'floor'])
+    assert pipeline.soft_preferences == ('price',)
+    assert COMPATIBILITY_PIPELINE.compatibility_only
+    assert COMPATIBILITY_PIPELINE.soft_preferences == ()
+
+def test_pipeline_rejects_invalid_weights():
+    """Test that unknown scorers and all-zero weights are errors"""
+    with pytest.raises(ValueError):
+        ScoringPipeline({'view': 1})
+    with pytest.raises(ValueError):
+        ScoringPipeline({'compatibility': 0})
+
+def test_registered_scorers_join_pipelines():
+    """Test that a registered scorer can be weighted like the built-in ones"""
+    class RoomsScorer(Scorer):
+        name = 'rooms'
+        fields = ('number_of_rooms',)
+
+        def score(self, columns, context):
+            return columns['number_of_rooms'] / 10
+
+    register_scorer(RoomsScorer())
+    try:
+        pipeline = ScoringPipeline({'rooms': 1})
+        scores = pipeline.score(pipeline.columns([(1, 3), (2, 5)]), _context())
+        np.testing.assert_allclose(scores, [0.3, 0.5])
+    finally:
+        del SCORERS['rooms']
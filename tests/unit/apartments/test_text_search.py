@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+from apartments.utils.text_search import build_search_text, normalize_search_text
+
+
+def test_normalize_search_text_hebrew():
+    """Test that vowel points and punctuation are dropped and final letters folded"""
+    assert normalize_search_text("רְחוֹב הָרַב קוּק") == normalize_search_text("רחוב הרב קוק")
+    assert normalize_search_text('רח\' רגר, ב"ש') == "רח רגר בש"
+    assert normalize_search_text("שלום") == "שלומ"
+
+def test_normalize_search_text_splits_joined_words():
+    """Test that hyphens, the maqaf and slashes separate words"""
+    assert normalize_search_text("תל-אביב") == "תל אביב"
+    assert normalize_search_text("נווה־זאב") == "נווה זאב"
+    assert normalize_search_text("Ben-Gurion/Rager") == "ben gurion rager"
+
+def test_normalize_search_text_empty():
+    """Test handling of empty text"""
+    assert normalize_search_text("") == ""
+    assert normalize_search_text(None) == ""
+
+def test_build_search_text_skips_missing_parts():
+    """Test that the street, area and description are joined without blanks"""
+    apartment = SimpleNamespace(street="Rager Blvd.", area=None, about="Quiet, near the university!")
+    assert build_search_text(apartment) == "rager blvd quiet near the university"
@@ -0,0 +1,102 @@
+import threading
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+from apartments.utils.compatibility import ANSWER_MISSING, score_answer_matrix
+from users.utils.questionnaire_schema import get_schema_version
+from users.utils.roommate_index import RoommateIndex, embed_answers, embedding_size, get_roommate_index_version
+
+QUESTION_IDS = [3, 4, 5, 6]
+METADATA = {
+    3: {'type': 'radio', 'weight': 1.0},
+    4: {'type': 'radio', 'weight': 2.0},
+    5: {'type': 'radio', 'weight': 0.5},
+    6: {'type': 'radio', 'weight': 1.5},
+}
+
+
+def _embed(answers):
+    answers = np.asarray(answers, dtype=np.int8)
+    n = len(answers)
+    return embed_answers(answers, np.zeros(n, dtype=np.int64), np.zeros(n, dtype=bool), QUESTION_IDS, METADATA)
+
+
+def test_dot_product_reproduces_weighted_score():
+    """Test that the embedding dot product is an affine function of the compatibility score"""
+    rng = np.random.default_rng(1)
+    answers = rng.integers(1, 6, size=(50, len(QUESTION_IDS))).astype(np.int8)
+    vectors = _embed(answers)
+    total_weight = sum(meta['weight'] for meta in METADATA.values())
+
+    user_vector = (answers[0], 0, False)
+    scores = score_answer_matrix(
+        user_vector, answers, np.zeros(50, dtype=np.int64), np.zeros(50, dtype=bool), QUESTION_IDS, METADATA
+    )
+
+    assert vectors.shape == (50, embedding_size(QUESTION_IDS, METADATA))
+    np.testing.assert_allclose(total_weight / 2 + vectors @ vectors[0], scores * total_weight, atol=1e-5)
+
+def test_unanswered_questions_embed_as_zeros():
+    """Test that missing answers contribute nothing to the embedding"""
+    vectors = _embed([[ANSWER_MISSING] * len(QUESTION_IDS), [3, ANSWER_MISSING, 3, 3]])
+
+    assert not vectors[0].any()
+    assert not vectors[1, 4:8].any()
+    assert vectors[1, :4].any()
+
+def test_lsh_candidates_recall_nearest_neighbours():
+    """Test that bucket candidates contain most of the exact nearest neighbours"""
+    rng = np.random.default_rng(7)
+    centers = rng.integers(1, 6, size=(20, len(QUESTION_IDS)))
+    answers = np.clip(centers[rng.integers(0, 20, size=2000)] + rng.integers(-1, 2, size=(2000, len(QUESTION_IDS))), 1, 5)
+    vectors = _embed(answers)
+
+    index = RoommateIndex(dimensions=vectors.shape[1], bits=8, seed=3)
+    index.add(list(range(2000)), vectors)
+
+    hits = 0
+    sizes = []
+    for user_id in range(50):
+        exact = set(np.argsort(-(vectors @ vectors[user_id]), kind='stable')[:11]) - {user_id}
+        candidates = set(index.candidates(vectors[user_id], exclude=user_id))
+        sizes.append(len(candidates))
+        hits += len(exact & candidates) / len(exact)
+
+    assert hits / 50 >= 0.9
+    assert np.mean(sizes) < 2000 / 2
+
+def test_reinsert_and_remove_keep_buckets_consistent():
+    """Test that updated users move buckets and removed users are never returned"""
+    vectors = _embed([[1, 1, 1, 1], [5, 5, 5, 5], [1, 1, 1, 2]])
+    index = RoommateIndex(dimensions=vectors.shape[1], bits=4, seed=0)
+    index.add([10, 11, 12], vectors)
+
+    index.add([11], vectors[:1])
+    assert 11 in index.candidates(vectors[0])
+
+    index.remove(11)
+    index.add([12], np.zeros_like(vectors[:1]))
+    assert len(index) == 1
+    assert index.candidates(vectors[0]) == [10]
+
+
+def test_concurrent_first_queries_build_once():
+    """Test that queries racing to load the index wait for a single build"""
+    index = RoommateIndex()
+
+    def build(version=None):
+        time.sleep(0.05)
+        index.version = get_roommate_index_version()
+        index.schema_version = get_schema_version()
+        index.built_at = time.monotonic()
+
+    with patch.object(index, 'build', side_effect=build) as built:
+        threads = [threading.Thread(target=index.ensure_current) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    built.assert_called_once()
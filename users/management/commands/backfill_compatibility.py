@@ -0,0 +1,57 @@
+"""
+Management command to fill the pairwise compatibility cache for existing users.
+"""
+from django.core.management.base import BaseCommand
+
+from apartments.utils.compatibility import score_many
+from apartments.utils.compatibility_cache import get_responses_versions, save_compatibility_scores
+from users.models import UserResponse
+from users.utils.questionnaire_schema import get_schema_version
+
+
+class Command(BaseCommand):
+    help = 'Compute and store compatibility scores for every pair of users with questionnaire responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            nargs='+',
+            type=int,
+            help='Only backfill pairs involving these user IDs',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of counterparts scored per batch (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = sorted(set(UserResponse.objects.values_list('user_id', flat=True)))
+        self.stdout.write(f'Found {len(user_ids)} users with questionnaire responses')
+
+        selected = set(options['users'] or [])
+
+        total_pairs = 0
+        sources = [uid for uid in user_ids if not selected or uid in selected]
+        for position, user_id in enumerate(sources, start=1):
+            if selected:
+                # Pair the selected users with everyone else
+                others = [uid for uid in user_ids if uid != user_id]
+            else:
+                # Each unordered pair is scored once, from its smaller user ID
+                others = user_ids[position:]
+            for start in range(0, len(others), batch_size):
+                batch = others[start:start + batch_size]
+                schema_version = get_schema_version()
+                versions = get_responses_versions(batch + [user_id])
+                save_compatibility_scores(
+                    user_id, batch, score_many(user_id, batch, use_store=False), versions, schema_version
+                )
+                total_pairs += len(batch)
+
+            if position % 50 == 0 or position == len(sources):
+                self.stdout.write(f'Processed {position}/{len(sources)} users ({total_pairs} pairs)')
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {total_pairs} compatibility pairs'))
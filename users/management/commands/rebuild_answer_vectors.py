@@ -0,0 +1,27 @@
+"""
+Management command to rebuild the packed answer vectors used for SQL scoring.
+"""
+from django.core.management.base import BaseCommand
+
+from apartments.utils.compatibility_sql import rebuild_answer_vectors, save_answer_vectors
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored answer vector of every user with questionnaire responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            nargs='+',
+            type=int,
+            help='Only rebuild the vectors of these user IDs',
+        )
+
+    def handle(self, *args, **options):
+        if options['users']:
+            written = save_answer_vectors(options['users'])
+        else:
+            self.stdout.write('Rebuilding answer vectors for all users with questionnaire responses')
+            written = rebuild_answer_vectors()
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} answer vectors'))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.17 on 2026-10-16 23:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('users', '0029_otp_email_alter_otp_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCompatibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('responses_version', models.BigIntegerField(default=0)),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compatibilities_as_a', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compatibilities_as_b', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='usercompatibility',
+            constraint=models.UniqueConstraint(fields=('user_a', 'user_b'), name='unique_user_compatibility_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='usercompatibility',
+            constraint=models.CheckConstraint(check=models.Q(('user_a__lt', models.F('user_b'))), name='user_compatibility_ordered_pair'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.17 on 2026-10-16 23:53
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0030_usercompatibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAnswerVector',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='answer_vector', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('answers', django.contrib.postgres.fields.ArrayField(base_field=models.SmallIntegerField(), default=list, size=None)),
+                ('year_value', models.BigIntegerField(null=True)),
+                ('year_text', models.TextField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
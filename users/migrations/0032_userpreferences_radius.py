@@ -0,0 +1,28 @@
+# Generated by Django 4.2.17 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0031_useranswervector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpreferences',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=7, help_text='Center of the preferred search radius (optional)', max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='userpreferences',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=7, help_text='Center of the preferred search radius (optional)', max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='userpreferences',
+            name='max_distance_km',
+            field=models.FloatField(blank=True, help_text='Maximum distance in km from the preferred point (optional)', null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.17 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0032_userpreferences_radius'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='usercompatibility',
+            name='responses_version',
+        ),
+        migrations.AddField(
+            model_name='usercompatibility',
+            name='schema_version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usercompatibility',
+            name='user_a_version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usercompatibility',
+            name='user_b_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated migration to pack answer vectors for users who answered before they were maintained
+
+from django.db import migrations
+
+from apartments.utils.compatibility_sql import encode_answer_array
+
+
+def backfill_answer_vectors(apps, schema_editor):
+    """
+    Pack the stored answer vector of every user who already has responses.
+    """
+    Question = apps.get_model('users', 'Question')
+    UserResponse = apps.get_model('users', 'UserResponse')
+    UserAnswerVector = apps.get_model('users', 'UserAnswerVector')
+
+    questions_metadata = {
+        q.id: {
+            'type': q.question_type,
+            'weight': q.weight,
+            'options': q.options,
+            'order': q.order,
+            'title': q.title
+        }
+        for q in Question.objects.all()
+    }
+    responses_by_user = {}
+    responses = UserResponse.objects.only('user_id', 'question_id', 'text_response', 'numeric_response')
+    for resp in responses.iterator():
+        responses_by_user.setdefault(resp.user_id, {})[resp.question_id] = resp
+
+    rows = []
+    for user_id, responses in responses_by_user.items():
+        answers, year_value, year_text = encode_answer_array(responses, questions_metadata)
+        rows.append(UserAnswerVector(user_id=user_id, answers=answers, year_value=year_value, year_text=year_text))
+    UserAnswerVector.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['answers', 'year_value', 'year_text', 'updated_at'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0033_usercompatibility_side_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_answer_vectors, migrations.RunPython.noop),
+    ]
@@ -7,5 +7,7 @@ from .device_token import DeviceToken
 from .user_like import UserUserLike
 from .blacklisted_token import BlacklistedToken
 from .otp import OTP
+from .user_compatibility import UserCompatibility
+from .user_answer_vector import UserAnswerVector
 
-__all__ = ["QuestionnaireTemplate", "Question", "UserResponse", "UserDetails", "UserPreferences", "UserPreferencesFeatures", "UserPresence", "DeviceToken", "UserUserLike", "BlacklistedToken", "OTP"]
+__all__ = ["QuestionnaireTemplate", "Question", "UserResponse", "UserDetails", "UserPreferences", "UserPreferencesFeatures", "UserPresence", "DeviceToken", "UserUserLike", "BlacklistedToken", "OTP", "UserCompatibility", "UserAnswerVector"]
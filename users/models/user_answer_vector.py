@@ -0,0 +1,25 @@
+"""
+Model for storing a user's questionnaire answers packed into an array.
+"""
+from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+
+
+class UserAnswerVector(models.Model):
+    """
+    Denormalized copy of a user's questionnaire responses used for scoring in SQL.
+
+    answers is indexed by question ID (Postgres arrays are 1-based, so
+    answers[q] holds question q) using the sentinels from
+    apartments.utils.compatibility. The year question is kept separately as
+    an integer when it parses as one, and as raw text for equality checks.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='answer_vector')
+    answers = ArrayField(models.SmallIntegerField(), default=list)
+    year_value = models.BigIntegerField(null=True)
+    year_text = models.TextField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Answer vector for user {self.user_id}"
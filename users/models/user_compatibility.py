@@ -0,0 +1,39 @@
+"""
+Model for storing precomputed compatibility scores between users.
+"""
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import F, Q
+
+
+class UserCompatibility(models.Model):
+    """
+    Cached questionnaire compatibility score for an ordered pair of users.
+
+    Each pair is stored once with user_a having the smaller ID.
+    Both users' response versions and the questionnaire schema version are
+    recorded at scoring time, so a change to either side's answers or to the
+    questions marks the row as stale.
+    """
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='compatibilities_as_a')
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='compatibilities_as_b')
+    score = models.FloatField()
+    computed_at = models.DateTimeField(auto_now=True)
+    user_a_version = models.BigIntegerField(default=0)
+    user_b_version = models.BigIntegerField(default=0)
+    schema_version = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_a', 'user_b'],
+                name='unique_user_compatibility_pair'
+            ),
+            models.CheckConstraint(
+                check=Q(user_a__lt=F('user_b')),
+                name='user_compatibility_ordered_pair'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_a_id} <-> {self.user_b_id}: {self.score:.2f}"
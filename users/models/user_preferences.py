@@ -15,6 +15,9 @@ class UserPreferences(models.Model):
     max_price = models.IntegerField(null=True, blank=True)
     max_floor = models.IntegerField(null=True, blank=True, help_text="Maximum floor preference (optional)")
     area = models.CharField(max_length=100, null=True, blank=True, help_text="Preferred neighborhood or area")
+    latitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True, help_text="Center of the preferred search radius (optional)")
+    longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True, help_text="Center of the preferred search radius (optional)")
+    max_distance_km = models.FloatField(null=True, blank=True, help_text="Maximum distance in km from the preferred point (optional)")
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_preferences')
 
@@ -41,6 +44,16 @@ class UserPreferences(models.Model):
         if self.max_floor is not None and self.max_floor < 0:
             raise ValidationError("Maximum floor must be greater than or equal to 0.")
 
+        # A search radius needs all of its center and distance
+        location = (self.latitude, self.longitude, self.max_distance_km)
+        if any(value is not None for value in location):
+            if any(value is None for value in location):
+                raise ValidationError("Latitude, longitude and maximum distance must be provided together.")
+            if not -90 <= self.latitude <= 90 or not -180 <= self.longitude <= 180:
+                raise ValidationError("Latitude or longitude is out of range.")
+            if self.max_distance_km <= 0:
+                raise ValidationError("Maximum distance must be greater than 0.")
+
     def save(self, *args, **kwargs):
         # Call full_clean to validate before saving
         self.full_clean()
@@ -2,7 +2,7 @@ from rest_framework import serializers
 import logging
 from users.models.user_details import UserDetails
 from users.models.questionnaire import UserResponse
-from users.serializers.questionnaire import QuestionSerializer
+from users.utils.questionnaire_schema import get_question_data
 from apartments.models import City
 
 # Get logger
@@ -63,14 +63,13 @@ class ApiUserDetailsSerializer(serializers.ModelSerializer):
         """
         try:
             # Get all responses for the user, ordered by question order
-            user_responses = UserResponse.objects.filter(user=obj.user).select_related('question').order_by('question__order')
+            user_responses = UserResponse.objects.filter(user=obj.user).order_by('question__order')
             
             # Create a detailed response with question details (empty list if no responses)
             response_data = []
             for response in user_responses:
-                question_serializer = QuestionSerializer(response.question)
                 response_data.append({
-                    'question': question_serializer.data,
+                    'question': get_question_data(response.question_id),
                     'text_response': response.text_response,
                     'numeric_response': response.numeric_response,
                     'created_at': response.created_at
@@ -1,5 +1,11 @@
+from django.db import transaction
 from rest_framework import serializers
+from apartments.utils.compatibility import invalidate_user_answers
+from apartments.utils.compatibility_cache import schedule_compatibility_recompute
+from apartments.utils.recommendation_cache import bump_answers_version
+from apartments.utils.recommendation_feed import schedule_feed_rebuild
 from users.models.questionnaire import QuestionnaireTemplate, Question, UserResponse
+from users.utils.roommate_index import schedule_roommate_refresh
 
 class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -57,4 +63,14 @@ class UserResponseBulkSerializer(serializers.Serializer):
             )
             responses.append(response)
         
+        # Cached answer vectors and pair scores for this user are now stale;
+        # the stored vector is rebuilt by the UserResponse signals. Dropped after
+        # commit, so a concurrent read can't cache the old answers again.
+        transaction.on_commit(lambda: invalidate_user_answers(user.id))
+        # Outdates everyone's cached recommendations, so once per submission and only if it commits
+        transaction.on_commit(bump_answers_version)
+        schedule_compatibility_recompute(user.id)
+        schedule_feed_rebuild(user.id)
+        schedule_roommate_refresh(user.id)
+        
         return {'responses': responses}
\ No newline at end of file
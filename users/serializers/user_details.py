@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from users.models.user_details import UserDetails
 from users.models.questionnaire import UserResponse
-from users.serializers.questionnaire import QuestionSerializer
+from users.utils.questionnaire_schema import get_question_data
 from apartments.models import City
 
 class UserDetailsSerializer(serializers.ModelSerializer):
@@ -28,12 +28,7 @@ class UserDetailsSerializer(serializers.ModelSerializer):
         """
         if obj.preferred_city:
             try:
-                # Try to get the city object by name (exact match)
-                city = City.objects.filter(name=obj.preferred_city).first()
-                
-                # If not found by exact name, try case-insensitive match
-                if not city:
-                    city = City.objects.filter(name__iexact=obj.preferred_city).first()
+                city = self._find_city(obj.preferred_city)
                 
                 if city:
                     return {
@@ -57,20 +52,36 @@ class UserDetailsSerializer(serializers.ModelSerializer):
                 }
         return None
 
+    def _find_city(self, name):
+        """
+        Find a city by exact name, falling back to a case-insensitive match.
+
+        Lookups are kept in the serializer context by name, so a list of users
+        queries each preferred city once.
+        """
+        cities = self.context.setdefault('preferred_cities', {})
+        if name not in cities:
+            matches = list(City.objects.filter(name__iexact=name))
+            exact = [city for city in matches if city.name == name]
+            cities[name] = (exact or matches or [None])[0]
+        return cities[name]
+
     def get_questionnaire_responses(self, obj):
         """
         Return user's questionnaire responses in a structured format
         """
         try:
-            # Get all responses for the user, ordered by question order
-            user_responses = UserResponse.objects.filter(user=obj.user).select_related('question').order_by('question__order')
+            # Get all responses for the user, ordered by question order, unless
+            # the queryset already prefetched them in that order
+            user_responses = getattr(obj.user, 'ordered_responses', None)
+            if user_responses is None:
+                user_responses = UserResponse.objects.filter(user=obj.user).order_by('question__order')
             
             # Create a detailed response with question details (empty list if no responses)
             response_data = []
             for response in user_responses:
-                question_serializer = QuestionSerializer(response.question)
                 response_data.append({
-                    'question': question_serializer.data,
+                    'question': get_question_data(response.question_id),
                     'text_response': response.text_response,
                     'numeric_response': response.numeric_response,
                     'created_at': response.created_at
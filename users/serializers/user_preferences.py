@@ -8,6 +8,7 @@ class UserPreferencesGetSerializer(serializers.ModelSerializer):
     city = serializers.SerializerMethodField()  # Return city ID and name
     features = serializers.SerializerMethodField()  # Get features using a method
     price_range = serializers.SerializerMethodField()
+    location = serializers.SerializerMethodField()
 
     class Meta:
         model = UserPreferences
@@ -19,6 +20,7 @@ class UserPreferencesGetSerializer(serializers.ModelSerializer):
             'price_range',
             'max_floor',
             'area',
+            'location',
         ]
 
     def get_price_range(self, obj):
@@ -27,6 +29,15 @@ class UserPreferencesGetSerializer(serializers.ModelSerializer):
             "max": obj.max_price
         }
     
+    def get_location(self, obj):
+        if obj.max_distance_km is None:
+            return None
+        return {
+            "latitude": float(obj.latitude),
+            "longitude": float(obj.longitude),
+            "max_distance_km": obj.max_distance_km
+        }
+    
     def get_city(self, obj):
         if obj.city:
             return {
@@ -8,6 +8,9 @@ from users.models import DeviceToken
 
 logger = logging.getLogger(__name__)
 
+# FCM accepts at most 500 tokens per multicast message
+MULTICAST_BATCH_SIZE = 500
+
 
 class FirebaseService:
     """
@@ -125,3 +128,101 @@ class FirebaseService:
         }
         
         return FirebaseService.send_notification(apartment_owner_id, title, body, data)
+
+    @staticmethod
+    def send_multicast_notification(user_ids, title, body, data=None):
+        """
+        Send the same push notification to many users in batched requests.
+
+        Args:
+            user_ids: IDs of the users to send the notification to
+            title: Notification title
+            body: Notification body text
+            data: Optional dictionary of additional data to send
+
+        Returns:
+            int: Number of devices the notification was delivered to
+        """
+        try:
+            tokens = list(DeviceToken.objects.filter(
+                user_id__in=user_ids,
+                is_active=True
+            ).values_list('token', flat=True))
+
+            if not tokens:
+                logger.warning(f"No active device tokens found for {len(user_ids)} users")
+                return 0
+
+            delivered = 0
+            invalid_tokens = []
+            for start in range(0, len(tokens), MULTICAST_BATCH_SIZE):
+                batch = tokens[start:start + MULTICAST_BATCH_SIZE]
+                message = messaging.MulticastMessage(
+                    notification=messaging.Notification(
+                        title=title,
+                        body=body,
+                    ),
+                    tokens=batch,
+                    data=data or {},
+                    android=messaging.AndroidConfig(
+                        priority='high',
+                        notification=messaging.AndroidNotification(
+                            icon='notification_icon',
+                            color='#4CAF50',
+                            sound='default'
+                        ),
+                    ),
+                    apns=messaging.APNSConfig(
+                        payload=messaging.APNSPayload(
+                            aps=messaging.Aps(
+                                sound='default',
+                                badge=1,
+                                content_available=True
+                            )
+                        )
+                    ),
+                )
+
+                try:
+                    response = messaging.send_each_for_multicast(message)
+                except Exception as e:
+                    logger.error(f"Failed to send multicast notification to {len(batch)} tokens: {str(e)}")
+                    continue
+
+                delivered += response.success_count
+                for token, result in zip(batch, response.responses):
+                    if not result.success and isinstance(result.exception, messaging.UnregisteredError):
+                        invalid_tokens.append(token)
+
+            # Tokens of uninstalled apps never work again
+            if invalid_tokens:
+                DeviceToken.objects.filter(token__in=invalid_tokens).update(is_active=False)
+
+            logger.info(f"Multicast notification delivered to {delivered} of {len(tokens)} devices")
+            return delivered
+
+        except Exception as e:
+            logger.error(f"Error sending multicast push notification: {str(e)}")
+            return 0
+
+    @staticmethod
+    def send_new_listing_notification(user_ids, apartment):
+        """
+        Notify users that an apartment matching their preferences was listed.
+
+        Args:
+            user_ids: IDs of the users whose preferences the apartment matches
+            apartment: The new Apartment
+
+        Returns:
+            int: Number of devices the notification was delivered to
+        """
+        title = "New Apartment For You!"
+        body = f"{apartment.street}, {apartment.city.name} - {apartment.total_price}₪"
+
+        data = {
+            "notification_type": "new_listing",
+            "apartment_id": str(apartment.id),
+        }
+
+        return FirebaseService.send_multicast_notification(user_ids, title, body, data)
@@ -0,0 +1,82 @@
+"""
+Signal handlers for the users app.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from apartments.utils.background import run_in_background
+from apartments.utils.compatibility_sql import (
+    install_compatibility_function,
+    rebuild_answer_vectors,
+    schedule_answer_vector_save,
+)
+from apartments.utils.preference_index import refresh_indexed_preferences
+from apartments.utils.recommendation_cache import bump_preferences_version
+from users.models.questionnaire import QuestionnaireTemplate, Question, UserResponse
+from users.models.user_preferences import UserPreferences
+from users.models.user_preferences_features import UserPreferencesFeatures
+from users.utils.questionnaire_schema import bump_schema_version
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=QuestionnaireTemplate)
+@receiver(post_delete, sender=QuestionnaireTemplate)
+def questionnaire_schema_changed(sender, **kwargs):
+    """
+    Bump the questionnaire schema version when a question or template changes.
+    """
+    bump_schema_version()
+
+
+@receiver(post_save, sender=Question)
+def question_updated(sender, instance, created, **kwargs):
+    """
+    Re-encode stored answer vectors when an existing question is edited,
+    since the packed encoding depends on the question type.
+    """
+    if not created:
+        run_in_background(rebuild_answer_vectors, key=('answer_vectors',))
+
+
+@receiver(post_save, sender=UserResponse)
+@receiver(post_delete, sender=UserResponse)
+def user_response_changed(sender, instance, **kwargs):
+    """
+    Re-pack the user's stored answer vector after the write commits.
+    """
+    schedule_answer_vector_save(instance.user_id)
+
+
+@receiver(post_save, sender=UserPreferences)
+@receiver(post_delete, sender=UserPreferences)
+def user_preferences_changed(sender, instance, **kwargs):
+    """
+    Outdate the user's cached recommendations and indexed preferences after their preferences change.
+    """
+    bump_preferences_version(instance.user_id)
+    transaction.on_commit(lambda: refresh_indexed_preferences(instance.user_id))
+
+
+@receiver(post_save, sender=UserPreferencesFeatures)
+@receiver(post_delete, sender=UserPreferencesFeatures)
+def user_preference_features_changed(sender, instance, **kwargs):
+    """
+    Outdate the user's cached recommendations and indexed preferences after their required features change.
+    """
+    user_id = UserPreferences.objects.filter(
+        id=instance.user_preferences_id
+    ).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        bump_preferences_version(user_id)
+        transaction.on_commit(lambda: refresh_indexed_preferences(user_id))
+
+
+@receiver(post_migrate)
+def install_database_functions(sender, using, **kwargs):
+    """
+    Keep the SQL compatibility function in sync with the code after migrating.
+    """
+    if sender.name == 'users':
+        install_compatibility_function(using)
@@ -8,6 +8,7 @@ from .views.questionnaire_views import QuestionnaireView, UserResponseView
 from .views.user_update_views import UpdatePasswordView, UpdateUserDetailsView
 from .views.device_token_views import DeviceTokenView
 from .views.user_like_views import UserLikeView
+from .views.roommate_views import CompatibleRoommatesView
 from .views.token_refresh_views import TokenRefreshView
 from .views.logout_views import LogoutView
 from .views.otp_views import SendOTPView, VerifyOTPView
@@ -23,6 +24,7 @@ users_urlpatterns = [
     path('update-details/', UpdateUserDetailsView.as_view(), name='update-details'),
     path('device-token/', DeviceTokenView.as_view(), name='device-token'),
     path('like/', UserLikeView.as_view(), name='user-like'),
+    path('roommates/', CompatibleRoommatesView.as_view(), name='compatible-roommates'),
 ]
 
 auth_urlpatterns = [
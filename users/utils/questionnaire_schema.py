@@ -0,0 +1,143 @@
+"""
+Versioned, process-wide cache of the questionnaire schema.
+Shared by compatibility scoring, the questionnaire endpoint and every
+serializer that embeds question details.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from users.models.questionnaire import QuestionnaireTemplate, Question
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_CACHE_KEY = 'questionnaire:schema_version'
+
+
+class QuestionnaireSchema:
+    """
+    Immutable snapshot of all questionnaire templates and questions.
+
+    Attributes:
+        version: Schema version this snapshot was built for
+        questions_metadata: Scoring metadata keyed by question ID
+        questions: Serialized question dicts keyed by question ID
+        templates: Serialized templates in display order
+        templates_json: Pre-rendered JSON of all templates
+        template_json_by_id: Pre-rendered JSON of each template keyed by ID
+    """
+
+    def __init__(self, version, templates, questions):
+        # Imported here because the serializers package uses this module
+        from users.serializers.questionnaire import QuestionSerializer
+
+        self.version = version
+        self.questions_metadata = {
+            q.id: {
+                'type': q.question_type,
+                'weight': q.weight,
+                'options': q.options,
+                'order': q.order,
+                'title': q.title
+            }
+            for q in questions
+        }
+        self.questions = {q.id: dict(QuestionSerializer(q).data) for q in questions}
+
+        questions_by_template = {}
+        for q in sorted(questions, key=lambda q: q.order):
+            questions_by_template.setdefault(q.questionnaire_id, []).append(self.questions[q.id])
+
+        renderer = JSONRenderer()
+        self.templates = [
+            {
+                'id': template.id,
+                'title': template.title,
+                'description': template.description,
+                'questions': questions_by_template.get(template.id, [])
+            }
+            for template in templates
+        ]
+        self.templates_json = renderer.render(self.templates)
+        self.template_json_by_id = {
+            str(template['id']): renderer.render(template) for template in self.templates
+        }
+
+
+_schema = None
+_schema_lock = threading.Lock()
+
+
+def get_schema_version():
+    """
+    Get the current questionnaire schema version.
+
+    The counter lives in the shared cache so a bump in one worker is seen by all.
+
+    Returns:
+        int: Current schema version
+    """
+    version = cache.get(SCHEMA_VERSION_CACHE_KEY)
+    if version is None:
+        # Start from a time-based value so restarts never reuse an old version
+        cache.add(SCHEMA_VERSION_CACHE_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(SCHEMA_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_schema_version():
+    """
+    Mark the cached schema as outdated after a question or template changed.
+    """
+    try:
+        cache.incr(SCHEMA_VERSION_CACHE_KEY)
+    except ValueError:
+        # Key missing or evicted; any fresh time-based value is newer
+        cache.set(SCHEMA_VERSION_CACHE_KEY, time.time_ns() // 1000, timeout=None)
+
+
+def get_questionnaire_schema():
+    """
+    Get the questionnaire schema, rebuilding it only when the version changed.
+
+    Returns:
+        QuestionnaireSchema: Current schema snapshot
+    """
+    global _schema
+
+    version = get_schema_version()
+    schema = _schema
+    if schema is not None and schema.version == version:
+        return schema
+
+    with _schema_lock:
+        if _schema is None or _schema.version != version:
+            templates = list(QuestionnaireTemplate.objects.all())
+            questions = list(Question.objects.all())
+            _schema = QuestionnaireSchema(version, templates, questions)
+            logger.debug(f"Rebuilt questionnaire schema version {version}")
+        return _schema
+
+
+def get_question_data(question):
+    """
+    Get the serialized form of a question from the schema cache.
+
+    Args:
+        question: Question instance or question ID
+
+    Returns:
+        dict: Same fields as QuestionSerializer
+    """
+    question_id = getattr(question, 'id', question)
+    data = get_questionnaire_schema().questions.get(question_id)
+    if data is None:
+        # Question created after this snapshot; render it directly
+        from users.serializers.questionnaire import QuestionSerializer
+        if not isinstance(question, Question):
+            question = Question.objects.get(id=question_id)
+        return dict(QuestionSerializer(question).data)
+    return dict(data)
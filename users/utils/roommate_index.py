@@ -0,0 +1,483 @@
+"""
+Approximate nearest-neighbour index of users by questionnaire answers.
+Each user's packed answers are embedded so that the dot product of two
+embeddings tracks their weighted compatibility score. Embeddings are bucketed
+by random-projection (SimHash) codes in several tables; a query scores only
+the users sharing a bucket with it, exactly, instead of scoring everyone.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+
+from apartments.utils.background import run_in_background
+from apartments.utils.compatibility import (
+    ANSWER_EMPTY,
+    ANSWER_MISSING,
+    MAJOR_QUESTION_ID,
+    YEAR_QUESTION_ID,
+    get_questions_metadata,
+    get_user_vectors,
+    score_many,
+)
+from users.models.questionnaire import UserResponse
+from users.utils.questionnaire_schema import get_schema_version
+
+logger = logging.getLogger(__name__)
+
+ROOMMATE_INDEX_VERSION_CACHE_KEY = 'users:roommate_index_version'
+
+# Radio answers are on a 1-5 scale
+RADIO_SCALE = (1, 5)
+
+# Study years beyond this range embed like the nearest end of it
+YEAR_SCALE = (1, 7)
+
+NUM_TABLES = 8
+
+# Code length is picked at build time so buckets hold about this many users
+TARGET_BUCKET_SIZE = 8
+MAX_BITS = 16
+
+# Below this many users a query simply scores everyone
+BRUTE_FORCE_LIMIT = 256
+
+# Inserts never re-tune the code length, so rebuild from scratch now and then
+REBUILD_INTERVAL_SECONDS = 60 * 60
+
+INITIAL_CAPACITY = 1024
+
+
+def get_roommate_index_version():
+    """
+    Get the current roommate index version.
+
+    Bumped once per questionnaire submission, so workers can tell when their
+    copy is outdated.
+
+    Returns:
+        int: Current roommate index version
+    """
+    version = cache.get(ROOMMATE_INDEX_VERSION_CACHE_KEY)
+    if version is None:
+        # Start from a time-based value so restarts never reuse an old version
+        cache.add(ROOMMATE_INDEX_VERSION_CACHE_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(ROOMMATE_INDEX_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_roommate_index_version():
+    """
+    Mark every worker's copy of the roommate index as outdated.
+
+    Returns:
+        int: The new roommate index version
+    """
+    try:
+        return cache.incr(ROOMMATE_INDEX_VERSION_CACHE_KEY)
+    except ValueError:
+        # Key missing or evicted; any fresh time-based value is newer
+        version = time.time_ns() // 1000
+        cache.set(ROOMMATE_INDEX_VERSION_CACHE_KEY, version, timeout=None)
+        return version
+
+
+def _embedded_questions(question_ids, questions_metadata):
+    """
+    Columns of the packed answers that get an embedding block, with their scale.
+    """
+    blocks = []
+    for col, q_id in enumerate(question_ids):
+        q_type = questions_metadata[q_id].get('type', 'radio')
+        if q_id == MAJOR_QUESTION_ID:
+            continue
+        if q_type == 'text' and q_id != YEAR_QUESTION_ID:
+            # Scored as neutral for everyone, so it can't tell users apart
+            continue
+        scale = YEAR_SCALE if q_id == YEAR_QUESTION_ID else RADIO_SCALE
+        blocks.append((col, q_id, scale, float(questions_metadata[q_id].get('weight', 1.0))))
+    return blocks
+
+
+def embedding_size(question_ids, questions_metadata):
+    """
+    Number of dimensions of the answer embeddings for a questionnaire.
+    """
+    return sum(high - low for _, _, (low, high), _ in _embedded_questions(question_ids, questions_metadata))
+
+
+def embed_answers(answers, year_values, year_is_int, question_ids, questions_metadata):
+    """
+    Embed packed answer vectors so dot products track compatibility.
+
+    Every scale question becomes a +/-1 thermometer code of its answer: with
+    S steps, two codes have dot product S - 2|a - b|, so the question's
+    similarity 1 - |a - b| / S equals 1/2 + dot / 2S. Scaling the block by
+    sqrt(weight / 2S) makes the whole weighted sum an affine function of the
+    embedding dot product for users who answered the same questions.
+    Unanswered questions embed as zeros. The critical question's steeper
+    curve and the year rule are only approximated; candidates are always
+    re-scored exactly.
+
+    Args:
+        answers: int8 matrix of shape (n_users, n_questions) from encode_user_answers
+        year_values: Parsed year answers of shape (n_users,)
+        year_is_int: Boolean array of shape (n_users,)
+        question_ids: Sorted list of question IDs defining the columns
+        questions_metadata: Question metadata keyed by question ID
+
+    Returns:
+        ndarray: float32 matrix of shape (n_users, embedding_size)
+    """
+    answers = np.asarray(answers)
+    blocks = []
+    for col, q_id, (low, high), weight in _embedded_questions(question_ids, questions_metadata):
+        steps = high - low
+        column = answers[:, col]
+        answered = (column != ANSWER_MISSING) & (column != ANSWER_EMPTY)
+        if q_id == YEAR_QUESTION_ID:
+            values = np.asarray(year_values, dtype=np.int64)
+            answered &= np.asarray(year_is_int, dtype=bool)
+        else:
+            values = column.astype(np.int64)
+
+        thresholds = np.arange(low, high)
+        code = np.where(np.clip(values, low, high)[:, None] > thresholds[None, :], 1.0, -1.0)
+        code *= np.sqrt(weight / (2 * steps))
+        blocks.append(np.where(answered[:, None], code, 0.0))
+
+    if not blocks:
+        return np.zeros((len(answers), 0), dtype=np.float32)
+    return np.hstack(blocks).astype(np.float32)
+
+
+def embed_users(user_ids):
+    """
+    Embed several users' answers, read through the answer store.
+
+    Args:
+        user_ids: List of user IDs
+
+    Returns:
+        ndarray: Embedding matrix with one row per user ID
+    """
+    questions_metadata = get_questions_metadata()
+    question_ids = sorted(questions_metadata)
+    vectors = get_user_vectors(user_ids, question_ids, questions_metadata)
+    rows = [vectors[user_id] for user_id in user_ids]
+    answers = np.array([row[0] for row in rows], dtype=np.int8).reshape(len(rows), len(question_ids))
+    year_values = np.array([row[1] for row in rows], dtype=np.int64)
+    year_is_int = np.array([row[2] for row in rows], dtype=bool)
+    return embed_answers(answers, year_values, year_is_int, question_ids, questions_metadata)
+
+
+class RoommateIndex:
+    """
+    Random-projection LSH index over answer embeddings.
+
+    Each table hashes an embedding to the signs of its projections onto a few
+    random hyperplanes. Queries probe their own bucket and every bucket one
+    bit away in each table, then re-rank the union with score_many. Removed
+    users leave a free slot that is reused by the next insert.
+    """
+
+    def __init__(self, dimensions=0, bits=1, num_tables=NUM_TABLES, seed=0, capacity=INITIAL_CAPACITY):
+        self.version = None
+        self.schema_version = None
+        self.built_at = None
+        self.bits = bits
+        self._lock = threading.RLock()
+        # Held for a whole build, so concurrent callers share one instead of each running their own
+        self._build_lock = threading.RLock()
+        self._slots = {}
+        self._ids = []
+        self._free = []
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._codes = np.zeros((capacity, num_tables), dtype=np.int64)
+        self._planes = np.random.default_rng(seed).standard_normal((num_tables, bits, dimensions))
+        self._weights = 1 << np.arange(bits, dtype=np.int64)
+        self._buckets = [{} for _ in range(num_tables)]
+
+    @property
+    def loaded(self):
+        return self.version is not None
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _capacity(self):
+        return len(self._alive)
+
+    def _grow(self):
+        capacity = self._capacity() * 2
+
+        def resized(array):
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self._alive = resized(self._alive)
+        self._vectors = resized(self._vectors)
+        self._codes = resized(self._codes)
+
+    def _hash(self, vectors):
+        """
+        Bucket codes of embeddings in every table, shape (n, num_tables).
+        """
+        projections = np.einsum('tbd,nd->ntb', self._planes, vectors)
+        return (projections > 0).astype(np.int64) @ self._weights
+
+    def _upsert(self, user_id, vector, codes):
+        slot = self._slots.get(user_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._ids)
+                if slot >= self._capacity():
+                    self._grow()
+                self._ids.append(None)
+            self._slots[user_id] = slot
+            self._ids[slot] = user_id
+        else:
+            self._unbucket(slot)
+
+        self._vectors[slot] = vector
+        self._codes[slot] = codes
+        self._alive[slot] = True
+        for table, code in zip(self._buckets, codes):
+            table.setdefault(int(code), set()).add(slot)
+
+    def _unbucket(self, slot):
+        for table, code in zip(self._buckets, self._codes[slot]):
+            members = table.get(int(code))
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del table[int(code)]
+
+    def _remove(self, user_id):
+        slot = self._slots.pop(user_id, None)
+        if slot is None:
+            return
+        self._unbucket(slot)
+        self._ids[slot] = None
+        self._alive[slot] = False
+        self._free.append(slot)
+
+    def add(self, user_ids, vectors):
+        """
+        Insert or replace users; users whose embedding is all zeros are removed.
+
+        Args:
+            user_ids: List of user IDs
+            vectors: Embedding matrix with one row per user ID
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(user_ids):
+            return
+        codes = self._hash(vectors)
+        with self._lock:
+            for user_id, vector, user_codes in zip(user_ids, vectors, codes):
+                if vector.any():
+                    self._upsert(user_id, vector, user_codes)
+                else:
+                    self._remove(user_id)
+
+    def remove(self, user_id):
+        """
+        Drop a user from the index.
+        """
+        with self._lock:
+            self._remove(user_id)
+
+    def candidates(self, vector, exclude=None):
+        """
+        Get the users sharing a bucket, or a bucket one bit away, with an embedding.
+
+        Args:
+            vector: Query embedding
+            exclude: User ID to leave out
+
+        Returns:
+            list: Candidate user IDs
+        """
+        codes = self._hash(np.asarray(vector, dtype=np.float32)[None, :])[0]
+        flips = np.concatenate([[0], self._weights])
+        with self._lock:
+            slots = set()
+            for table, code in zip(self._buckets, codes):
+                for probe in np.bitwise_xor(int(code), flips):
+                    slots.update(table.get(int(probe), ()))
+            return [self._ids[slot] for slot in slots if self._ids[slot] != exclude]
+
+    def all_ids(self, exclude=None):
+        with self._lock:
+            return [user_id for user_id in self._slots if user_id != exclude]
+
+    def build(self, version=None):
+        """
+        Replace the index contents with every user who answered the questionnaire.
+
+        The code length is tuned to the number of users, so buckets stay small
+        as the population grows.
+
+        Args:
+            version: Roommate index version the data corresponds to
+        """
+        with self._build_lock:
+            version = get_roommate_index_version() if version is None else version
+            schema_version = get_schema_version()
+            user_ids = list(UserResponse.objects.values_list('user_id', flat=True).distinct().order_by('user_id'))
+            vectors = embed_users(user_ids)
+
+            bits = int(np.clip(np.round(np.log2(max(len(user_ids), 1) / TARGET_BUCKET_SIZE)), 1, MAX_BITS))
+            fresh = RoommateIndex(
+                dimensions=vectors.shape[1],
+                bits=bits,
+                capacity=max(INITIAL_CAPACITY, len(user_ids)),
+            )
+            fresh.add(user_ids, vectors)
+            fresh.version = version
+            fresh.schema_version = schema_version
+            fresh.built_at = time.monotonic()
+
+            with self._lock:
+                self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k not in ('_lock', '_build_lock')})
+            logger.info(f"Built roommate index with {len(self)} users in {bits}-bit buckets (version {version})")
+
+    def _servable(self):
+        # Embeddings from another questionnaire can't be compared with fresh ones
+        return self.loaded and self.schema_version == get_schema_version()
+
+    def _outdated(self):
+        return (
+            self.version != get_roommate_index_version()
+            or time.monotonic() - self.built_at > REBUILD_INTERVAL_SECONDS
+        )
+
+    def ensure_current(self):
+        """
+        Make sure the index can serve queries, refreshing it when outdated.
+
+        A missing index, or one built for another questionnaire, is built right
+        away, once for all concurrent callers. An index that missed answers
+        written through other workers, or is due its periodic rebuild, keeps
+        serving while it is rebuilt in the background.
+        """
+        if not self._servable():
+            with self._build_lock:
+                if not self._servable():
+                    self.build()
+            return
+        if self._outdated():
+            run_in_background(rebuild_roommate_index, key=('roommate_index',))
+
+    def rebuild_if_outdated(self):
+        """
+        Rebuild the index unless it became current since the rebuild was requested.
+        """
+        with self._build_lock:
+            if not self._servable() or self._outdated():
+                self.build()
+
+    def refresh_user(self, user_id):
+        """
+        Re-embed one user after their answers were written and update them in place.
+
+        Args:
+            user_id: ID of the user who answered the questionnaire
+        """
+        new_version = bump_roommate_index_version()
+        with self._lock:
+            if not self.loaded:
+                return
+            if new_version != self.version + 1:
+                # Another worker wrote meanwhile; rebuild on the next query
+                return
+            self.add([user_id], embed_users([user_id]))
+            self.version = new_version
+
+    def query(self, user_id, limit, exact=False):
+        """
+        Find the users most compatible with a user.
+
+        Args:
+            user_id: ID of the user
+            limit: Maximum number of users to return
+            exact: Score every indexed user instead of the LSH candidates
+
+        Returns:
+            list: List of (user_id, compatibility_score) tuples, best first;
+                  empty if the user hasn't answered any embedded question
+        """
+        vector = embed_users([user_id])[0]
+        if not vector.any():
+            return []
+
+        if exact or len(self) <= BRUTE_FORCE_LIMIT:
+            candidates = self.all_ids(exclude=user_id)
+        else:
+            candidates = self.candidates(vector, exclude=user_id)
+        if not candidates:
+            return []
+
+        scores = score_many(user_id, candidates)
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [(candidates[i], float(scores[i])) for i in order]
+
+
+# Per-worker index, built on the first roommate query
+roommate_index = RoommateIndex()
+
+
+def find_compatible_roommates(user_id, limit):
+    """
+    Find the users whose answers are most compatible with a user's.
+
+    Args:
+        user_id: ID of the user
+        limit: Maximum number of users to return
+
+    Returns:
+        list: List of (user_id, compatibility_score) tuples, best first
+    """
+    try:
+        roommate_index.ensure_current()
+        return roommate_index.query(user_id, limit)
+    except Exception as e:
+        logger.error(f"Error finding compatible roommates for user {user_id}: {str(e)}")
+        return []
+
+
+def rebuild_roommate_index():
+    """
+    Rebuild this worker's roommate index if it is still outdated; run in the background.
+    """
+    roommate_index.rebuild_if_outdated()
+
+
+def refresh_roommate(user_id):
+    """
+    Keep the roommate index version and this worker's index current after a user answered.
+
+    Args:
+        user_id: ID of the user whose responses were written
+    """
+    try:
+        roommate_index.refresh_user(user_id)
+    except Exception as e:
+        logger.error(f"Error refreshing user {user_id} in the roommate index: {str(e)}")
+
+
+def schedule_roommate_refresh(user_id):
+    """
+    Refresh a user's roommate index entry in the background once the current transaction commits.
+
+    Args:
+        user_id: ID of the user whose responses were written
+    """
+    run_in_background(refresh_roommate, user_id, key=('roommates', user_id))
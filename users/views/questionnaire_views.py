@@ -3,16 +3,15 @@ Questionnaire-related views for the users app.
 """
 from jwt import ExpiredSignatureError, InvalidTokenError
 from django.contrib.auth.models import User
-from django.db import DatabaseError
+from django.db import DatabaseError, transaction
+from django.http import HttpResponse
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from users.models.questionnaire import QuestionnaireTemplate, UserResponse
-from users.serializers import (
-    QuestionnaireTemplateSerializer,
-    UserResponseBulkSerializer,
-    QuestionSerializer
-)
+from apartments.utils.compatibility import invalidate_user_answers
+from users.models.questionnaire import UserResponse
+from users.serializers import UserResponseBulkSerializer
+from users.utils.questionnaire_schema import get_questionnaire_schema, get_question_data
 
 
 class QuestionnaireView(APIView):
@@ -23,10 +22,11 @@ class QuestionnaireView(APIView):
     """
     def get(self, request):
         try:
-            # Get all questionnaire templates ordered by their order field
-            questionnaires = QuestionnaireTemplate.objects.all()
+            # Templates are served pre-rendered from the versioned schema cache
+            schema = get_questionnaire_schema()
+            etag = f'"questionnaire-{schema.version}"'
             
-            if not questionnaires.exists():
+            if not schema.templates:
                 return Response(
                     {"errors": "No questionnaire templates found"},
                     status=status.HTTP_404_NOT_FOUND
@@ -35,19 +35,23 @@ class QuestionnaireView(APIView):
             # If a specific template ID is requested
             template_id = request.query_params.get('id')
             if template_id:
-                try:
-                    questionnaire = questionnaires.get(id=template_id)
-                    serializer = QuestionnaireTemplateSerializer(questionnaire)
-                    return Response(serializer.data, status=status.HTTP_200_OK)
-                except QuestionnaireTemplate.DoesNotExist:
+                body = schema.template_json_by_id.get(template_id)
+                if body is None:
                     return Response(
                         {"errors": f"Questionnaire template with ID {template_id} not found"},
                         status=status.HTTP_404_NOT_FOUND
                     )
+            else:
+                # Otherwise return all templates
+                body = schema.templates_json
             
-            # Otherwise return all templates
-            serializer = QuestionnaireTemplateSerializer(questionnaires, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # Let clients skip the download when the schema hasn't changed
+            if request.headers.get('If-None-Match') == etag:
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = HttpResponse(body, content_type='application/json', status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            return response
             
         except DatabaseError:
             return Response(
@@ -70,22 +74,26 @@ class UserResponseView(APIView):
             user_id = request.user_from_token
             user = User.objects.get(id=user_id)
             
-            # Delete existing responses for this user
-            UserResponse.objects.filter(user=user).delete()
-            
-            # Process the responses
+            # Validate first, so an invalid payload leaves the existing responses alone
             serializer = UserResponseBulkSerializer(
                 data=request.data, 
                 context={'user': user}
             )
+            if not serializer.is_valid():
+                return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
             
-            if serializer.is_valid():
+            # Replace the responses in one transaction, so the stored answer
+            # vector is rebuilt once after commit rather than per response
+            with transaction.atomic():
+                # Delete existing responses for this user
+                UserResponse.objects.filter(user=user).delete()
+                # Dropped after commit, so a concurrent read can't cache the old answers again
+                transaction.on_commit(lambda: invalidate_user_answers(user.id))
                 serializer.save()
-                return Response(
-                    {"message": "Responses saved successfully"},
-                    status=status.HTTP_201_CREATED
-                )
-            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(
+                {"message": "Responses saved successfully"},
+                status=status.HTTP_201_CREATED
+            )
         except User.DoesNotExist:
             return Response(
                 {"errors": "User not found"},
@@ -108,14 +116,13 @@ class UserResponseView(APIView):
             user = User.objects.get(id=user_id)
             
             # Get all responses for the user, ordered by question order
-            user_responses = UserResponse.objects.filter(user=user).select_related('question').order_by('question__order')
+            user_responses = UserResponse.objects.filter(user=user).order_by('question__order')
             
             # Create a detailed response with question details (empty list if no responses)
             response_data = []
             for response in user_responses:
-                question_serializer = QuestionSerializer(response.question)
                 response_data.append({
-                    'question': question_serializer.data,
+                    'question': get_question_data(response.question_id),
                     'text_response': response.text_response,
                     'numeric_response': response.numeric_response,
                     'created_at': response.created_at
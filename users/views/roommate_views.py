@@ -0,0 +1,88 @@
+"""
+Views for finding compatible roommates.
+"""
+import logging
+
+from django.db.models import Prefetch
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from users.models import UserDetails, UserResponse
+from users.serializers import UserDetailsSerializer
+from users.utils.roommate_index import find_compatible_roommates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+class CompatibleRoommatesView(APIView):
+    """
+    API endpoint for the users whose questionnaire answers best match the current user's.
+
+    Endpoint: GET /api/v1/users/roommates/
+    Query parameters:
+        - limit: Number of users to return (default 10, max 50)
+
+    Returns:
+        - 200: List of user details with a compatibility_score, best match first;
+               empty if the user hasn't answered the questionnaire
+        - 400: Invalid limit
+        - 500: Server error
+    """
+
+    def get(self, request):
+        # Return error if authentication failed
+        if request.token_error:
+            return request.token_error
+
+        # Get user_id from the request (set by middleware)
+        user_id = request.user_from_token
+
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "limit must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit < 1:
+            return Response(
+                {"error": "limit must be positive"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(limit, MAX_LIMIT)
+
+        try:
+            matches = find_compatible_roommates(user_id, limit)
+            scores = dict(matches)
+
+            details = UserDetails.objects.filter(user_id__in=scores).select_related('user').prefetch_related(
+                Prefetch(
+                    'user__questionnaire_responses',
+                    queryset=UserResponse.objects.order_by('question__order'),
+                    to_attr='ordered_responses',
+                )
+            )
+            details_by_user = {detail.user_id: detail for detail in details}
+
+            context = {}
+            roommates = []
+            for match_id, score in matches:
+                detail = details_by_user.get(match_id)
+                if detail is None:
+                    continue
+                data = UserDetailsSerializer(detail, context=context).data
+                data['compatibility_score'] = round(score * 100)
+                roommates.append(data)
+
+            return Response(roommates, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error in compatible roommates view: {str(e)}")
+            return Response(
+                {"error": "An error occurred while processing your request"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
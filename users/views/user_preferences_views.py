@@ -1,8 +1,13 @@
+from decimal import Decimal
+
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.core.exceptions import ValidationError
+from django.db import transaction
 
+from apartments.utils.preference_index import refresh_indexed_preferences
+from apartments.utils.recommendation_feed import mark_feed_stale
 from users.models import UserPreferences, UserPreferencesFeatures
 from users.serializers import UserPreferencesGetSerializer
 
@@ -40,6 +45,7 @@ class UserPreferencesView(APIView):
                     },
                     "max_floor": None,
                     "area": None,
+                    "location": None,
                     "features": []
                 }, status=status.HTTP_200_OK)
         except DatabaseError:
@@ -95,34 +101,56 @@ class UserPreferencesView(APIView):
         min_price = price_range.get('min_price') if price_range else None
         max_price = price_range.get('max_price') if price_range else None
         
+        # Extract the optional search radius
+        location = data.get('location') or {}
+        try:
+            latitude, longitude, max_distance_km = (
+                None if location.get(key) in null_values else float(location.get(key))
+                for key in ('latitude', 'longitude', 'max_distance_km')
+            )
+        except (AttributeError, TypeError, ValueError):
+            return Response({"errors": "Location values must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        
         # Extract features
         features = data.get('features') or []
 
         try:
-            # Create or update the user preferences
-            prefs, created = UserPreferences.objects.update_or_create(
-                user_id=user_id,
-                defaults={
-                    'city_id': city,
-                    'move_in_date': cleaned_fields['move_in_date'],
-                    'number_of_roommates': cleaned_fields['number_of_roommates'],
-                    'min_price': min_price,
-                    'max_price': max_price,
-                    'max_floor': cleaned_fields['max_floor'],
-                    'area': cleaned_fields['area'],
-                }
-            )
+            # Write the preferences and their features together, so on-commit hooks see both
+            with transaction.atomic():
+                # Create or update the user preferences
+                prefs, created = UserPreferences.objects.update_or_create(
+                    user_id=user_id,
+                    defaults={
+                        'city_id': city,
+                        'move_in_date': cleaned_fields['move_in_date'],
+                        'number_of_roommates': cleaned_fields['number_of_roommates'],
+                        'min_price': min_price,
+                        'max_price': max_price,
+                        'max_floor': cleaned_fields['max_floor'],
+                        'area': cleaned_fields['area'],
+                        # Stored with the model's 7 decimal places
+                        'latitude': None if latitude is None else Decimal(f'{latitude:.7f}'),
+                        'longitude': None if longitude is None else Decimal(f'{longitude:.7f}'),
+                        'max_distance_km': max_distance_km,
+                    }
+                )
             
-            # Handle features - clear existing and add new ones
-            UserPreferencesFeatures.objects.filter(user_preferences=prefs).delete()
+                # Handle features - clear existing and add new ones
+                UserPreferencesFeatures.objects.filter(user_preferences=prefs).delete()
             
-            # Bulk create feature associations if any features provided
-            if features:
-                feature_objects = [
-                    UserPreferencesFeatures(user_preferences=prefs, feature_id=feature_id)
-                    for feature_id in features
-                ]
-                UserPreferencesFeatures.objects.bulk_create(feature_objects)
+                # Bulk create feature associations if any features provided
+                if features:
+                    feature_objects = [
+                        UserPreferencesFeatures(user_preferences=prefs, feature_id=feature_id)
+                        for feature_id in features
+                    ]
+                    UserPreferencesFeatures.objects.bulk_create(feature_objects)
+
+            # Features are bulk created without signals, so index the finished preferences here
+            transaction.on_commit(lambda: refresh_indexed_preferences(user_id))
+
+            # Recommendations ranked for the old preferences no longer apply
+            mark_feed_stale(user_id)
             
             return Response(UserPreferencesGetSerializer(prefs).data, status=status.HTTP_200_OK)
             